@@ -11,7 +11,9 @@ db = SQLAlchemy()
 migrate = Migrate()
 mail = Mail()
 
-def create_app(config_class=Config):
+def create_app(config_class=Config, start_workers=None):
+    """start_workers: whether to run the background workers (stock fold, Xero sync) in this
+    process; defaults to config BACKGROUND_WORKERS (True). Never in testing."""
     # app.root_path is the path to the directory where the app package (app/) is located.
     # We want to go one level up from app.root_path to get to the project root,
     # and then into the 'frontend' directory.
@@ -36,9 +38,12 @@ def create_app(config_class=Config):
     mail.init_app(app)
 
     from app.services.quick_add_item_service import QuickAddItemService
+    from app.services.versions import catalogue_version
+    from app.utils.conditional import conditional_get
 
     # WORKAROUND: Direct route for /api/quick-add-items GET requests
     @app.route('/api/quick-add-items', methods=['GET'])
+    @conditional_get(catalogue_version)
     def direct_get_quick_add_items():
         current_app.logger.info(f"[DIRECT_ROUTE_WORKAROUND] GET /api/quick-add-items called with args: {request.args}")
         page_number = request.args.get('page', default=1, type=int)
@@ -163,6 +168,9 @@ def create_app(config_class=Config):
     from app.routes.combination_items import combination_items_bp
     app.register_blueprint(combination_items_bp, url_prefix='/api/combination-items')
 
+    from app.routes.catalog import bp as catalog_bp
+    app.register_blueprint(catalog_bp, url_prefix='/api/catalog')
+
     # Register Category Management blueprint
     from app.routes.categories import bp as categories_bp
     app.register_blueprint(categories_bp, url_prefix='/categories')
@@ -174,6 +182,47 @@ def create_app(config_class=Config):
     from app.routes.auth import bp as auth_bp
     app.register_blueprint(auth_bp)
 
+    # Build the in-memory item search index; searches fall back to SQL if this fails
+    from app.services.search_index import item_search_index
+    with app.app_context():
+        item_search_index.build()
+
+    from app.services.sku_cache import sku_cache
+    sku_cache.maxsize = app.config.get('SKU_CACHE_SIZE', 5000)
+
+    # Keep those caches in step with catalogue writes from other processes (importers, other app processes)
+    from app.services.catalog_service import catalog_change_follower
+    catalog_follow_interval = app.config.get('CATALOG_FOLLOW_INTERVAL', 5)
+    if catalog_follow_interval:
+        with app.app_context():
+            catalog_change_follower.reset()
+
+        @app.before_request
+        def follow_catalog_changes():
+            catalog_change_follower.check(catalog_follow_interval)
+
+    if start_workers is None:
+        start_workers = app.config.get('BACKGROUND_WORKERS', True)
+    start_workers = start_workers and not app.testing
+
+    # Fold the stock ledger into items.stock_quantity in the background (0 disables it, e.g. for scripts)
+    from app.services.stock_service import stock_materialiser
+    materialise_interval = app.config.get('STOCK_MATERIALISE_INTERVAL', 5)
+    if materialise_interval and start_workers:
+        stock_materialiser.start(app, materialise_interval)
+
+    # Send queued payments and voids to Xero in the background (0 disables it)
+    from app.services.xero_outbox import xero_outbox_worker
+    xero_outbox_interval = app.config.get('XERO_OUTBOX_INTERVAL', 10)
+    if xero_outbox_interval and start_workers:
+        xero_outbox_worker.start(app, xero_outbox_interval)
+
+    # Close finished days into summary invoices in daily summary mode
+    from app.services.xero_daily_summary import xero_daily_summary_worker
+    xero_daily_summary_interval = app.config.get('XERO_DAILY_SUMMARY_INTERVAL', 900)
+    if app.config.get('XERO_DAILY_SUMMARY') and xero_daily_summary_interval and start_workers:
+        xero_daily_summary_worker.start(app, xero_daily_summary_interval)
+
     @app.route('/')
     def serve_index():
         return send_from_directory(frontend_dir_path, 'index.html')
@@ -15,6 +15,9 @@ from datetime import datetime # For parsing date strings
 from app import db
 from app.models import Item, Category, Photo, Customer, Sale, SaleItem # Customer model will be used if CSV for customers is provided
 from app.services.image_service import ImageService 
+from app.services.stock_service import StockService
+from app.services.item_service import ItemService
+from app.services.catalog_service import CatalogService
 from PIL import Image as PILImage 
 
 def get_or_create_category_path_id(category_path_str):
@@ -181,6 +184,9 @@ def import_products_from_csv(csv_filepath):
     print(f"Starting product import from: {csv_filepath}")
     sku_to_id_map = {}
     variation_rows = []
+    import_counts = {} # item_id -> imported stock level, appended to the stock ledger before each commit
+    imported_item_ids = set() # logged as catalogue changes at the end, so tills and the caches pick them up
+    last_category_id = db.session.query(db.func.max(Category.id)).scalar() or 0
 
     print("--- Pass 1: Processing simple and variable products ---")
     with open(csv_filepath, mode='r', encoding='utf-8-sig') as file:
@@ -262,12 +268,18 @@ def import_products_from_csv(csv_filepath):
             
             if sku and item_id: # Ensure SKU and item_id are valid before adding to map
                  sku_to_id_map[sku] = item_id
+            if item_id:
+                imported_item_ids.add(item_id)
+            if stock_quantity_str and item_id:
+                import_counts[item_id] = stock_quantity
             
             images_csv = row.get('Images')
             if images_csv and item_id: 
                 download_and_store_images(images_csv, item_id)
 
         print("Committing Pass 1 changes (including photos)...")
+        StockService.record_counts(import_counts, 'import', note=os.path.basename(csv_filepath))
+        import_counts = {}
         db.session.commit()
 
     print(f"--- Pass 2: Processing {len(variation_rows)} collected variations ---")
@@ -324,6 +336,10 @@ def import_products_from_csv(csv_filepath):
             db.session.add(item)
             db.session.flush() # Flush to get ID for photo association
             item_id_for_photo = item.id
+        if stock_quantity_str and item_id_for_photo:
+            import_counts[item_id_for_photo] = stock_quantity
+        if item_id_for_photo:
+            imported_item_ids.add(item_id_for_photo)
         
         images_csv_variation = row.get('Images')
         if images_csv_variation and item_id_for_photo:
@@ -332,7 +348,14 @@ def import_products_from_csv(csv_filepath):
             print(f"ERROR (Pass 2 Photos): Could not determine item ID for SKU {sku} to associate images.")
 
     print("Committing Pass 2 changes (including photos)...")
+    StockService.record_counts(import_counts, 'import', note=os.path.basename(csv_filepath))
     db.session.commit()
+
+    # Stock, prices and active flags were written directly: log them for the tills, the running
+    # app's caches (see CatalogChangeFollower) and its catalogue ETags
+    print(f"Logging {len(imported_item_ids)} changed items in the catalogue change log...")
+    CatalogService.record_changes('category', [category_id for (category_id,) in db.session.query(Category.id).filter(Category.id > last_category_id)])
+    ItemService.sync_item_caches(*Item.query.filter(Item.id.in_(imported_item_ids)).all())
     print("Product import finished.")
 
 def import_customers_from_csv(csv_filepath):
@@ -668,6 +691,7 @@ def import_sales_from_csv(csv_filepath):
         print(f"Error on final commit of sales: {e_final_commit}")
 
     print(f"Sales import from CSV finished. Orders Processed: {rows_processed}, Sales Created: {sales_created_count}, SaleItems Created: {sale_items_created_count}, Customers Created via Order: {customers_created_from_orders_count}, Customers Updated via Order (checked): {customers_updated_from_orders_count}")
+    print("Sale lines were inserted directly; run `python check_sale_totals.py --fix` to fill in the stored sale totals.")
 
 if __name__ == '__main__':
     project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
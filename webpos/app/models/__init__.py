@@ -11,6 +11,10 @@ from .payment import Payment
 from .quick_add_item import QuickAddItem
 from .category import Category
 from .combination import CombinationItem, CombinationItemComponent
+from .catalog_change import CatalogChange
+from .stock_movement import StockMovement
+from .xero_outbox import XeroOutboxEvent
+from .xero_daily_summary import XeroDailySummary
 
 __all__ = [
     'Item',
@@ -22,5 +26,9 @@ __all__ = [
     'QuickAddItem',
     'Category',
     'CombinationItem',
-    'CombinationItemComponent'
+    'CombinationItemComponent',
+    'CatalogChange',
+    'StockMovement',
+    'XeroOutboxEvent',
+    'XeroDailySummary'
 ] 
\ No newline at end of file
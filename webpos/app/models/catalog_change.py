@@ -0,0 +1,14 @@
+from app import db
+from sqlalchemy.sql import func
+
+class CatalogChange(db.Model):
+    __tablename__ = 'catalog_changes'
+
+    # id doubles as the monotonically increasing sequence number handed to tills
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    entity = db.Column(db.String(20), nullable=False) # 'item', 'category', 'quick_add' or 'customer'
+    entity_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.TIMESTAMP, server_default=func.now())
+
+    def __repr__(self):
+        return f'<CatalogChange {self.id} {self.entity} {self.entity_id}>'
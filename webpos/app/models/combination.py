@@ -21,6 +21,9 @@ class CombinationItem(db.Model):
 
 class CombinationItemComponent(db.Model):
     __tablename__ = 'combination_item_components'
+    __table_args__ = (
+        db.Index('ix_combination_item_components_combo_id', 'combination_item_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     combination_item_id = db.Column(db.Integer, db.ForeignKey('combination_items.id'), nullable=False)
     # This component_item_id links to the Item entry that IS a component of the combo
@@ -9,6 +9,8 @@ class Customer(db.Model):
     name = db.Column(db.String(255), nullable=False)
     address = db.Column(db.Text, nullable=True)
     company_name = db.Column(db.String(255), nullable=True)
+    # Xero ContactID, set when the contact is first found or created (see XeroOutboxService)
+    xero_contact_id = db.Column(db.String(36), nullable=True)
 
     sales = db.relationship('Sale', backref='customer', lazy=True)
 
@@ -2,12 +2,20 @@ from app import db
 
 class Item(db.Model):
     __tablename__ = 'items'
+    __table_args__ = (
+        # Every listing/search filters on these three together
+        db.Index('ix_items_current_active_parent', 'is_current_version', 'is_active', 'parent_id'),
+        # Prefix index: serves `title LIKE 'abc%'` and ORDER BY title, id (InnoDB appends the PK)
+        db.Index('ix_items_title_prefix', 'title', mysql_length=32),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     parent_id = db.Column(db.Integer, nullable=True) # -1: no parent, -2: is a parent, >0: Items.id of parent
     is_current_version = db.Column(db.Boolean, nullable=False, default=True)
     sku = db.Column(db.String(255), unique=True, nullable=False)
     stock_quantity = db.Column(db.Integer, nullable=False, default=0)
+    # ID of the last stock_movements row folded into stock_quantity (see StockService.materialise)
+    stock_movement_seq = db.Column(db.Integer, nullable=False, default=0)
     low_stock_level = db.Column(db.Integer, nullable=False, default=-1)
     is_stock_tracked = db.Column(db.Boolean, nullable=False, default=True)
     title = db.Column(db.String(255), nullable=False)
@@ -3,6 +3,9 @@ from sqlalchemy.sql import func
 
 class Payment(db.Model):
     __tablename__ = 'payments'
+    __table_args__ = (
+        db.Index('ix_payments_sale_id', 'sale_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False)
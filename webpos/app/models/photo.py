@@ -2,6 +2,9 @@ from app import db
 
 class Photo(db.Model):
     __tablename__ = 'photos'
+    __table_args__ = (
+        db.Index('ix_photos_item_id', 'item_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     item_id = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False)
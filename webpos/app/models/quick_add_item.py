@@ -4,6 +4,10 @@ import os # Import os for path manipulation
 
 class QuickAddItem(db.Model):
     __tablename__ = 'quick_add_items'
+    __table_args__ = (
+        # Grid pages are always loaded by page and ordered by position
+        db.Index('ix_quick_add_items_page_position', 'page_number', 'position'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     page_number = db.Column(db.Integer, nullable=False, default=1)
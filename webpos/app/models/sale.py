@@ -4,6 +4,13 @@ from sqlalchemy import Enum as SQLAlchemyEnum
 
 class Sale(db.Model):
     __tablename__ = 'sales'
+    __table_args__ = (
+        # Status-filtered sale lists, newest first
+        db.Index('ix_sales_status_updated_at', 'status', 'updated_at'),
+        db.Index('ix_sales_customer_id', 'customer_id'),
+        # The daily summary's scan for unclaimed paid sales, and its totals per summary
+        db.Index('ix_sales_xero_summary_id_status_created_at', 'xero_summary_id', 'status', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=True)
@@ -19,12 +26,33 @@ class Sale(db.Model):
     overall_discount_amount_applied = db.Column(db.Numeric(10, 2), default=0.00, nullable=False)
     transaction_fee = db.Column(db.Numeric(10, 2), default=0.00, nullable=False)
 
+    # Stored totals, all GST-inclusive. SaleService and PaymentService keep them in step with the
+    # lines, payments, overall discount and fee on every write; check_sale_totals.py verifies them.
+    subtotal_gross = db.Column(db.Numeric(10, 2), default=0.00, nullable=False)  # sum of price_at_sale * quantity
+    line_discount_total = db.Column(db.Numeric(10, 2), default=0.00, nullable=False)
+    gst_amount = db.Column(db.Numeric(10, 2), default=0.00, nullable=False)
+    grand_total = db.Column(db.Numeric(10, 2), default=0.00, nullable=False)
+    amount_paid = db.Column(db.Numeric(10, 2), default=0.00, nullable=False)
+    amount_due = db.Column(db.Numeric(10, 2), default=0.00, nullable=False)
+
+    # Bumped by every committed SaleService/PaymentService write; stale writes are refused (see SaleService._commit_sale)
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    # Xero InvoiceID, set when the invoice is first found or created and cleared when it is voided
+    # (see XeroOutboxService); later payments go straight to it
+    xero_invoice_id = db.Column(db.String(36), nullable=True)
+    # The daily Xero summary a walk-in sale was rolled into (XERO_DAILY_SUMMARY mode) instead of its own invoice
+    xero_summary_id = db.Column(db.Integer, db.ForeignKey('xero_daily_summaries.id', name='fk_sales_xero_summary_id'), nullable=True)
+
     created_at = db.Column(db.TIMESTAMP, server_default=func.now())
     updated_at = db.Column(db.TIMESTAMP, server_default=func.now(), onupdate=func.now())
     customer_notes = db.Column(db.Text, nullable=True)
     internal_notes = db.Column(db.Text, nullable=True)
     purchase_order_number = db.Column(db.String(100), nullable=True)
 
+    # ORM flushes of a sale carry `WHERE version = <loaded version>`; writers set the new version themselves
+    __mapper_args__ = {'version_id_col': version, 'version_id_generator': False}
+
     sale_items = db.relationship('SaleItem', backref='sale', lazy=True, cascade='all, delete-orphan')
     payments = db.relationship('Payment', backref='sale', lazy=True, cascade='all, delete-orphan')
 
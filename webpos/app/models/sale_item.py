@@ -2,6 +2,10 @@ from app import db
 
 class SaleItem(db.Model):
     __tablename__ = 'saleitems'
+    __table_args__ = (
+        db.Index('ix_saleitems_sale_id', 'sale_id'),
+        db.Index('ix_saleitems_item_id', 'item_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False)
@@ -0,0 +1,27 @@
+from datetime import datetime
+from app import db
+
+class StockMovement(db.Model):
+    """Append-only stock ledger. Rows are never updated; StockService folds them into
+    items.stock_quantity and records the last folded ID in items.stock_movement_seq."""
+    __tablename__ = 'stock_movements'
+    __table_args__ = (
+        # Point-in-time and history lookups per item
+        db.Index('ix_stock_movements_item_id_id', 'item_id', 'id'),
+        # Voids reverse what the ledger holds for the sale
+        db.Index('ix_stock_movements_sale_id', 'sale_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False)
+    movement_type = db.Column(db.String(20), nullable=False) # 'sale', 'void', 'adjust', 'import' or 'stocktake'
+    # A signed change, or the counted level when is_absolute (stocktakes, imports, manual sets)
+    quantity = db.Column(db.Integer, nullable=False)
+    is_absolute = db.Column(db.Boolean, nullable=False, default=False)
+    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=True)
+    note = db.Column(db.String(255), nullable=True)
+    # Set by the application, so settle times and point-in-time queries share one clock
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    def __repr__(self):
+        return f'<StockMovement {self.id} {self.movement_type} item {self.item_id} {"=" if self.is_absolute else ""}{self.quantity}>'
@@ -0,0 +1,40 @@
+from datetime import datetime
+from app import db
+
+class XeroDailySummary(db.Model):
+    """One day's paid walk-in sales of one GST treatment, sent to Xero as a single invoice with a
+    payment per tender type (XERO_DAILY_SUMMARY mode, see XeroDailySummaryService). The totals are
+    fixed when the day is closed and the sales claimed (sales.xero_summary_id)."""
+    __tablename__ = 'xero_daily_summaries'
+    __table_args__ = (
+        # The worker's scan for due summaries
+        db.Index('ix_xero_daily_summaries_status_next_attempt_at', 'status', 'next_attempt_at'),
+        db.Index('ix_xero_daily_summaries_summary_date', 'summary_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    summary_date = db.Column(db.Date, nullable=False)
+    # Xero LineAmountTypes of the invoice: 'Inclusive' for sales carrying GST, 'NoTax' for GST-free ones
+    tax_treatment = db.Column(db.String(20), nullable=False)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    # GST-inclusive: net of discounts, card fees, and their sum (what the sales' grand totals add up to)
+    net_amount = db.Column(db.Numeric(12, 2), nullable=False, default=0.00)
+    fee_amount = db.Column(db.Numeric(12, 2), nullable=False, default=0.00)
+    total_amount = db.Column(db.Numeric(12, 2), nullable=False, default=0.00)
+    # JSON object of payment type -> amount received, e.g. {"Cash": "120.50", "EFTPOS": "310.00"}
+    tenders = db.Column(db.Text, nullable=False, default='{}')
+    # 'pending' until sent ('done'), or 'dead' once out of attempts (requeue from the admin endpoint);
+    # 'sending' while claimed by a worker, with next_attempt_at holding the end of its lease
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    last_error = db.Column(db.Text, nullable=True)
+    # Set once the invoice exists in Xero, so a retry after a failed payment does not create another
+    xero_invoice_id = db.Column(db.String(36), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    sales = db.relationship('Sale', backref='xero_summary', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<XeroDailySummary {self.id} {self.summary_date} {self.tax_treatment} {self.status}>'
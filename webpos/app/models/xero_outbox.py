@@ -0,0 +1,31 @@
+from datetime import datetime
+from app import db
+
+class XeroOutboxEvent(db.Model):
+    """A change still to be pushed to Xero, written in the same transaction as the change itself
+    and sent by XeroOutboxService.drain in the background. Events for one sale are sent in ID order."""
+    __tablename__ = 'xero_outbox'
+    __table_args__ = (
+        # The worker's scan for due events
+        db.Index('ix_xero_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+        db.Index('ix_xero_outbox_sale_id', 'sale_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    event_type = db.Column(db.String(20), nullable=False) # 'payment' or 'void'
+    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False)
+    payment_id = db.Column(db.Integer, db.ForeignKey('payments.id'), nullable=True)
+    # 'pending' until sent ('done'), or 'dead' once out of attempts (requeue from the admin endpoint);
+    # 'sending' while claimed by a drain, with next_attempt_at holding the end of its lease
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    last_error = db.Column(db.Text, nullable=True)
+    # Set by the application, so lag and backoff share one clock
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    payment = db.relationship('Payment')
+
+    def __repr__(self):
+        return f'<XeroOutboxEvent {self.id} {self.event_type} sale {self.sale_id} {self.status}>'
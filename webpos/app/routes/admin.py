@@ -1,7 +1,91 @@
-from flask import Blueprint, render_template
+import json
+from flask import Blueprint, render_template, request, jsonify
+from app.services.xero_outbox import XeroOutboxService
+from app.services.xero_daily_summary import XeroDailySummaryService
 
 bp = Blueprint('admin', __name__)
 
 @bp.route('/admin')
 def admin_page():
-    return render_template('admin.html') 
\ No newline at end of file
+    return render_template('admin.html')
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+def xero_outbox_event_to_dict(event):
+    return {
+        'id': event.id,
+        'event_type': event.event_type,
+        'sale_id': event.sale_id,
+        'payment_id': event.payment_id,
+        'status': event.status,
+        'attempts': event.attempts,
+        'next_attempt_at': _isoformat(event.next_attempt_at),
+        'last_error': event.last_error,
+        'created_at': _isoformat(event.created_at),
+        'processed_at': _isoformat(event.processed_at)
+    }
+
+@bp.route('/api/admin/xero_outbox', methods=['GET'])
+def get_xero_outbox():
+    """Xero sync queue depth and lag, with the latest events that ran out of attempts."""
+    stats = XeroOutboxService.stats()
+    return jsonify({
+        'pending': stats['pending'],
+        'sending': stats['sending'],
+        'dead': stats['dead'],
+        'done': stats['done'],
+        'oldest_pending_at': _isoformat(stats['oldest_pending_at']),
+        'lag_seconds': stats['lag_seconds'],
+        'next_attempt_at': _isoformat(stats['next_attempt_at']),
+        'last_sent_at': _isoformat(stats['last_sent_at']),
+        'dead_events': [xero_outbox_event_to_dict(event) for event in stats['dead_events']]
+    }), 200
+
+@bp.route('/api/admin/xero_outbox/requeue', methods=['POST'])
+def requeue_xero_outbox():
+    """Retries dead events: those listed in `event_ids`, or all of them if it is omitted."""
+    data = request.get_json(silent=True) or {}
+    event_ids = data.get('event_ids')
+    if event_ids is not None and (not isinstance(event_ids, list) or not all(isinstance(i, int) for i in event_ids)):
+        return jsonify({"error": "event_ids must be a list of event IDs."}), 400
+    requeued = XeroOutboxService.requeue(event_ids)
+    return jsonify({"requeued": requeued}), 200
+
+def xero_daily_summary_to_dict(summary):
+    return {
+        'id': summary.id,
+        'summary_date': _isoformat(summary.summary_date),
+        'tax_treatment': summary.tax_treatment,
+        'sale_count': summary.sale_count,
+        'net_amount': float(summary.net_amount),
+        'fee_amount': float(summary.fee_amount),
+        'total_amount': float(summary.total_amount),
+        'tenders': {payment_type: float(amount) for payment_type, amount in json.loads(summary.tenders or '{}').items()},
+        'status': summary.status,
+        'attempts': summary.attempts,
+        'next_attempt_at': _isoformat(summary.next_attempt_at),
+        'last_error': summary.last_error,
+        'xero_invoice_id': summary.xero_invoice_id,
+        'created_at': _isoformat(summary.created_at),
+        'processed_at': _isoformat(summary.processed_at)
+    }
+
+@bp.route('/api/admin/xero_daily_summaries', methods=['GET'])
+def get_xero_daily_summaries():
+    """The latest daily Xero summaries (XERO_DAILY_SUMMARY mode), newest first."""
+    limit = request.args.get('limit', 30, type=int)
+    return jsonify({
+        'enabled': XeroDailySummaryService.is_enabled(),
+        'summaries': [xero_daily_summary_to_dict(summary) for summary in XeroDailySummaryService.recent(max(1, min(limit, 365)))]
+    }), 200
+
+@bp.route('/api/admin/xero_daily_summaries/requeue', methods=['POST'])
+def requeue_xero_daily_summaries():
+    """Retries dead summaries: those listed in `summary_ids`, or all of them if it is omitted."""
+    data = request.get_json(silent=True) or {}
+    summary_ids = data.get('summary_ids')
+    if summary_ids is not None and (not isinstance(summary_ids, list) or not all(isinstance(i, int) for i in summary_ids)):
+        return jsonify({"error": "summary_ids must be a list of summary IDs."}), 400
+    requeued = XeroDailySummaryService.requeue(summary_ids)
+    return jsonify({"requeued": requeued}), 200
@@ -8,6 +8,7 @@ from xero_python.api_client.configuration import Configuration
 from xero_python.api_client.oauth2 import OAuth2Token
 from xero_python.identity import IdentityApi
 from xero_python.exceptions import OpenApiException
+from app.services.xero_service import xero_service
 
 bp = Blueprint('auth', __name__)
 
@@ -150,6 +151,8 @@ def callback():
         with open(os.path.join(os.path.dirname(current_app.root_path), 'xero_token.json'), 'w') as f:
             json.dump(token_data, f)
         current_app.logger.info("Xero token and tenant ID saved successfully.")
+        # The shared client holds the previous token in memory
+        xero_service.reset_token()
     except Exception as e:
         current_app.logger.error(f"Error saving Xero token: {e}")
         return "Error saving Xero token.", 500
@@ -0,0 +1,67 @@
+from flask import Blueprint, request, jsonify
+from app.services.catalog_service import CatalogService
+from app.services.versions import catalogue_version, stock_version
+from app.utils.conditional import conditional_get
+from app.routes.items import primary_photo_urls
+
+bp = Blueprint('catalog', __name__)
+
+# Rows are positional to keep the payload compact; clients index them by these column lists
+ITEM_COLUMNS = ['id', 'parent_id', 'sku', 'title', 'price', 'stock_quantity', 'is_stock_tracked', 'category_id', 'thumbnail']
+CATEGORY_COLUMNS = ['id', 'name', 'parent_id']
+
+def item_to_catalog_row(item):
+    # parent_id is the raw value: tills hold every variant, so they can tell an empty parent themselves
+    return [
+        item.id,
+        item.parent_id,
+        item.sku,
+        item.title,
+        float(item.price) if item.price is not None else None,
+        item.stock_quantity,
+        item.is_stock_tracked,
+        item.category_id,
+        primary_photo_urls(item)[0]
+    ]
+
+def category_to_catalog_row(category):
+    return [category.id, category.name, category.parent_id]
+
+@bp.route('/snapshot', methods=['GET'])
+@conditional_get(catalogue_version, stock_version)
+def get_catalog_snapshot_route():
+    """Every current, active item and every category, with the change-log sequence number to
+    pass as `since` to /changes."""
+    seq, items, categories = CatalogService.get_snapshot()
+    return jsonify({
+        'seq': seq,
+        'item_columns': ITEM_COLUMNS,
+        'items': [item_to_catalog_row(item) for item in items],
+        'category_columns': CATEGORY_COLUMNS,
+        'categories': [category_to_catalog_row(category) for category in categories]
+    }), 200
+
+@bp.route('/changes', methods=['GET'])
+@conditional_get(catalogue_version, stock_version)
+def get_catalog_changes_route():
+    """Items and categories changed after sequence number `since`. Repeat with the returned seq
+    while has_more is true; if reset is true, discard the local copy and take a new snapshot."""
+    since = request.args.get('since', type=int)
+    limit = request.args.get('limit', 1000, type=int)
+    if since is None or since < 0:
+        return jsonify({"error": "since must be a non-negative sequence number"}), 400
+    if limit < 1 or limit > 5000:
+        return jsonify({"error": "limit must be between 1 and 5000"}), 400
+
+    changes = CatalogService.get_changes(since, limit=limit)
+    return jsonify({
+        'seq': changes['seq'],
+        'has_more': changes['has_more'],
+        'reset': changes['reset'],
+        'item_columns': ITEM_COLUMNS,
+        'items': [item_to_catalog_row(item) for item in changes['items']],
+        'deleted_item_ids': changes['deleted_item_ids'],
+        'category_columns': CATEGORY_COLUMNS,
+        'categories': [category_to_catalog_row(category) for category in changes['categories']],
+        'deleted_category_ids': changes['deleted_category_ids']
+    }), 200
@@ -2,6 +2,8 @@ from flask import Blueprint, render_template, request, jsonify, redirect, url_fo
 from app import db
 from app.models.category import Category
 from app.models.item import Item
+from app.services.item_service import ItemService
+from app.services.catalog_service import CatalogService
 
 bp = Blueprint('categories', __name__)
 
@@ -57,6 +59,7 @@ def add_category():
     )
     db.session.add(new_category)
     db.session.commit()
+    CatalogService.record_changes('category', [new_category.id])
     return redirect(url_for('categories.category_list'))
 
 @bp.route('/update_parent/<int:category_id>', methods=['POST'])
@@ -83,6 +86,7 @@ def update_parent(category_id):
 
     category_to_update.parent_id = new_parent_id
     db.session.commit()
+    CatalogService.record_changes('category', [category_id])
     return jsonify({"success": True})
 
 @bp.route('/delete/<int:category_id>', methods=['POST'])
@@ -95,6 +99,10 @@ def delete_category(category_id):
     if not category_to_delete:
         return jsonify({"success": False, "error": "Category not found."}), 404
 
+    # IDs are collected first so the catalogue change log can name the rows the bulk updates touch
+    reassigned_item_ids = [item_id for (item_id,) in db.session.query(Item.id).filter_by(category_id=category_id)]
+    orphaned_category_ids = [child_id for (child_id,) in db.session.query(Category.id).filter_by(parent_id=category_id)]
+
     # Reassign items to the target category
     Item.query.filter_by(category_id=category_id).update({'category_id': target_category_id})
     
@@ -103,5 +111,7 @@ def delete_category(category_id):
 
     db.session.delete(category_to_delete)
     db.session.commit()
+    ItemService.invalidate_item_caches(reassigned_item_ids)
+    CatalogService.record_changes('category', [category_id] + orphaned_category_ids)
     
     return jsonify({"success": True}) 
\ No newline at end of file
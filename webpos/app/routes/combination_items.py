@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify, current_app
 from app import db
 from app.models import Item, CombinationItem, CombinationItemComponent # Adjusted import
+from app.services.item_service import ItemService
+from app.services.component_cache import component_map_cache
 import json
 
 combination_items_bp = Blueprint('combination_items_bp', __name__)
@@ -63,6 +65,7 @@ def create_combination_item_route():
             db.session.add(component)
         
         db.session.commit()
+        ItemService.sync_item_caches(base_item)
         # Return the ID of the base_item, as this is what the frontend usually interacts with
         return jsonify({'success': True, 'message': 'Combination item created successfully', 'id': base_item.id, 'combination_id': combination_item_record.id}), 201
     except json.JSONDecodeError:
@@ -158,6 +161,8 @@ def update_combination_item_route(base_item_id):
             db.session.add(new_component)
         
         db.session.commit()
+        component_map_cache.invalidate(base_item_id)
+        ItemService.sync_item_caches(base_item)
         return jsonify({'success': True, 'message': 'Combination item updated successfully', 'id': base_item.id})
     except json.JSONDecodeError:
         db.session.rollback()
@@ -185,6 +190,8 @@ def delete_combination_item_route(base_item_id):
         db.session.delete(base_item)
         
         db.session.commit()
+        component_map_cache.invalidate(base_item_id)
+        ItemService.sync_item_caches(removed_ids=(base_item_id,))
         return jsonify({'success': True, 'message': 'Combination item deleted successfully'})
     except Exception as e:
         db.session.rollback()
@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify
 from app.services.customer_service import CustomerService
+from app.services.versions import customer_version
+from app.utils.conditional import conditional_get
 
 bp = Blueprint('customers', __name__)
 
@@ -28,6 +30,7 @@ def create_customer_route():
     return jsonify(customer_to_dict(customer)), 201
 
 @bp.route('/<int:customer_id>', methods=['GET'])
+@conditional_get(customer_version)
 def get_customer_by_id_route(customer_id):
     customer = CustomerService.get_customer_by_id(customer_id)
     if not customer:
@@ -35,6 +38,7 @@ def get_customer_by_id_route(customer_id):
     return jsonify(customer_to_dict(customer)), 200
 
 @bp.route('/phone/<string:phone_number>', methods=['GET'])
+@conditional_get(customer_version)
 def get_customer_by_phone_route(phone_number):
     customer = CustomerService.get_customer_by_phone(phone_number)
     if not customer:
@@ -42,6 +46,7 @@ def get_customer_by_phone_route(phone_number):
     return jsonify(customer_to_dict(customer)), 200
 
 @bp.route('/', methods=['GET'])
+@conditional_get(customer_version)
 def get_all_customers_route():
     customers = CustomerService.get_all_customers()
     return jsonify([customer_to_dict(cust) for cust in customers]), 200
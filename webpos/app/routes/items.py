@@ -1,10 +1,18 @@
 from flask import Blueprint, request, jsonify, current_app, render_template
 from app.services.item_service import ItemService
+from app.services.stock_service import StockService
 from app.services.image_service import ImageService # Import ImageService
+from app.services.sku_cache import sku_cache
+from app.services.search_index import item_search_index
+from app.services.versions import catalogue_version, stock_version
+from app.utils.conditional import conditional_get
+from app.utils.fieldsets import fieldset_from_request, project, wants
 from app.models.item import Item # Import Item to assist with serialization if needed
 from app.models.category import Category # Import Category model
 from app.models.photo import Photo # Import Photo model for validation
 import os # Added for path manipulation
+from datetime import datetime
+from sqlalchemy.orm import selectinload
 
 bp = Blueprint('items', __name__)
 items_ui_bp = Blueprint('items_ui', __name__)
@@ -22,6 +30,7 @@ def item_list_page():
     stock_tracked = request.args.get('stock_tracked', 'all')
     has_image = request.args.get('has_image', 'all')
     order_by = request.args.get('order_by', 'id_desc')
+    cursor = request.args.get('cursor')
 
     # Get all categories for the dropdown
     categories = Category.query.order_by(Category.name).all()
@@ -85,33 +94,39 @@ def item_list_page():
         # Items with no associated photos
         query = query.filter(~Item.photos.any())
 
-    # Order by
-    order_map = {
-        'title_asc': Item.title.asc(),
-        'title_desc': Item.title.desc(),
-        'sku_asc': Item.sku.asc(),
-        'sku_desc': Item.sku.desc(),
-        'stock_asc': Item.stock_quantity.asc(),
-        'stock_desc': Item.stock_quantity.desc(),
-        'id_asc': Item.id.asc(),
-        'id_desc': Item.id.desc()
-    }
-    if order_by in order_map:
-        query = query.order_by(order_map[order_by])
+    # Order by (unknown values fall back to the default ordering)
+    try:
+        ItemService.parse_order_by(order_by)
+    except ValueError:
+        order_by = 'id_desc'
+        search_params['order_by'] = order_by
 
-    # Limit
+    next_cursor = None
+    has_more = False
     if limit > 0:
-        query = query.limit(limit)
-
-    items = query.all()
+        # Keyset pagination: each page seeks past the previous page's last row instead of using OFFSET
+        try:
+            items, next_cursor, has_more = ItemService.paginate_items(query, order_by=order_by, limit=limit, cursor=cursor)
+        except ValueError:
+            # Stale or mismatched cursor (e.g. the ordering was changed): start again from the first page
+            cursor = None
+            items, next_cursor, has_more = ItemService.paginate_items(query, order_by=order_by, limit=limit)
+    else:
+        # limit <= 0 keeps the old "show everything" behaviour
+        sort_column, descending = ItemService.parse_order_by(order_by)
+        query = query.order_by(sort_column.desc() if descending else sort_column.asc(), Item.id.desc() if descending else Item.id.asc())
+        items = query.options(selectinload(Item.photos)).all()
     
     # We will need to convert items to dicts for the template
-    items_dicts = [item_to_dict(item) for item in items]
+    items_dicts = items_to_dicts(items)
 
     return render_template('item_list.html', 
                            items=items_dicts, 
                            categories=categories,
-                           search_params=search_params)
+                           search_params=search_params,
+                           next_cursor=next_cursor,
+                           has_more=has_more,
+                           is_first_page=not cursor)
 
 # Helper function for boolean conversion
 def to_bool(value):
@@ -119,7 +134,10 @@ def to_bool(value):
         return value.lower() in ['true', '1', 'yes']
     return bool(value)
 
-def item_to_dict(item):
+def item_to_dict(item, has_active_variants=None, fields=None):
+    """Serialises an item. Pass has_active_variants when it is already known (see items_to_dicts)
+    to avoid the per-parent variant query. `fields` is a fieldset from app.utils.fieldsets;
+    photos and the variant check are skipped entirely when not requested."""
     if not item:
         return None
     
@@ -142,11 +160,13 @@ def item_to_dict(item):
 
     # If item is marked as a parent (parent_id == -2), check if it actually has active, current variants.
     # If not, present it as a standalone item (parent_id = -1) to the frontend for display logic.
-    if item_details['parent_id'] == -2:
-        if not ItemService.has_active_current_variants(item_details['id']):
+    if item_details['parent_id'] == -2 and wants(fields, 'parent_id'):
+        if has_active_variants is None:
+            has_active_variants = ItemService.has_active_current_variants(item_details['id'])
+        if not has_active_variants:
             item_details['parent_id'] = -1 # Override for frontend display
 
-    if hasattr(item, 'photos') and item.photos: # Check if photos relationship is loaded and not empty
+    if wants(fields, 'photos') and hasattr(item, 'photos') and item.photos: # Check if photos relationship is loaded and not empty
         for photo in item.photos:
             if photo.image_url:
                 base_filename = photo.image_url
@@ -166,7 +186,101 @@ def item_to_dict(item):
                 }
                 item_details['photos'].append(photo_dict)
             
-    return item_details
+    return project(item_details, fields)
+
+def items_to_dicts(items, fields=None):
+    """Batch version of item_to_dict: resolves variant presence for all parents with one grouped
+    query and loads any missing photo collections with one selectinload query."""
+    items = [item for item in items if item]
+    parents_with_variants = set()
+    if wants(fields, 'photos'):
+        ItemService.preload_photos(items)
+    if wants(fields, 'parent_id'):
+        parents_with_variants = ItemService.get_parent_ids_with_active_variants(
+            [item.id for item in items if item.parent_id == -2]
+        )
+    return [item_to_dict(item, has_active_variants=item.id in parents_with_variants, fields=fields) for item in items]
+
+def primary_photo_urls(item):
+    """Returns the (small, large) upload URLs of the item's primary (else first) photo, or (None, None)."""
+    if item.photos:
+        photo = next((p for p in item.photos if p.is_primary), item.photos[0])
+        if photo.image_url:
+            name, ext = os.path.splitext(photo.image_url)
+            return f"/uploads/{name}_small{ext}", f"/uploads/{name}_large{ext}"
+    return None, None
+
+def item_to_search_dict(item, has_active_variants=True):
+    """Minimal projection of an item for search results and pickers."""
+    if not item:
+        return None
+
+    parent_id = item.parent_id
+    # Same display rule as item_to_dict: a parent without active variants is shown as standalone
+    if parent_id == -2 and not has_active_variants:
+        parent_id = -1
+
+    thumbnail, image = primary_photo_urls(item)
+
+    return {
+        'id': item.id,
+        'sku': item.sku,
+        'title': item.title,
+        'price': float(item.price) if item.price is not None else None,
+        'parent_id': parent_id,
+        'stock_quantity': item.stock_quantity,
+        'is_stock_tracked': item.is_stock_tracked,
+        'thumbnail': thumbnail,
+        'image': image
+    }
+
+@bp.route('/search', methods=['GET'])
+@conditional_get(catalogue_version, stock_version)
+def search_items_route():
+    """Ranked, paginated search over current, active items by title or SKU."""
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', 25, type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if limit < 1 or limit > 100:
+        return jsonify({"error": "limit must be between 1 and 100"}), 400
+    if offset < 0:
+        return jsonify({"error": "offset must not be negative"}), 400
+
+    items, has_more = ItemService.search_items(query, limit=limit, offset=offset)
+    parents_with_variants = ItemService.get_parent_ids_with_active_variants(
+        [item.id for item in items if item.parent_id == -2]
+    )
+    return jsonify({
+        'items': [item_to_search_dict(item, item.id in parents_with_variants) for item in items],
+        'offset': offset,
+        'limit': limit,
+        'has_more': has_more
+    }), 200
+
+@bp.route('/typeahead', methods=['GET'])
+@conditional_get(catalogue_version)
+def typeahead_items_route():
+    """Title/SKU prefix matches for item pickers, answered from the in-memory index."""
+    prefix = request.args.get('q', '')
+    limit = request.args.get('limit', 10, type=int)
+    include_variants = to_bool(request.args.get('include_variants', False))
+    if limit < 1 or limit > 50:
+        return jsonify({"error": "limit must be between 1 and 50"}), 400
+
+    results = item_search_index.typeahead(prefix, limit=limit, include_variants=include_variants)
+    if results is None:
+        # Index unavailable: fall back to the (substring) SQL search with the same projection
+        items, _ = ItemService.search_items(prefix, limit=limit)
+        if not include_variants:
+            items = [item for item in items if item.parent_id is None or item.parent_id <= 0]
+        parents_with_variants = ItemService.get_parent_ids_with_active_variants(
+            [item.id for item in items if item.parent_id == -2]
+        )
+        results = []
+        for item in items:
+            details = item_to_search_dict(item, item.id in parents_with_variants)
+            results.append({key: details[key] for key in ('id', 'sku', 'title', 'price', 'parent_id')})
+    return jsonify(results), 200
 
 @bp.route('/', methods=['POST'])
 def create_item_route():
@@ -219,24 +333,47 @@ def create_item_route():
     return jsonify(item_to_dict(item)), 201
 
 @bp.route('/<int:item_id>', methods=['GET'])
+@conditional_get(catalogue_version, stock_version)
 def get_item_route(item_id):
     item = ItemService.get_item_by_id(item_id)
     if not item:
         return jsonify({"error": "Item not found"}), 404
-    return jsonify(item_to_dict(item)), 200
+    return jsonify(item_to_dict(item, fields=fieldset_from_request())), 200
 
 @bp.route('/', methods=['GET'])
+@conditional_get(catalogue_version, stock_version)
 def get_all_items_route():
     filters = {}
     q_param = request.args.get('q')
     sku_query = request.args.get('sku') # Keep direct SKU query if needed for other use cases
     is_current_version = request.args.get('is_current_version', default=True, type=lambda v: v.lower() == 'true') # Handle string 'true'/'false'
     limit = request.args.get('limit', type=int)
+    fields = fieldset_from_request()
 
     if q_param:
         filters['title_query'] = q_param  # Use 'q' for general title/SKU search in service
     if sku_query:
         filters['sku'] = sku_query # Allow specific SKU search to override/coexist if backend logic supports it
+
+    # Keyset pagination is opt-in (order_by and/or cursor given) so existing callers keep receiving a plain list
+    order_by = request.args.get('order_by')
+    cursor = request.args.get('cursor')
+    if order_by or cursor:
+        page_size = limit if limit and limit > 0 else 50
+        try:
+            items, next_cursor, has_more = ItemService.get_items_page(
+                filters=filters if filters else None,
+                order_by=order_by or 'title_asc',
+                limit=min(page_size, 500),
+                cursor=cursor
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({
+            'items': items_to_dicts(items, fields=fields),
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        }), 200
     
     # The ItemService.get_items_for_display already filters by is_current_version=True and is_active=True by default
     # So, explicitly passing is_current_version from request args to filters might be redundant unless service changes.
@@ -244,9 +381,24 @@ def get_all_items_route():
     # filters['is_current_version'] = is_current_version 
 
     items = ItemService.get_items_for_display(filters=filters if filters else None, limit=limit)
-    return jsonify([item_to_dict(item) for item in items]), 200
+    return jsonify(items_to_dicts(items, fields=fields)), 200
+
+@bp.route('/by-sku/<path:sku>', methods=['GET'])
+@conditional_get(catalogue_version, stock_version)
+def get_item_by_sku_route(sku):
+    """Barcode scan lookup, served from the in-process SKU cache when possible."""
+    item_details = sku_cache.get(sku)
+    if item_details is None:
+        generation = sku_cache.generation
+        item = ItemService.get_item_by_sku(sku)
+        if not item:
+            return jsonify({"error": "Item not found"}), 404
+        item_details = items_to_dicts([item])[0]
+        sku_cache.put(sku, item.id, item_details, generation=generation)
+    return jsonify(project(item_details, fieldset_from_request())), 200
 
 @bp.route('/<int:parent_item_id>/variants', methods=['GET'])
+@conditional_get(catalogue_version, stock_version)
 def get_item_variants_route(parent_item_id):
     current_app.logger.info(f"[get_item_variants_route] Received request for variants for parent_item_id: {parent_item_id}")
     # Use find_parent_definition_by_id to be less strict on is_current_version for the parent placeholder
@@ -262,7 +414,7 @@ def get_item_variants_route(parent_item_id):
     # get_variants_for_parent already filters for active, current variants.
     # If variants list is empty, it's handled by frontend. This is fine.
     current_app.logger.info(f"[get_item_variants_route] Found {len(variants) if variants else 0} variants for parent ID: {parent_item_id}")
-    return jsonify([item_to_dict(variant) for variant in variants]), 200
+    return jsonify(items_to_dicts(variants, fields=fieldset_from_request())), 200
 
 @bp.route('/<int:item_id>', methods=['PUT'])
 def update_item_route(item_id):
@@ -362,6 +514,7 @@ def toggle_item_property(item_id):
         setattr(item, prop_name, prop_value)
         from app import db
         db.session.commit()
+        ItemService.sync_item_caches(item)
         return jsonify({"success": True})
     except Exception as e:
         db.session.rollback()
@@ -369,12 +522,15 @@ def toggle_item_property(item_id):
 
 @bp.route('/<int:item_id>/quantity', methods=['PUT'])
 def update_item_quantity(item_id):
+    """Sets the stock level ('quantity') or changes it by a signed 'adjustment'. Either way the
+    change is appended to the stock ledger; new_quantity includes movements not yet materialised."""
     data = request.get_json()
-    if data is None or 'quantity' not in data:
+    if data is None or ('quantity' not in data and 'adjustment' not in data):
         return jsonify({"success": False, "error": "Invalid request"}), 400
 
+    is_absolute = 'quantity' in data
     try:
-        quantity = int(data.get('quantity'))
+        quantity = int(data.get('quantity') if is_absolute else data.get('adjustment'))
     except (ValueError, TypeError):
         return jsonify({"success": False, "error": "Invalid quantity format"}), 400
 
@@ -382,15 +538,84 @@ def update_item_quantity(item_id):
     if not item:
         return jsonify({"success": False, "error": "Item not found"}), 404
     
+    from app import db
     try:
-        item.stock_quantity = quantity
-        from app import db
+        StockService.record_movements([{'item_id': item_id, 'movement_type': 'adjust', 'quantity': quantity,
+                                        'is_absolute': is_absolute, 'note': data.get('note')}])
         db.session.commit()
-        return jsonify({"success": True, "new_quantity": quantity})
+        return jsonify({"success": True, "new_quantity": StockService.current_stock([item_id])[item_id]})
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
+@bp.route('/stocktake', methods=['POST'])
+def record_stocktake():
+    """Records counted levels, {"counts": [{"item_id": 1, "quantity": 5}, ...], "note": "..."},
+    as stocktake movements in one transaction."""
+    data = request.get_json()
+    if not data or not isinstance(data.get('counts'), list) or not data['counts']:
+        return jsonify({"success": False, "error": "Invalid request, counts is required"}), 400
+    try:
+        counts = {int(count['item_id']): int(count['quantity']) for count in data['counts']}
+    except (KeyError, ValueError, TypeError):
+        return jsonify({"success": False, "error": "Each count needs an integer item_id and quantity"}), 400
+
+    found_ids = {row.id for row in Item.query.with_entities(Item.id).filter(Item.id.in_(counts))}
+    missing_ids = sorted(set(counts) - found_ids)
+    if missing_ids:
+        return jsonify({"success": False, "error": f"Items not found: {missing_ids}"}), 404
+
+    from app import db
+    try:
+        StockService.record_counts(counts, 'stocktake', note=data.get('note'))
+        db.session.commit()
+        return jsonify({"success": True, "counted": len(counts)})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+def stock_movement_to_dict(movement):
+    return {
+        'id': movement.id,
+        'item_id': movement.item_id,
+        'movement_type': movement.movement_type,
+        'quantity': movement.quantity,
+        'is_absolute': movement.is_absolute,
+        'sale_id': movement.sale_id,
+        'note': movement.note,
+        'created_at': movement.created_at.isoformat() if movement.created_at else None
+    }
+
+@bp.route('/<int:item_id>/stock', methods=['GET'])
+def get_item_stock(item_id):
+    """Current stock including unmaterialised movements, or the level at ISO datetime `at`
+    (null if the ledger has no level for the item by then)."""
+    item = Item.query.get(item_id)
+    if not item:
+        return jsonify({"error": "Item not found"}), 404
+    at = request.args.get('at')
+    if at:
+        try:
+            at = datetime.fromisoformat(at)
+        except ValueError:
+            return jsonify({"error": "at must be an ISO date or datetime"}), 400
+        stock_quantity = StockService.stock_at([item_id], at)[item_id]
+    else:
+        stock_quantity = StockService.current_stock([item_id])[item_id]
+    return jsonify({
+        'item_id': item_id,
+        'at': at.isoformat() if at else None,
+        'stock_quantity': stock_quantity,
+        'materialised_quantity': item.stock_quantity
+    }), 200
+
+@bp.route('/<int:item_id>/stock_movements', methods=['GET'])
+def get_item_stock_movements(item_id):
+    limit = request.args.get('limit', 100, type=int)
+    if limit < 1 or limit > 1000:
+        return jsonify({"error": "limit must be between 1 and 1000"}), 400
+    return jsonify([stock_movement_to_dict(m) for m in StockService.get_movements(item_id, limit=limit)]), 200
+
 @bp.route('/<int:item_id>/low_stock_level', methods=['PUT'])
 def update_item_low_stock_level(item_id):
     data = request.get_json()
@@ -410,6 +635,7 @@ def update_item_low_stock_level(item_id):
         item.low_stock_level = low_stock_level
         from app import db
         db.session.commit()
+        ItemService.sync_item_caches(item)
         return jsonify({"success": True, "new_low_stock_level": low_stock_level})
     except Exception as e:
         db.session.rollback()
@@ -440,6 +666,7 @@ def update_item_category(item_id):
         item.category_id = category_id
         from app import db
         db.session.commit()
+        ItemService.sync_item_caches(item)
         return jsonify({"success": True})
     except Exception as e:
         db.session.rollback()
@@ -458,4 +685,5 @@ def delete_item_photo_route(item_id, photo_id):
         status_code = 404 if "not found" in error.lower() else 500 # 500 for other deletion errors
         return jsonify({"error": error}), status_code
     
+    ItemService.sync_item_caches(ItemService.get_item_by_id(item_id))
     return jsonify({"message": "Photo deleted successfully"}), 200 
\ No newline at end of file
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from app.services.payment_service import PaymentService
 from app.services.sale_service import SaleService # To get updated sale
 from app.utils.serializers import sale_to_dict, payment_to_dict # To serialize the updated sale
+from app.utils.conditional import expected_version_from_request
 
 bp = Blueprint('payments', __name__)
 
@@ -15,8 +16,11 @@ def record_payment_route():
     if not sale_id:
         return jsonify({"success": False, "message": "Sale ID is missing"}), 400
     
-    payment, error = PaymentService.record_payment(sale_id, data)
+    payment, error = PaymentService.record_payment(sale_id, data, expected_version=expected_version_from_request())
     if error:
+        if SaleService.CONFLICT_ERROR in error:
+            sale = SaleService.load_sale_graph(sale_id)
+            return jsonify({"success": False, "message": error, "sale": sale_to_dict(sale) if sale else None}), 409
         status_code = 404 if "not found" in error.lower() else 400
         if "Invalid payment_type" in error or "Invalid amount" in error or "Missing required fields" in error:
             status_code = 400
@@ -39,15 +39,11 @@ def print_sale_document(sale_id):
     doc_type = request.args.get('doc_type', 'invoice').lower() # invoice or quote
     doc_format = request.args.get('format', 'a4').lower()     # a4 or receipt
 
-    sale = SaleService.get_sale_by_id(sale_id)
+    # Customer, lines with their items and payments are loaded up front for the template
+    sale = SaleService.load_sale_graph(sale_id)
     if not sale:
         return jsonify({"error": "Sale not found"}), 404
 
-    # Ensure sale details are fully loaded (customer, items, payments)
-    # The SaleService.get_sale_by_id should ideally handle eager loading or ensure all data is available.
-    # If not, we might need to explicitly load sale.customer, sale.sale_items, sale.payments here.
-    # For now, assuming sale object from service is complete enough for sale_to_dict and template access.
-
     # Prepare company details (these should ideally come from app config or a settings model)
     company_details = {
         "company_name": current_app.config.get('COMPANY_NAME', 'Your Company Name'),
@@ -74,40 +70,8 @@ def print_sale_document(sale_id):
     generation_date_time = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
     quotation_valid_until_date = (datetime.now() + timedelta(days=14)).strftime('%d %B %Y')
 
-    # Calculate new detailed breakdown of totals for printing
-    subtotal_gross_original_calc = sum(
-        (si.price_at_sale * si.quantity) for si in sale.sale_items if si.price_at_sale is not None and si.quantity is not None
-    )
-    subtotal_gross_original_calc = Decimal(subtotal_gross_original_calc).quantize(Decimal('0.01'))
-
-    total_line_item_discounts_calc = sum(
-        ((si.price_at_sale - si.sale_price) * si.quantity) 
-        for si in sale.sale_items 
-        if si.price_at_sale is not None and si.sale_price is not None and si.quantity is not None
-    )
-    total_line_item_discounts_calc = Decimal(total_line_item_discounts_calc).quantize(Decimal('0.01'))
-
-    overall_discount_amount_applied_calc = Decimal(sale.overall_discount_amount_applied or '0.00').quantize(Decimal('0.01'))
-    
-    # If it's a quote, the fee is not included in the total, even if it's been toggled on the sale
-    if document_title == 'Quotation':
-        transaction_fee_calc = Decimal('0.00')
-    else:
-        transaction_fee_calc = Decimal(sale.transaction_fee or '0.00').quantize(Decimal('0.01'))
-
-    net_subtotal_inc_tax_calc = (subtotal_gross_original_calc - total_line_item_discounts_calc - overall_discount_amount_applied_calc)
-
-    gst_rate_percentage = Decimal(current_app.config.get('GST_RATE_PERCENTAGE', '10'))
-    gst_divisor = Decimal('1') + (gst_rate_percentage / Decimal('100'))
-    gst_from_subtotal = (net_subtotal_inc_tax_calc - (net_subtotal_inc_tax_calc / gst_divisor)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    gst_from_fee = (transaction_fee_calc - (transaction_fee_calc / gst_divisor)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    gst_amount_calc = gst_from_subtotal + gst_from_fee
-
-    final_grand_total_calc = net_subtotal_inc_tax_calc + transaction_fee_calc
-    
-    amount_paid_calc = sum(p.amount for p in sale.payments if p.amount is not None)
-    amount_paid_calc = Decimal(amount_paid_calc).quantize(Decimal('0.01'))
-    amount_due_calc = final_grand_total_calc - amount_paid_calc
+    # Quotes are printed without the EFTPOS fee, even if it has been toggled on the sale
+    totals = SaleService.document_totals(sale, include_fee=document_title != 'Quotation')
 
     render_context = {
         "sale": sale, 
@@ -116,17 +80,8 @@ def print_sale_document(sale_id):
         "generation_date_time": generation_date_time,
         "quotation_valid_until_date": quotation_valid_until_date,
         
-        # New financial breakdown for templates
-        "subtotal_gross_original": subtotal_gross_original_calc,
-        "total_line_item_discounts": total_line_item_discounts_calc,
-        "overall_discount_applied": overall_discount_amount_applied_calc,
-        "net_subtotal_final": net_subtotal_inc_tax_calc,
-        "gst_total": gst_amount_calc,
-        "gst_rate_percentage": gst_rate_percentage,
-        "eftpos_fee_amount": transaction_fee_calc,
-        "grand_total_final": final_grand_total_calc,
-        "amount_paid_total": amount_paid_calc,
-        "amount_due_final": amount_due_calc,
+        # Financial breakdown for templates
+        **totals,
 
         **company_details
     }
@@ -139,7 +94,7 @@ def print_sale_document(sale_id):
 def email_sale_document(sale_id):
     doc_type = request.args.get('doc_type', 'invoice').lower() # invoice or quote
 
-    sale = SaleService.get_sale_by_id(sale_id)
+    sale = SaleService.load_sale_graph(sale_id)
     if not sale:
         return jsonify({"error": "Sale not found"}), 404
 
@@ -185,31 +140,8 @@ def email_sale_document(sale_id):
         generation_date_time = datetime.now().strftime('%d/%m/%Y %H:%M:%S') # Not typically in A4, but here if needed
         quotation_valid_until_date = (datetime.now() + timedelta(days=14)).strftime('%d %B %Y')
 
-        subtotal_gross_original_calc = sum((si.price_at_sale * si.quantity) for si in sale.sale_items if si.price_at_sale is not None and si.quantity is not None)
-        subtotal_gross_original_calc = Decimal(subtotal_gross_original_calc).quantize(Decimal('0.01'))
-        total_line_item_discounts_calc = sum(((si.price_at_sale - si.sale_price) * si.quantity) for si in sale.sale_items if si.price_at_sale is not None and si.sale_price is not None and si.quantity is not None)
-        total_line_item_discounts_calc = Decimal(total_line_item_discounts_calc).quantize(Decimal('0.01'))
-        overall_discount_amount_applied_calc = Decimal(sale.overall_discount_amount_applied or '0.00').quantize(Decimal('0.01'))
-        # Calculate net amount (ex GST) from gross amount (inc GST)
-        gst_rate_percentage = Decimal(current_app.config.get('GST_RATE_PERCENTAGE', '10'))
-        gst_divisor = Decimal('1') + (gst_rate_percentage / Decimal('100'))
-        net_subtotal_inc_tax_calc = (subtotal_gross_original_calc - total_line_item_discounts_calc - overall_discount_amount_applied_calc)
-        
-        # If it's a quote, the fee is not included in the total, even if it's been toggled on the sale
-        if document_title == 'Quotation':
-            transaction_fee_calc = Decimal('0.00')
-        else:
-            transaction_fee_calc = Decimal(sale.transaction_fee or '0.00').quantize(Decimal('0.01'))
-
-        gst_from_subtotal = (net_subtotal_inc_tax_calc - (net_subtotal_inc_tax_calc / gst_divisor)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        gst_from_fee = (transaction_fee_calc - (transaction_fee_calc / gst_divisor)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        gst_amount_calc = gst_from_subtotal + gst_from_fee
-
-        final_grand_total_calc = net_subtotal_inc_tax_calc + transaction_fee_calc
-        
-        amount_paid_calc = sum(p.amount for p in sale.payments if p.amount is not None)
-        amount_paid_calc = Decimal(amount_paid_calc).quantize(Decimal('0.01'))
-        amount_due_calc = final_grand_total_calc - amount_paid_calc
+        # Quotes are sent without the EFTPOS fee, even if it has been toggled on the sale
+        totals = SaleService.document_totals(sale, include_fee=document_title != 'Quotation')
 
         render_context = {
             "sale": sale, 
@@ -217,16 +149,7 @@ def email_sale_document(sale_id):
             "generation_date": generation_date,
             "generation_date_time": generation_date_time,
             "quotation_valid_until_date": quotation_valid_until_date,
-            "subtotal_gross_original": subtotal_gross_original_calc,
-            "total_line_item_discounts": total_line_item_discounts_calc,
-            "overall_discount_applied": overall_discount_amount_applied_calc,
-            "net_subtotal_final": net_subtotal_inc_tax_calc,
-            "gst_total": gst_amount_calc,
-            "gst_rate_percentage": gst_rate_percentage,
-            "eftpos_fee_amount": transaction_fee_calc,
-            "grand_total_final": final_grand_total_calc,
-            "amount_paid_total": amount_paid_calc,
-            "amount_due_final": amount_due_calc,
+            **totals,
             **company_details
         }
         # --- End of context preparation ---
@@ -1,10 +1,13 @@
 from flask import Blueprint, request, jsonify, current_app
 from app.services.quick_add_item_service import QuickAddItemService # Uncommented
 from app import db # Uncommented
+from app.services.versions import catalogue_version
+from app.utils.conditional import conditional_get
 
 quick_add_items_bp = Blueprint('quick_add_items_bp', __name__)
 
 @quick_add_items_bp.route('/', methods=['GET'])
+@conditional_get(catalogue_version)
 def get_quick_add_items_for_page():
     current_app.logger.info(f"[ROUTE_HIT] /api/quick_add_items called with args: {request.args}") # Restored original log message slightly
     page_number = request.args.get('page', default=1, type=int)
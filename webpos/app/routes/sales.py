@@ -1,9 +1,20 @@
 from flask import Blueprint, request, jsonify
 from app.services.sale_service import SaleService
-from app.utils.serializers import sale_to_dict
+from app.utils.serializers import sale_to_dict, sale_summary_to_dict
+from app.utils.fieldsets import fieldset_from_request
+from app.utils.conditional import expected_version_from_request
 
 bp = Blueprint('sales', __name__)
 
+def _sale_error_response(sale_id, error):
+    """409 with the current sale for a lost version check, so the till can redraw it; otherwise
+    404 for anything not found and 400 for the rest."""
+    if SaleService.CONFLICT_ERROR in error:
+        sale = SaleService.load_sale_graph(sale_id)
+        return jsonify({"error": SaleService.CONFLICT_ERROR, "sale": sale_to_dict(sale) if sale else None}), 409
+    status_code = 404 if "not found" in error.lower() else 400
+    return jsonify({"error": error}), status_code
+
 @bp.route('/', methods=['POST'])
 def create_sale_route():
     data = request.get_json()
@@ -14,14 +25,15 @@ def create_sale_route():
     sale, error = SaleService.create_sale(data)
     if error:
         return jsonify({"error": error}), 400
-    return jsonify(sale_to_dict(sale)), 201
+    return jsonify(sale_to_dict(sale, fields=fieldset_from_request())), 201
 
 @bp.route('/<int:sale_id>', methods=['GET'])
 def get_sale_route(sale_id):
-    sale = SaleService.get_sale_by_id(sale_id)
+    fields = fieldset_from_request()
+    sale = SaleService.load_sale_graph(sale_id, fields=fields)
     if not sale:
         return jsonify({"error": "Sale not found"}), 404
-    return jsonify(sale_to_dict(sale)), 200
+    return jsonify(sale_to_dict(sale, fields=fields)), 200
 
 @bp.route('/', methods=['GET'])
 def get_all_sales_route():
@@ -37,18 +49,43 @@ def get_all_sales_route():
     if customer_query:
         filters['customer_query'] = customer_query
 
-    sales = SaleService.get_all_sales(filters=filters if filters else None)
-    return jsonify([sale_to_dict(s) for s in sales]), 200
+    fields = fieldset_from_request()
+    sales = SaleService.get_all_sales(filters=filters if filters else None, fields=fields)
+    return jsonify([sale_to_dict(s, fields=fields) for s in sales]), 200
+
+@bp.route('/summary', methods=['GET'])
+def get_sales_summary_route():
+    """Lightweight, keyset-paginated sale listing for the recall screens. Filters: status, sale_id,
+    customer_query, date_from, date_to; order_by (default updated_at_desc), limit, cursor."""
+    filters = {key: request.args.get(key) for key in ('status', 'sale_id', 'customer_query', 'date_from', 'date_to') if request.args.get(key)}
+    limit = request.args.get('limit', 50, type=int)
+    if limit < 1 or limit > 500:
+        return jsonify({"error": "limit must be between 1 and 500"}), 400
+    try:
+        rows, next_cursor, has_more = SaleService.get_sales_summary_page(
+            filters=filters,
+            order_by=request.args.get('order_by') or 'updated_at_desc',
+            limit=limit,
+            cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        'sales': [sale_summary_to_dict(row) for row in rows],
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }), 200
 
 @bp.route('/status/<string:status_value>', methods=['GET'])
 def get_sales_by_status_route(status_value):
     # Basic validation for status string can be added here if desired
     # e.g. if status_value.capitalize() not in ['Open', 'Quote', 'Invoice', 'Paid', 'Void']:
     # return jsonify({"error": "Invalid status value"}), 400
-    sales = SaleService.get_sales_by_status(status_value.capitalize()) # Capitalize to match Enum typically
+    fields = fieldset_from_request()
+    sales = SaleService.get_sales_by_status(status_value.capitalize(), fields=fields) # Capitalize to match Enum typically
     if sales is None: # Should not happen with current service, which returns [] or raises error
         return jsonify({"error": "Failed to retrieve sales by status"}), 500
-    return jsonify([sale_to_dict(s) for s in sales]), 200
+    return jsonify([sale_to_dict(s, fields=fields) for s in sales]), 200
 
 @bp.route('/<int:sale_id>/status', methods=['PUT'])
 def update_sale_status_route(sale_id):
@@ -57,13 +94,10 @@ def update_sale_status_route(sale_id):
         return jsonify({"error": "Invalid input, new 'status' is required"}), 400
     
     new_status = data['status']
-    sale, error = SaleService.update_sale_status(sale_id, new_status)
+    sale, error = SaleService.update_sale_status(sale_id, new_status, expected_version=expected_version_from_request())
     if error:
-        status_code = 404 if "not found" in error.lower() else 400
-        if "Invalid status" in error:
-            status_code = 400 # Bad request for invalid status value
-        return jsonify({"error": error}), status_code
-    return jsonify(sale_to_dict(sale)), 200
+        return _sale_error_response(sale_id, error)
+    return jsonify(sale_to_dict(sale, fields=fieldset_from_request())), 200
 
 @bp.route('/<int:sale_id>/items', methods=['POST'])
 def add_item_to_sale_route(sale_id):
@@ -71,13 +105,26 @@ def add_item_to_sale_route(sale_id):
     if not data or 'item_id' not in data or 'quantity' not in data:
         return jsonify({"error": "Invalid input, item_id and quantity are required"}), 400
     
-    sale_item, error = SaleService.add_item_to_sale(sale_id, data)
+    sale_item, error = SaleService.add_item_to_sale(sale_id, data, expected_version=expected_version_from_request())
     if error:
-        status_code = 404 if "not found" in error.lower() or "item not found" in error.lower() else 400
-        return jsonify({"error": error}), status_code
+        return _sale_error_response(sale_id, error)
     
-    updated_sale = SaleService.get_sale_by_id(sale_id) # Fetch the updated sale object
-    return jsonify(sale_to_dict(updated_sale)), 200
+    # The service leaves the whole sale graph loaded and up to date
+    return jsonify(sale_to_dict(sale_item.sale, fields=fieldset_from_request())), 200
+
+@bp.route('/<int:sale_id>/items:batch', methods=['POST'])
+def batch_sale_items_route(sale_id):
+    """Applies several line operations (add, update, remove, add_combo) in one transaction and
+    returns the resulting sale. See SaleService.apply_sale_item_operations for the op format."""
+    data = request.get_json()
+    if not data or 'operations' not in data:
+        return jsonify({"error": "Invalid input, operations is required"}), 400
+
+    updated_sale, error = SaleService.apply_sale_item_operations(sale_id, data['operations'], expected_version=expected_version_from_request())
+    if error:
+        return _sale_error_response(sale_id, error)
+
+    return jsonify(sale_to_dict(updated_sale, fields=fieldset_from_request())), 200
 
 @bp.route('/<int:sale_id>/items/<int:sale_item_id>', methods=['PUT'])
 def update_sale_item_route(sale_id, sale_item_id):
@@ -90,31 +137,25 @@ def update_sale_item_route(sale_id, sale_item_id):
     if not any(key in data for key in allowed_keys):
         return jsonify({"error": f"Invalid input, provide at least one of the following to update: {', '.join(allowed_keys)}."}), 400
 
-    updated_sale_item, error = SaleService.update_sale_item_details(sale_id, sale_item_id, data)
+    updated_sale, error = SaleService.update_sale_item_details(sale_id, sale_item_id, data, expected_version=expected_version_from_request())
 
     if error:
-        status_code = 404 if "not found" in error.lower() else 400
-        return jsonify({"error": error}), status_code
+        return _sale_error_response(sale_id, error)
     
-    updated_sale = SaleService.get_sale_by_id(sale_id) 
-    return jsonify(sale_to_dict(updated_sale)), 200
+    return jsonify(sale_to_dict(updated_sale, fields=fieldset_from_request())), 200
 
 @bp.route('/<int:sale_id>/items/<int:sale_item_id>', methods=['DELETE'])
 def remove_sale_item_route(sale_id, sale_item_id):
-    success, error = SaleService.remove_sale_item_from_sale(sale_id, sale_item_id)
+    updated_sale, error = SaleService.remove_sale_item_from_sale(sale_id, sale_item_id, expected_version=expected_version_from_request())
 
     if error:
-        status_code = 404 if "not found" in error.lower() else 400
-        return jsonify({"error": error}), status_code
+        return _sale_error_response(sale_id, error)
     
-    if not success: # Should be covered by error, but as a fallback
+    if not updated_sale: # Should be covered by error, but as a fallback
         return jsonify({"error": "Failed to remove sale item for an unknown reason"}), 500
 
     # Return the entire updated sale
-    updated_sale = SaleService.get_sale_by_id(sale_id)
-    if not updated_sale: # Should not happen if sale_id was valid for deletion
-         return jsonify({"message": "Sale item removed, but sale not found for updated view"}), 200
-    return jsonify(sale_to_dict(updated_sale)), 200
+    return jsonify(sale_to_dict(updated_sale, fields=fieldset_from_request())), 200
 
 @bp.route('/<int:sale_id>', methods=['PUT'])
 def update_sale_details_route(sale_id):
@@ -127,11 +168,10 @@ def update_sale_details_route(sale_id):
     if not any(key in data for key in valid_update_fields):
         return jsonify({"error": f"Invalid input. Provide at least one of {valid_update_fields} to update."}), 400
 
-    sale, error = SaleService.update_sale_details(sale_id, data)
+    sale, error = SaleService.update_sale_details(sale_id, data, expected_version=expected_version_from_request())
     if error:
-        status_code = 404 if "not found" in error.lower() else 400
-        return jsonify({"error": error}), status_code
-    return jsonify(sale_to_dict(sale)), 200
+        return _sale_error_response(sale_id, error)
+    return jsonify(sale_to_dict(sale, fields=fieldset_from_request())), 200
 
 @bp.route('/<int:sale_id>/overall_discount', methods=['PUT'])
 def apply_overall_discount_route(sale_id):
@@ -153,14 +193,14 @@ def apply_overall_discount_route(sale_id):
         sale_id,
         discount_type,
         discount_value_str,
-        rounding_target
+        rounding_target,
+        expected_version=expected_version_from_request()
     )
 
     if error:
-        status_code = 404 if "not found" in error.lower() else 400
-        return jsonify({"error": error}), status_code
+        return _sale_error_response(sale_id, error)
     
-    return jsonify(sale_to_dict(sale)), 200
+    return jsonify(sale_to_dict(sale, fields=fieldset_from_request())), 200
 
 # Payment related routes
 @bp.route('/<int:sale_id>/payments', methods=['POST'])
@@ -170,7 +210,7 @@ def add_payment_to_sale_route(sale_id):
         return jsonify({"error": "Invalid input, amount and payment_type are required"}), 400
     
     payment, error = SaleService.add_payment_to_sale(sale_id, data)
-    return jsonify(sale_to_dict(sale)), 200 
+    return jsonify(sale_to_dict(sale, fields=fieldset_from_request())), 200 
 
 @bp.route('/<int:sale_id>/eftpos_fee', methods=['PUT'])
 def toggle_eftpos_fee_route(sale_id):
@@ -180,10 +220,9 @@ def toggle_eftpos_fee_route(sale_id):
 
     is_enabled = data.get('enabled')
 
-    sale, error = SaleService.toggle_eftpos_fee(sale_id, is_enabled)
+    sale, error = SaleService.toggle_eftpos_fee(sale_id, is_enabled, expected_version=expected_version_from_request())
 
     if error:
-        status_code = 404 if "not found" in error.lower() else 400
-        return jsonify({"error": error}), status_code
+        return _sale_error_response(sale_id, error)
     
-    return jsonify(sale_to_dict(sale)), 200 
\ No newline at end of file
+    return jsonify(sale_to_dict(sale, fields=fieldset_from_request())), 200 
\ No newline at end of file
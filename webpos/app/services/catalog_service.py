@@ -0,0 +1,222 @@
+import threading
+import time
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+from app import db
+from app.models.item import Item
+from app.models.category import Category
+from app.models.catalog_change import CatalogChange
+from .versions import catalogue_version, customer_version, stock_version
+
+# Serialises appends so sequence numbers become visible in commit order within this process
+# (CatalogChangeFollower tolerates other processes committing out of order)
+_record_lock = threading.Lock()
+
+# The version each logged entity moves; everything else ('item', 'category', 'quick_add') is catalogue
+CHANGE_VERSIONS = {'customer': customer_version}
+
+
+class CatalogService:
+    """Catalogue snapshot and change log for tills that keep a local copy of the sellable items.
+
+    The log only records which items/categories changed; readers fetch their current state, so
+    several changes to one row collapse into a single upsert or delete. It also records quick-add
+    buttons and customers, which tills do not copy, so that other application processes follow
+    them (CatalogChangeFollower); get_changes skips those.
+    """
+
+    @staticmethod
+    def record_changes(entity, entity_ids):
+        """Appends committed changes to the log and bumps the entity's version (CHANGE_VERSIONS).
+        Must be called after the write has been committed, with nothing else pending in the
+        session."""
+        entity_ids = sorted({entity_id for entity_id in entity_ids if entity_id is not None})
+        if entity_ids:
+            with _record_lock:
+                try:
+                    changes = [CatalogChange(entity=entity, entity_id=entity_id) for entity_id in entity_ids]
+                    db.session.add_all(changes)
+                    db.session.flush()
+                    change_ids = [change.id for change in changes]
+                    db.session.commit()
+                    # This process's caches already reflect them
+                    catalog_change_follower.mark_seen(change_ids)
+                except Exception as e:
+                    db.session.rollback()
+                    current_app.logger.error(f"[CatalogService] Failed to record {entity} changes {entity_ids}: {e}")
+        CHANGE_VERSIONS.get(entity, catalogue_version).bump()
+
+    @staticmethod
+    def get_latest_seq():
+        return db.session.query(func.max(CatalogChange.id)).scalar() or 0
+
+    @staticmethod
+    def get_snapshot():
+        """Returns (seq, items, categories): every current, active item and every category.
+        seq is read first, so replaying changes after it can only repeat, never miss, a write."""
+        seq = CatalogService.get_latest_seq()
+        items = Item.query.options(selectinload(Item.photos)).filter(
+            Item.is_current_version == True,
+            Item.is_active == True
+        ).order_by(Item.id).all()
+        categories = Category.query.order_by(Category.id).all()
+        return seq, items, categories
+
+    @staticmethod
+    def get_changes(since, limit=1000):
+        """Returns a dict describing the changes after sequence number `since`:
+        seq (pass as `since` next time), has_more, reset (the caller is ahead of the log and must
+        take a new snapshot), items/categories to upsert and the IDs of those to delete."""
+        latest_seq = CatalogService.get_latest_seq()
+        result = {
+            'seq': since, 'has_more': False, 'reset': since > latest_seq,
+            'items': [], 'deleted_item_ids': [], 'categories': [], 'deleted_category_ids': []
+        }
+        if result['reset'] or since == latest_seq:
+            return result
+
+        changes = CatalogChange.query.filter(CatalogChange.id > since) \
+            .order_by(CatalogChange.id.asc()).limit(limit + 1).all()
+        result['has_more'] = len(changes) > limit
+        changes = changes[:limit]
+        result['seq'] = changes[-1].id
+
+        item_ids = {c.entity_id for c in changes if c.entity == 'item'}
+        if item_ids:
+            result['items'] = Item.query.options(selectinload(Item.photos)).filter(
+                Item.id.in_(item_ids),
+                Item.is_current_version == True,
+                Item.is_active == True
+            ).order_by(Item.id).all()
+            result['deleted_item_ids'] = sorted(item_ids - {item.id for item in result['items']})
+
+        category_ids = {c.entity_id for c in changes if c.entity == 'category'}
+        if category_ids:
+            result['categories'] = Category.query.filter(Category.id.in_(category_ids)).order_by(Category.id).all()
+            result['deleted_category_ids'] = sorted(category_ids - {category.id for category in result['categories']})
+        return result
+
+
+class CatalogChangeFollower:
+    """Applies changes logged by other processes (the importers, other application processes) to
+    this process's item caches and versions, which writes made here keep in step directly
+    (ItemService.sync_item_caches, CatalogService.record_changes).
+
+    At most every `interval` seconds, a request checks the change log for changes this process
+    has not seen and refreshes those items. The IDs seen among the last WINDOW sequence numbers
+    are kept, so a change that commits after a later one was seen is still picked up.
+
+    Stock folds are not logged (see StockService._sync_caches), so the same check compares the
+    items' fold positions (stock_movement_seq) with those last seen, and for any that moved
+    drops the cached barcode lookups and bumps the stock version.
+    """
+
+    WINDOW = 1000
+
+    def __init__(self):
+        self._check_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._low = None  # every change up to this one has been applied; None until reset()
+        self._seen = set()  # applied changes above _low
+        self._stock_positions = None  # {item_id: stock_movement_seq} as last applied
+        self._stock_total = 0
+        self._checked_at = 0.0
+
+    def reset(self):
+        """Starts following from the latest change, once the caches have been built."""
+        from .stock_service import StockService
+        try:
+            latest_seq = CatalogService.get_latest_seq()
+            stock_positions = StockService.fold_positions()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f"[CatalogChangeFollower] Change log unavailable, not following it: {e}")
+            return
+        with self._state_lock:
+            self._low, self._seen = latest_seq, set()
+            self._stock_positions, self._stock_total = stock_positions, sum(stock_positions.values())
+
+    def mark_seen(self, change_ids):
+        with self._state_lock:
+            if self._low is not None:
+                self._seen.update(change_id for change_id in change_ids if change_id > self._low)
+
+    def mark_folded(self, stock_positions):
+        """Records {item_id: stock_movement_seq} of a fold made by this process."""
+        with self._state_lock:
+            if self._stock_positions is None:
+                return
+            for item_id, seq in stock_positions.items():
+                self._stock_total += seq - self._stock_positions.get(item_id, 0)
+                self._stock_positions[item_id] = seq
+
+    def check(self, interval):
+        """Refreshes the caches for unseen changes, unless checked in the last `interval` seconds
+        or another request is already checking."""
+        now = time.monotonic()
+        if self._low is None or now - self._checked_at < interval or not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = now
+            self._follow_changes()
+            self._follow_stock()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f"[CatalogChangeFollower] Check failed, will retry: {e}")
+        finally:
+            self._check_lock.release()
+
+    def _follow_changes(self):
+        with self._state_lock:
+            low, seen_count = self._low, len(self._seen)
+        if db.session.query(func.count(CatalogChange.id)).filter(CatalogChange.id > low).scalar() == seen_count:
+            return
+        changes = db.session.query(CatalogChange.id, CatalogChange.entity, CatalogChange.entity_id).filter(
+            CatalogChange.id > low
+        ).all()
+        with self._state_lock:
+            unseen = [change for change in changes if change.id not in self._seen]
+        from .item_service import ItemService
+        if len(changes) < seen_count:
+            # The log lost changes seen here (e.g. the database was restored)
+            current_app.logger.warning("[CatalogChangeFollower] Change log went backwards; rebuilding the item caches")
+            ItemService.refresh_item_caches(None)
+            catalogue_version.bump()
+            self.reset()
+            return
+        if unseen:
+            ItemService.refresh_item_caches({change.entity_id for change in unseen if change.entity == 'item'})
+            for version in {CHANGE_VERSIONS.get(change.entity, catalogue_version) for change in unseen}:
+                version.bump()
+        self._advance(low, changes)
+
+    def _follow_stock(self):
+        """One SUM while nothing moved; the full positions only after a fold somewhere."""
+        from .sku_cache import sku_cache
+        from .stock_service import StockService
+        if StockService.fold_position_total() == self._stock_total:
+            return
+        stock_positions = StockService.fold_positions()
+        with self._state_lock:
+            if self._stock_positions is None:
+                return
+            moved = [item_id for item_id, seq in stock_positions.items() if self._stock_positions.get(item_id) != seq]
+            self._stock_positions, self._stock_total = stock_positions, sum(stock_positions.values())
+        for item_id in moved:
+            sku_cache.invalidate_item(item_id)
+        if moved:
+            stock_version.bump()
+
+    def _advance(self, low, changes):
+        with self._state_lock:
+            if self._low != low:
+                return
+            self._seen = {change.id for change in changes} | {change_id for change_id in self._seen if change_id > low}
+            top = max(self._seen, default=low)
+            if top - low > self.WINDOW:
+                self._low = top - self.WINDOW
+                self._seen = {change_id for change_id in self._seen if change_id > self._low}
+
+
+catalog_change_follower = CatalogChangeFollower()
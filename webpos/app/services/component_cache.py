@@ -0,0 +1,69 @@
+import threading
+
+
+class ComponentMapCache:
+    """Thread-safe map from a combination item's ID to its components, as a tuple of
+    (component_item_id, quantity, is_stock_tracked), used to explode combo lines into component
+    stock movements without loading the combination at checkout.
+
+    The combination item routes invalidate a combo when its components change, and
+    ItemService.sync_item_caches drops every combo containing a written item (its tracked flag
+    may have changed). Like SkuCache, readers take `generation` before loading and pass it to
+    put(), so a load that raced with an invalidation is not cached.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._maps = {}
+        self._combo_ids_by_component = {}
+        self._generation = 0
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def get_many(self, combo_item_ids):
+        """Returns ({combo_item_id: components} for the cached combos, [uncached combo IDs])."""
+        with self._lock:
+            found = {combo_id: self._maps[combo_id] for combo_id in combo_item_ids if combo_id in self._maps}
+        return found, [combo_id for combo_id in combo_item_ids if combo_id not in found]
+
+    def put(self, combo_item_id, components, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._discard(combo_item_id)
+            self._maps[combo_item_id] = tuple(components)
+            for component_item_id, _, _ in components:
+                self._combo_ids_by_component.setdefault(component_item_id, set()).add(combo_item_id)
+
+    def invalidate(self, combo_item_id):
+        with self._lock:
+            self._generation += 1
+            self._discard(combo_item_id)
+
+    def invalidate_item(self, item_id):
+        """Drops the item's own map (if it is a combo) and every combo it is a component of."""
+        with self._lock:
+            self._generation += 1
+            self._discard(item_id)
+            for combo_item_id in list(self._combo_ids_by_component.get(item_id, ())):
+                self._discard(combo_item_id)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._maps.clear()
+            self._combo_ids_by_component.clear()
+
+    def _discard(self, combo_item_id):
+        components = self._maps.pop(combo_item_id, None)
+        for component_item_id, _, _ in components or ():
+            combo_ids = self._combo_ids_by_component.get(component_item_id)
+            if combo_ids is not None:
+                combo_ids.discard(combo_item_id)
+                if not combo_ids:
+                    del self._combo_ids_by_component[component_item_id]
+
+
+component_map_cache = ComponentMapCache()
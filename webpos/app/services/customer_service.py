@@ -1,6 +1,7 @@
 from app import db
 from app.models.customer import Customer
 from sqlalchemy.exc import IntegrityError
+from app.services.catalog_service import CatalogService
 
 class CustomerService:
     @staticmethod
@@ -19,6 +20,7 @@ class CustomerService:
             )
             db.session.add(new_customer)
             db.session.commit()
+            CatalogService.record_changes('customer', [new_customer.id])
             return new_customer, None
         except IntegrityError as e:  # Catch issues like duplicate phone or email
             db.session.rollback()
@@ -58,6 +60,7 @@ class CustomerService:
                 customer.company_name = data.get('company_name')
             
             db.session.commit()
+            CatalogService.record_changes('customer', [customer_id])
             return customer, None
         except IntegrityError as e:
             db.session.rollback()
@@ -78,6 +81,7 @@ class CustomerService:
         try:
             db.session.delete(customer)
             db.session.commit()
+            CatalogService.record_changes('customer', [customer_id])
             return True, None
         except Exception as e:
             db.session.rollback()
@@ -2,15 +2,61 @@ from app import db
 from app.models.item import Item
 from app.models.photo import Photo
 from .image_service import ImageService
+from .search_index import item_search_index
+from .sku_cache import sku_cache
+from .component_cache import component_map_cache
+from .catalog_service import CatalogService
+from .stock_service import StockService
+from app.utils.pagination import keyset_paginate
 from sqlalchemy.exc import IntegrityError
 import copy
 import uuid
 from flask import current_app
 from sqlalchemy.orm import joinedload, selectinload
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, inspect
 
 class ItemService:
     VERSIONABLE_FIELDS = [ 'title', 'price' ]
+    # Sortable columns for keyset pagination, keyed by the prefix of the order_by parameter (e.g. 'title_asc')
+    ORDER_COLUMNS = {
+        'id': Item.id,
+        'title': Item.title,
+        'sku': Item.sku,
+        'stock': Item.stock_quantity
+    }
+
+    @staticmethod
+    def parse_order_by(order_by):
+        """Parses an order_by value such as 'title_asc' into (column, descending). Raises ValueError if unsupported."""
+        key, _, direction = (order_by or '').rpartition('_')
+        if key not in ItemService.ORDER_COLUMNS or direction not in ('asc', 'desc'):
+            raise ValueError(f"Invalid order_by '{order_by}'. Use one of {sorted(ItemService.ORDER_COLUMNS)} with _asc or _desc.")
+        return ItemService.ORDER_COLUMNS[key], direction == 'desc'
+
+    @staticmethod
+    def paginate_items(query, order_by='id_desc', limit=50, cursor=None):
+        """Keyset-paginates an Item query. Returns (items, next_cursor, has_more); raises ValueError
+        for an unsupported order_by or a bad cursor."""
+        sort_column, descending = ItemService.parse_order_by(order_by)
+        query = query.options(selectinload(Item.photos))
+        return keyset_paginate(query, order_by, sort_column, Item.id, descending=descending, limit=limit, cursor=cursor)
+
+    @staticmethod
+    def get_items_page(filters=None, order_by='title_asc', limit=50, cursor=None):
+        """Keyset-paginated listing of current, active items for the items API.
+        Without a search term only standalone, parent and combination items are listed,
+        matching get_items_for_display."""
+        query = Item.query.filter_by(is_current_version=True, is_active=True)
+        title_query = str(filters.get('title_query') or '').strip() if filters else ''
+        sku_filter = str(filters.get('sku') or '').strip() if filters else ''
+        if title_query:
+            search_term = f"%{title_query}%"
+            query = query.filter(db.or_(Item.title.ilike(search_term), Item.sku.ilike(search_term)))
+        elif not sku_filter:
+            query = query.filter(Item.parent_id.in_([-1, -2, -3]))
+        if sku_filter:
+            query = query.filter(Item.sku == sku_filter)
+        return ItemService.paginate_items(query, order_by=order_by, limit=limit, cursor=cursor)
 
     @staticmethod
     def create_item(data, image_files=None):
@@ -48,6 +94,10 @@ class ItemService:
             )
             
             db.session.add(new_item)
+            if new_item.is_stock_tracked:
+                db.session.flush()
+                # Opening level, so the stock ledger can answer point-in-time queries for this item
+                StockService.record_counts({new_item.id: new_item.stock_quantity}, 'adjust', note='Item created')
             db.session.commit() # Commit to save the item and get its ID
 
             if temp_sku_needed and new_item.id:
@@ -82,6 +132,7 @@ class ItemService:
                 if photos_added_to_session: # Commit only if new photos were actually added to session
                     db.session.commit() # Commit photos
 
+            ItemService.sync_item_caches(new_item)
             return new_item, None
         except IntegrityError as e:
             db.session.rollback()
@@ -101,6 +152,13 @@ class ItemService:
     def get_item_by_id(item_id):
         return Item.query.filter_by(id=item_id, is_current_version=True).first()
 
+    @staticmethod
+    def get_item_by_sku(sku):
+        """Exact SKU lookup of the current, active item (barcode scans)."""
+        return Item.query.options(selectinload(Item.photos)).filter_by(
+            sku=sku, is_current_version=True, is_active=True
+        ).first()
+
     @staticmethod
     def find_parent_definition_by_id(item_id):
         """Fetches an item by ID, expecting it to be an active parent item (parent_id == -2). 
@@ -136,6 +194,12 @@ class ItemService:
 
         include_variants_flag = filters.get('include_variants', False) if filters else False
 
+        # Serve title/SKU searches from the in-memory index when it is available.
+        # search() returns None if the index could not be built, in which case the SQL path below is used.
+        ranked_ids = item_search_index.search(title_query_filter) if search_term else None
+        if ranked_ids is not None:
+            return ItemService._get_items_from_search_index(ranked_ids, include_variants_flag, limit)
+
         if include_variants_flag:
             # Path for 'Create Combination Item' modal (include_variants == true)
             # Should NOT auto-expand parent variants here.
@@ -260,10 +324,142 @@ class ItemService:
         
         return items_to_return
 
+    @staticmethod
+    def _get_items_from_search_index(ranked_ids, include_variants_flag, limit=None):
+        """Resolves ranked IDs from the search index into Item objects using a single query.
+        Mirrors the two SQL search paths of get_items_for_display.
+        """
+        ordered_ids = ItemService._order_ranked_ids(ranked_ids, include_variants_flag)
+        if limit is not None and isinstance(limit, int) and limit > 0:
+            ordered_ids = ordered_ids[:limit]
+        return ItemService._load_items_in_order(ordered_ids)
+
+    @staticmethod
+    def _order_ranked_ids(ranked_ids, include_variants_flag):
+        """Turns ranked direct matches from the search index into the display order of get_items_for_display."""
+        if include_variants_flag:
+            # Direct matches only, combos excluded, alphabetical like the SQL path
+            ordered_ids = [item_id for item_id in ranked_ids if item_search_index.get_parent_id(item_id) != -3]
+            ordered_ids.sort(key=lambda item_id: (item_search_index.get_title(item_id) or "").lower())
+            return ordered_ids
+
+        # Direct matches in rank order, with each matching parent followed by its variants
+        ordered_ids = []
+        seen_ids = set()
+        for item_id in ranked_ids:
+            if item_id in seen_ids:
+                continue
+            ordered_ids.append(item_id)
+            seen_ids.add(item_id)
+            if item_search_index.get_parent_id(item_id) == -2:
+                variant_ids = sorted(
+                    item_search_index.get_variant_ids(item_id),
+                    key=lambda variant_id: (item_search_index.get_title(variant_id) or "").lower()
+                )
+                for variant_id in variant_ids:
+                    if variant_id not in seen_ids:
+                        ordered_ids.append(variant_id)
+                        seen_ids.add(variant_id)
+        return ordered_ids
+
+    @staticmethod
+    def _load_items_in_order(ordered_ids):
+        """Fetches current, active items (with photos) for the given IDs, preserving their order."""
+        if not ordered_ids:
+            return []
+        items = Item.query.options(selectinload(Item.photos)).filter(
+            Item.id.in_(ordered_ids),
+            Item.is_current_version == True,
+            Item.is_active == True
+        ).all()
+        items_by_id = {item.id: item for item in items}
+        return [items_by_id[item_id] for item_id in ordered_ids if item_id in items_by_id]
+
+    @staticmethod
+    def search_items(query, limit=25, offset=0):
+        """Ranked, paginated title/SKU search for the POS search box.
+        Returns (items, has_more). Uses the search index, falling back to get_items_for_display.
+        """
+        query = (query or "").strip()
+        if not query:
+            return [], False
+
+        ranked_ids = item_search_index.search(query)
+        if ranked_ids is not None:
+            ordered_ids = ItemService._order_ranked_ids(ranked_ids, False)
+            page_ids = ordered_ids[offset:offset + limit]
+            return ItemService._load_items_in_order(page_ids), len(ordered_ids) > offset + limit
+
+        items = ItemService.get_items_for_display(filters={'title_query': query}, limit=offset + limit + 1)
+        return items[offset:offset + limit], len(items) > offset + limit
+
+    @staticmethod
+    def get_parent_ids_with_active_variants(parent_item_ids):
+        """Returns the subset of parent_item_ids that have at least one active, current variant, in one query."""
+        parent_item_ids = list(set(parent_item_ids))
+        if not parent_item_ids:
+            return set()
+        rows = db.session.query(Item.parent_id).filter(
+            Item.parent_id.in_(parent_item_ids),
+            Item.is_current_version == True,
+            Item.is_active == True
+        ).group_by(Item.parent_id).all()
+        return {row.parent_id for row in rows}
+
+    @staticmethod
+    def preload_photos(items):
+        """Loads the photos collection of every item that does not have it loaded yet, in one query."""
+        item_ids = [item.id for item in items if item is not None and 'photos' in inspect(item).unloaded]
+        if item_ids:
+            Item.query.options(selectinload(Item.photos)).filter(Item.id.in_(item_ids)).all()
+
+    @staticmethod
+    def sync_item_caches(*items, removed_ids=()):
+        """Keeps in-process item caches, the catalogue version and the catalogue change log in step
+        after a committed write. Pass every item whose row changed, and the IDs of items that are
+        no longer current.
+        """
+        items = [item for item in items if item is not None]
+        ItemService._update_item_caches(items, removed_ids)
+        CatalogService.record_changes('item', set(removed_ids) | {item.id for item in items})
+
+    @staticmethod
+    def refresh_item_caches(item_ids):
+        """Brings the in-process item caches up to date with item rows written by another process
+        (see CatalogChangeFollower), or all of them if item_ids is None. Records nothing."""
+        if item_ids is None:
+            sku_cache.clear()
+            component_map_cache.clear()
+            item_search_index.build()
+            return
+        items = Item.query.filter(Item.id.in_(item_ids)).all() if item_ids else []
+        ItemService._update_item_caches(items, set(item_ids) - {item.id for item in items})
+
+    @staticmethod
+    def _update_item_caches(items, removed_ids):
+        for item_id in removed_ids:
+            item_search_index.remove(item_id)
+            sku_cache.invalidate_item(item_id)
+            component_map_cache.invalidate_item(item_id)
+        for item in items:
+            item_search_index.upsert(item)
+            sku_cache.invalidate_item(item.id)
+            sku_cache.invalidate_sku(item.sku)
+            component_map_cache.invalidate_item(item.id)
+
+    @staticmethod
+    def invalidate_item_caches(item_ids=()):
+        """For committed bulk writes that change item rows without loading them (e.g. reassigning
+        a deleted category's items): drops every cached item and logs `item_ids` as changed.
+        Titles, SKUs and parents are untouched by such writes, so the search index is kept."""
+        sku_cache.clear()
+        component_map_cache.clear()
+        CatalogService.record_changes('item', item_ids)
+
     @staticmethod
     def get_variants_for_parent(parent_item_id):
         """Fetches all active, current variants for a given parent item ID."""
-        return Item.query.filter_by(
+        return Item.query.options(selectinload(Item.photos)).filter_by(
             parent_id=parent_item_id, 
             is_current_version=True, 
             is_active=True
@@ -339,9 +535,16 @@ class ItemService:
                     new_version_data['parent_id'] = item_to_update.parent_id
 
 
+                # The new version starts its own stock ledger
+                new_version_data['stock_movement_seq'] = 0
                 new_item_version = Item(**new_version_data)
 
                 db.session.add(new_item_version)
+                db.session.flush()
+                StockService.record_counts(
+                    {item_to_update.id: 0, new_item_version.id: new_item_version.stock_quantity},
+                    'adjust', note=f'New version of item {item_to_update.id}'
+                )
                 db.session.commit() # Commit to get ID for new_item_version
 
                 # === Copy photos from old version to new version ===
@@ -378,6 +581,8 @@ class ItemService:
                     updated_fields = True
             
             if updated_fields:
+                if 'stock_quantity' in data and inspect(item_to_update).attrs.stock_quantity.history.has_changes():
+                    StockService.record_counts({item_to_update.id: item_to_update.stock_quantity}, 'adjust', note='Item edited')
                 db.session.add(item_to_update) # Add to session to mark for update
                 db.session.commit()
             
@@ -431,6 +636,8 @@ class ItemService:
         if not updated_item_instance and not create_new_version and 'stock_quantity' not in data and not image_files:
              return item_to_update, "No versionable changes detected and no new images."
 
+        ItemService.sync_item_caches(item_to_update, updated_item_instance)
+
         return updated_item_instance, None # Return the (potentially new version of) item
 
     @staticmethod
@@ -472,6 +679,10 @@ class ItemService:
                         current_app.logger.info(f"Parent item ID {parent_item_object.id} had its parent_id set to -1 as its last variant (item ID {original_item_id}) was deleted/deactivated.")
             
             db.session.commit()
+            if parent_updated_to_standalone:
+                ItemService.sync_item_caches(parent_item_object, removed_ids=(original_item_id,))
+            else:
+                ItemService.sync_item_caches(removed_ids=(original_item_id,))
             msg = f"Item {original_item_id} marked as inactive/non-current."
             if parent_updated_to_standalone:
                 msg += f" Parent {original_parent_id_of_deleted_item} updated to standalone."
@@ -4,17 +4,19 @@ from app.models.sale import Sale
 from decimal import Decimal
 from flask import current_app
 from app.services.sale_service import SaleService
-from app.services.xero_service import XeroService
-from app.utils.serializers import payment_to_dict, sale_to_dict
+from app.services.xero_outbox import XeroOutboxService
+from app.services.xero_daily_summary import XeroDailySummaryService
 
 class PaymentService:
     ALLOWED_PAYMENT_TYPES = ['Cash', 'Cheque', 'EFTPOS']
 
     @staticmethod
-    def record_payment(sale_id, data):
+    def record_payment(sale_id, data, expected_version=None):
         sale = Sale.query.get(sale_id)
         if not sale:
             return None, "Sale not found."
+        if expected_version is not None and expected_version != sale.version:
+            return None, SaleService.CONFLICT_ERROR
 
         payment_type = data.get('payment_type')
         amount_str = data.get('amount')
@@ -45,19 +47,21 @@ class PaymentService:
                 # payment_date is default NOW in model
             )
             db.session.add(new_payment)
+            # Sent to Xero by the outbox worker once this commits, so the till never waits on Xero
+            # (or, for walk-in sales in daily summary mode, with the day's summary)
+            if not XeroDailySummaryService.summarises(sale):
+                XeroOutboxService.enqueue('payment', sale_id, payment=new_payment)
+            # Applied in SQL so concurrent payments against one sale cannot lose an update. Not
+            # version-guarded, since payments only add to the counters and so never conflict with each
+            # other, but the version is bumped so a till holding the old one reloads before editing.
+            db.session.execute(
+                Sale.__table__.update().where(Sale.__table__.c.id == sale_id).values(
+                    amount_paid=Sale.__table__.c.amount_paid + amount,
+                    amount_due=Sale.__table__.c.amount_due - amount,
+                    version=Sale.__table__.c.version + 1
+                )
+            )
             db.session.commit()
-            
-            # Try to send to Xero, but continue even if it fails
-            try:
-                xero_service = XeroService()
-                sale_details = sale_to_dict(sale)
-                payment_details = payment_to_dict(new_payment)
-                xero_payment, error = xero_service.create_invoice_and_payment(sale_details, payment_details)
-                if error:
-                    current_app.logger.error(f"Failed to create Xero invoice and payment: {error}")
-            except Exception as xero_error:
-                # Log the error but continue with local processing
-                current_app.logger.error(f"Error sending payment to Xero: {xero_error}")
 
             # Check if sale is fully paid and update sale.status to 'Paid'
             updated_sale, status_message = SaleService.check_and_update_payment_status(sale_id)
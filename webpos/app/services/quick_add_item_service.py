@@ -2,6 +2,7 @@ from app import db
 from app.models import QuickAddItem, Item # Item might be needed for eager loading or joining if we expand to_dict
 from sqlalchemy.orm import selectinload
 from flask import current_app
+from app.services.catalog_service import CatalogService
 
 class QuickAddItemService:
 
@@ -63,6 +64,7 @@ class QuickAddItemService:
             )
             db.session.add(new_quick_add)
             db.session.commit()
+            CatalogService.record_changes('quick_add', [new_quick_add.id])
             return new_quick_add.to_dict()
         except ValueError as ve:
             db.session.rollback()
@@ -107,6 +109,7 @@ class QuickAddItemService:
             # Add more validation as needed for type changes etc.
 
             db.session.commit()
+            CatalogService.record_changes('quick_add', [quick_add_item_id])
             return qai.to_dict()
         except ValueError as ve:
             db.session.rollback()
@@ -129,6 +132,7 @@ class QuickAddItemService:
             
             db.session.delete(qai)
             db.session.commit()
+            CatalogService.record_changes('quick_add', [quick_add_item_id])
             return {"message": f"QuickAddItem {quick_add_item_id} deleted successfully."}
         except ValueError as ve: # Catch specific error if we want to return 404 vs 400
             db.session.rollback()
@@ -174,11 +178,13 @@ class QuickAddItemService:
                     # For now, we proceed to reorder only the items that were found.
 
                 updated_count = 0
+                moved_ids = []
                 for new_position, item_id in enumerate(target_item_ids):
                     if item_id in item_map:
                         item = item_map[item_id]
                         if item.position != new_position:
                             item.position = new_position
+                            moved_ids.append(item_id)
                             updated_count += 1
                     else:
                         # This ID was in ordered_ids_str but not found among items_to_reorder.
@@ -187,6 +193,7 @@ class QuickAddItemService:
 
             if updated_count > 0:
                 db.session.commit()
+                CatalogService.record_changes('quick_add', moved_ids)
             else:
                 # No actual position changes occurred among the found items.
                 # Or, potentially, no items were found if target_item_ids was empty or all invalid.
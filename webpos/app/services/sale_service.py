@@ -3,13 +3,41 @@ from app.models.sale import Sale
 from app.models.sale_item import SaleItem
 from app.models.item import Item
 from app.models.customer import Customer # Import if needed for validation
+from app.models.combination import CombinationItem, CombinationItemComponent
 from sqlalchemy.exc import IntegrityError
-from decimal import Decimal, ROUND_HALF_UP, ROUND_DOWN # Import ROUND_HALF_UP and ROUND_DOWN
+from decimal import Decimal, ROUND_HALF_UP
 from flask import current_app # Added for config access
 from app.services.xero_service import XeroService
+from app.services.xero_outbox import XeroOutboxService
+from app.services.xero_daily_summary import XeroDailySummaryService
+from app.services.stock_service import StockService
+from app.services.component_cache import component_map_cache
 from app.utils.serializers import sale_to_dict
+from app.utils.fieldsets import wants, sub_fieldset
+from app.utils import totals
+from app.utils.totals import to_cents, from_cents
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import func, select
+from datetime import date, datetime, time, timedelta
+from app.utils.pagination import keyset_paginate
+
+class SaleConflictError(Exception):
+    """A sale write lost an optimistic concurrency check (see SaleService._commit_sale)."""
+
 
 class SaleService:
+    # Error returned by mutations refused because the sale changed since the client (or this request) loaded it
+    CONFLICT_ERROR = "Sale was changed by another till. Reload it and try again."
+    # Columns of Sale maintained from its lines and payments (see _set_derived_totals)
+    TOTAL_COLUMNS = ('subtotal_gross', 'line_discount_total', 'gst_amount', 'grand_total', 'amount_paid', 'amount_due')
+    # Sortable columns for the sales summary, keyed by the prefix of the order_by parameter (e.g. 'updated_at_desc')
+    SUMMARY_ORDER_COLUMNS = {
+        'id': Sale.id,
+        'created_at': Sale.created_at,
+        'updated_at': Sale.updated_at
+    }
+
     @staticmethod
     def create_sale(data):
         try:
@@ -39,8 +67,67 @@ class SaleService:
         return Sale.query.get(sale_id)
 
     @staticmethod
-    def get_all_sales(filters=None):
-        query = Sale.query
+    def sale_graph_options(fields=None):
+        """Loader options that fetch everything sale_to_dict serialises (customer, lines with their
+        items and photos, payments) in a fixed number of queries, however many lines there are.
+        With a fieldset from app.utils.fieldsets, relations it leaves out are not loaded."""
+        options = []
+        if wants(fields, 'customer'):
+            options.append(joinedload(Sale.customer))
+        line_fields = sub_fieldset(fields, 'sale_items')
+        if wants(fields, 'sale_items'):
+            if wants(line_fields, 'item'):
+                item_loader = selectinload(Sale.sale_items).joinedload(SaleItem.item)
+                if wants(sub_fieldset(line_fields, 'item'), 'photos'):
+                    item_loader = item_loader.selectinload(Item.photos)
+                options.append(item_loader)
+            else:
+                options.append(selectinload(Sale.sale_items))
+        if wants(fields, 'payments'):
+            options.append(selectinload(Sale.payments))
+        return options
+
+    @staticmethod
+    def load_sale_graph(sale_id, fields=None):
+        """Loads a sale with the related rows it is serialised with (see sale_graph_options), so
+        reads, mutations and prints need no further queries per line. None if not found."""
+        return Sale.query.options(*SaleService.sale_graph_options(fields)).filter(Sale.id == sale_id).first()
+
+    @staticmethod
+    def _commit_sale(sale, recompute_status=True, original_status=None, expected_version=None):
+        """Finishes a sale mutation: refreshes the derived totals and payment status in memory,
+        moves stock if the sale entered or left 'Paid' (original_status defaults to the status
+        before this call) and commits once. Loaded state is kept after the commit so the caller
+        can serialise the same objects without reloading the graph.
+
+        The sale's version is bumped in the same UPDATE, guarded by `WHERE version = <loaded
+        version>` (Sale maps version as its version_id_col), so a write that raced with another
+        commit since the load fails instead of overwriting it. If the client passed the version it
+        last saw (expected_version), that must match the loaded one. Either failure raises
+        SaleConflictError (message CONFLICT_ERROR) and nothing is written."""
+        loaded_version = sale.version
+        if expected_version is not None and expected_version != loaded_version:
+            raise SaleConflictError(SaleService.CONFLICT_ERROR)
+        if original_status is None:
+            original_status = sale.status
+        # Set before anything below can autoflush, so the sale is written in a single UPDATE
+        sale.version = loaded_version + 1
+        session = db.session()
+        session.expire_on_commit = False
+        try:
+            SaleService._set_derived_totals(sale)
+            if recompute_status:
+                SaleService._apply_payment_status(sale)
+            SaleService._apply_stock_for_status_change(sale, original_status)
+            session.commit()
+        except StaleDataError:
+            raise SaleConflictError(SaleService.CONFLICT_ERROR)
+        finally:
+            session.expire_on_commit = True
+
+    @staticmethod
+    def get_all_sales(filters=None, fields=None):
+        query = Sale.query.options(*SaleService.sale_graph_options(fields))
 
         if filters:
             sale_id_filter = filters.get('sale_id')
@@ -71,13 +158,70 @@ class SaleService:
         return query.order_by(Sale.id.desc()).limit(50).all()
 
     @staticmethod
-    def get_sales_by_status(status_value):
+    def _parse_date_bound(value, name, end=False):
+        """Parses a YYYY-MM-DD date or ISO datetime filter. A bare end date covers that whole day,
+        so the bound returned for it is exclusive. Raises ValueError."""
+        try:
+            if len(value) == 10:
+                bound = datetime.combine(date.fromisoformat(value), time.min)
+                return bound + timedelta(days=1) if end else bound
+            return datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"{name} must be a date (YYYY-MM-DD) or an ISO datetime.")
+
+    @staticmethod
+    def get_sales_summary_page(filters=None, order_by='updated_at_desc', limit=50, cursor=None):
+        """Keyset-paginated sale summaries for the recall screens, in a single query: no lines or
+        payments are loaded, the totals are the stored columns and the line count is aggregated in
+        the same statement. Filters: status, sale_id, customer_query (name or phone), date_from and
+        date_to (on created_at, inclusive). Returns (rows, next_cursor, has_more); raises ValueError
+        for an unsupported order_by, a bad filter or a bad cursor."""
+        key, _, direction = (order_by or '').rpartition('_')
+        if key not in SaleService.SUMMARY_ORDER_COLUMNS or direction not in ('asc', 'desc'):
+            raise ValueError(f"Invalid order_by '{order_by}'. Use one of {sorted(SaleService.SUMMARY_ORDER_COLUMNS)} with _asc or _desc.")
+
+        line_count = select(func.count(SaleItem.id)).where(SaleItem.sale_id == Sale.id).correlate(Sale).scalar_subquery()
+        query = db.session.query(
+            Sale.id, Sale.status, Sale.customer_id,
+            Customer.name.label('customer_name'), Customer.phone.label('customer_phone'), Customer.email.label('customer_email'),
+            Sale.created_at, Sale.updated_at,
+            Sale.grand_total, Sale.amount_paid, Sale.amount_due,
+            line_count.label('line_count')
+        ).outerjoin(Customer, Sale.customer_id == Customer.id)
+
+        filters = filters or {}
+        if filters.get('status'):
+            query = query.filter(Sale.status == filters['status'])
+        if filters.get('sale_id'):
+            try:
+                query = query.filter(Sale.id == int(filters['sale_id']))
+            except ValueError:
+                raise ValueError("sale_id must be an integer.")
+        if filters.get('customer_query'):
+            customer_query = filters['customer_query']
+            query = query.filter(db.or_(
+                Customer.name.ilike(f"%{customer_query}%"),
+                Customer.phone.ilike(f"%{customer_query}%")
+            ))
+        if filters.get('date_from'):
+            query = query.filter(Sale.created_at >= SaleService._parse_date_bound(filters['date_from'], 'date_from'))
+        if filters.get('date_to'):
+            date_to = filters['date_to']
+            bound = SaleService._parse_date_bound(date_to, 'date_to', end=True)
+            query = query.filter(Sale.created_at < bound if len(date_to) == 10 else Sale.created_at <= bound)
+
+        return keyset_paginate(query, order_by, SaleService.SUMMARY_ORDER_COLUMNS[key], Sale.id,
+                               descending=direction == 'desc', limit=limit, cursor=cursor)
+
+    @staticmethod
+    def get_sales_by_status(status_value, fields=None):
         # Ensure the status_value is valid if using Enum strictly, though SQLAlchemy handles it
-        return Sale.query.filter_by(status=status_value).order_by(Sale.updated_at.desc()).all()
+        return Sale.query.options(*SaleService.sale_graph_options(fields)) \
+            .filter_by(status=status_value).order_by(Sale.updated_at.desc()).all()
 
     @staticmethod
-    def update_sale_status(sale_id, new_status):
-        sale = Sale.query.get(sale_id)
+    def update_sale_status(sale_id, new_status, expected_version=None):
+        sale = SaleService.load_sale_graph(sale_id)
         if not sale:
             return None, "Sale not found."
 
@@ -88,60 +232,34 @@ class SaleService:
         original_status = sale.status
         sale.status = new_status
 
-        # Handle stock adjustment if voiding a previously paid sale
-        if new_status == 'Void' and original_status == 'Paid':
-            updated_stock, stock_error = SaleService._update_stock_for_sale_items(sale, increment=True)
-            if not updated_stock:
-                # Rollback status change if stock adjustment fails?
-                # For now, log and proceed with status change.
-                db.session.rollback() # Rollback the status change if stock update fails critically
-                return None, f"Failed to void sale: stock adjustment error - {stock_error}"
-
         try:
-            db.session.commit()
+            if sale.xero_summary_id and new_status != original_status:
+                current_app.logger.warning(f"Sale {sale.id} was in Xero daily summary {sale.xero_summary_id}; adjust that invoice in Xero by hand")
+            elif new_status == 'Void' and original_status != 'Void' and sale.payments and not XeroDailySummaryService.summarises(sale):
+                # Voids the sale's Xero invoice after its queued payments have been sent
+                XeroOutboxService.enqueue('void', sale.id)
+            # Voiding (or reopening) a paid sale returns its stock; marking one paid deducts it
+            SaleService._commit_sale(sale, recompute_status=False, original_status=original_status, expected_version=expected_version)
             return sale, None
         except Exception as e:
             db.session.rollback()
             return None, str(e)
 
     @staticmethod
-    def add_item_to_sale(sale_id, item_data):
-        sale = Sale.query.get(sale_id)
+    def add_item_to_sale(sale_id, item_data, expected_version=None):
+        sale = SaleService.load_sale_graph(sale_id)
         if not sale:
             return None, "Sale not found."
         
         if sale.status in ['Paid', 'Void']:
             return None, f"Cannot add items to a sale with status '{sale.status}'."
 
-        item_id = item_data.get('item_id')
-        quantity = item_data.get('quantity', 1)
-        
-        item = Item.query.filter_by(id=item_id, is_current_version=True, is_active=True).first()
-        if not item:
-            return None, "Item not found or not active."
-
-        # price_at_sale is the item's master price at the time of adding to cart.
-        # Frontend sends this as 'price_at_sale' or just 'price' from itemService.js -> cart.js
-        # It should be item.price.
-        price_at_sale_value = item_data.get('price_at_sale', item.price) 
-        if price_at_sale_value is None: # Should not happen if item.price is mandatory
-            price_at_sale_value = item.price 
-
         try:
-            new_sale_item = SaleItem(
-                sale_id=sale_id,
-                item_id=item_id,
-                quantity=int(quantity),
-                price_at_sale=Decimal(price_at_sale_value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
-                # Initially, sale_price is the same as price_at_sale (no discount on add)
-                sale_price=Decimal(price_at_sale_value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
-                notes=item_data.get('notes'),
-                discount_type=None, # No discount on initial add
-                discount_value=None
-            )
-            db.session.add(new_sale_item)
-            db.session.commit()
-            SaleService.check_and_update_payment_status(sale_id) # This should recalculate sale totals
+            new_sale_item, error = SaleService._add_line(sale, item_data)
+            if error:
+                db.session.rollback()
+                return None, error
+            SaleService._commit_sale(sale, expected_version=expected_version) # Recalculates the status from the in-memory totals
             return new_sale_item, None
         except ValueError as ve:
             db.session.rollback()
@@ -151,71 +269,58 @@ class SaleService:
             db.session.rollback()
             current_app.logger.error(f"Exception adding item to sale: {e}")
             return None, str(e)
-    
+
     @staticmethod
-    def update_sale_item_details(sale_id, sale_item_id, data):
-        sale = Sale.query.get(sale_id)
+    def _add_line(sale, item_data, item=None):
+        """Appends a line to a loaded sale and adjusts its stored totals. Returns (sale_item, error).
+        Does not commit; raises ValueError on a malformed quantity or price."""
+        if item is None:
+            # Photos are loaded up front because the response embeds the item
+            item = Item.query.options(selectinload(Item.photos)).filter_by(id=item_data.get('item_id'), is_current_version=True, is_active=True).first()
+            if not item:
+                return None, "Item not found or not active."
+
+        # price_at_sale is the item's master price at the time of adding to cart.
+        # Frontend sends this as 'price_at_sale' or just 'price' from itemService.js -> cart.js
+        # It should be item.price.
+        price_at_sale_value = item_data.get('price_at_sale', item.price) 
+        if price_at_sale_value is None: # Should not happen if item.price is mandatory
+            price_at_sale_value = item.price 
+
+        new_sale_item = SaleItem(
+            item=item,
+            quantity=int(item_data.get('quantity', 1)),
+            price_at_sale=Decimal(price_at_sale_value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+            # Initially, sale_price is the same as price_at_sale (no discount on add)
+            sale_price=Decimal(price_at_sale_value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+            notes=item_data.get('notes'),
+            discount_type=None, # No discount on initial add
+            discount_value=None
+        )
+        sale.sale_items.append(new_sale_item)
+        SaleService._adjust_line_totals(sale, (0, 0), SaleService._line_amounts(new_sale_item))
+        return new_sale_item, None
+
+    @staticmethod
+    def update_sale_item_details(sale_id, sale_item_id, data, expected_version=None):
+        """Returns (sale, error); the sale is the updated one, ready to serialise."""
+        sale = SaleService.load_sale_graph(sale_id)
         if not sale:
             return None, "Sale not found."
         
         if sale.status in ['Paid', 'Void']:
             return None, f"Cannot modify items in a sale with status '{sale.status}'."
 
-        sale_item = SaleItem.query.filter_by(id=sale_item_id, sale_id=sale_id).first()
-        if not sale_item:
-            return None, "Sale item not found in this sale."
-
         try:
-            if 'quantity' in data:
-                new_quantity = int(data['quantity'])
-                if new_quantity == 0:
-                     return None, "Quantity must be a non-zero integer. To remove an item, use the remove item function."
-                sale_item.quantity = new_quantity
-            
-            # Discount handling
-            # price_at_sale is the original unit price and should not change during this update.
-            original_unit_price = Decimal(sale_item.price_at_sale)
-            new_effective_unit_price = original_unit_price # Start with original price
-
-            if 'discount_type' in data and 'discount_value' in data:
-                discount_type = data['discount_type']
-                raw_discount_value = data['discount_value']
-
-                if discount_type and raw_discount_value is not None:
-                    discount_value = Decimal(raw_discount_value)
-                    if discount_value < 0:
-                        return None, "Discount value cannot be negative."
-
-                    sale_item.discount_type = discount_type
-                    sale_item.discount_value = discount_value.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-                    if discount_type == 'Percentage':
-                        if not (0 <= discount_value <= 100):
-                            return None, "Percentage discount must be between 0 and 100."
-                        discount_amount = (original_unit_price * discount_value / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-                        new_effective_unit_price = original_unit_price - discount_amount
-                    elif discount_type == 'Absolute':
-                        new_effective_unit_price = original_unit_price - discount_value
-                    else:
-                        # Invalid discount type, revert to no discount for this update
-                        sale_item.discount_type = None
-                        sale_item.discount_value = None
-                        # new_effective_unit_price remains original_unit_price
-                        current_app.logger.warning(f"Invalid discount type '{discount_type}' provided for sale_item {sale_item.id}. Discount not applied.")
-                else: # Discount explicitly removed or not provided correctly
-                    sale_item.discount_type = None
-                    sale_item.discount_value = None
-                    # new_effective_unit_price remains original_unit_price
-            
-            # Ensure sale_price doesn't go below zero
-            sale_item.sale_price = max(Decimal('0.00'), new_effective_unit_price.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
-
-            if 'notes' in data:
-                sale_item.notes = data['notes']
-            
-            db.session.commit()
-            SaleService.check_and_update_payment_status(sale_id) # This should recalculate sale totals
-            return sale_item, None
+            sale_item = SaleService._find_line(sale, sale_item_id)
+            if not sale_item:
+                return None, "Sale item not found in this sale."
+            error = SaleService._update_line(sale, sale_item, data)
+            if error:
+                db.session.rollback()
+                return None, error
+            SaleService._commit_sale(sale, expected_version=expected_version) # Recalculates the status from the in-memory totals
+            return sale, None
         except ValueError as ve:
             db.session.rollback()
             current_app.logger.error(f"ValueError updating sale item: {ve} Data: {data}")
@@ -226,27 +331,257 @@ class SaleService:
             return None, str(e)
 
     @staticmethod
-    def remove_sale_item_from_sale(sale_id, sale_item_id):
-        sale = Sale.query.get(sale_id)
+    def _find_line(sale, sale_item_id):
+        return next((si for si in sale.sale_items if sale_item_id is not None and si.id == sale_item_id), None)
+
+    @staticmethod
+    def _update_line(sale, sale_item, data):
+        """Applies quantity, discount and notes changes to a line of a loaded sale and adjusts its
+        stored totals. Returns an error message or None. Does not commit; raises ValueError on bad input."""
+        old_amounts = SaleService._line_amounts(sale_item)
+        if 'quantity' in data:
+            new_quantity = int(data['quantity'])
+            if new_quantity == 0:
+                return "Quantity must be a non-zero integer. To remove an item, use the remove item function."
+            sale_item.quantity = new_quantity
+        
+        # Discount handling
+        # price_at_sale is the original unit price and should not change during this update.
+        original_unit_price = Decimal(sale_item.price_at_sale)
+        new_effective_unit_price = original_unit_price # Start with original price
+
+        if 'discount_type' in data and 'discount_value' in data:
+            discount_type = data['discount_type']
+            raw_discount_value = data['discount_value']
+
+            if discount_type and raw_discount_value is not None:
+                discount_value = Decimal(raw_discount_value)
+                if discount_value < 0:
+                    return "Discount value cannot be negative."
+
+                sale_item.discount_type = discount_type
+                sale_item.discount_value = discount_value.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+                if discount_type == 'Percentage':
+                    if not (0 <= discount_value <= 100):
+                        return "Percentage discount must be between 0 and 100."
+                    discount_amount = (original_unit_price * discount_value / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                    new_effective_unit_price = original_unit_price - discount_amount
+                elif discount_type == 'Absolute':
+                    new_effective_unit_price = original_unit_price - discount_value
+                else:
+                    # Invalid discount type, revert to no discount for this update
+                    sale_item.discount_type = None
+                    sale_item.discount_value = None
+                    # new_effective_unit_price remains original_unit_price
+                    current_app.logger.warning(f"Invalid discount type '{discount_type}' provided for sale_item {sale_item.id}. Discount not applied.")
+            else: # Discount explicitly removed or not provided correctly
+                sale_item.discount_type = None
+                sale_item.discount_value = None
+                # new_effective_unit_price remains original_unit_price
+        
+        # Ensure sale_price doesn't go below zero
+        sale_item.sale_price = max(Decimal('0.00'), new_effective_unit_price.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+
+        if 'notes' in data:
+            sale_item.notes = data['notes']
+
+        SaleService._adjust_line_totals(sale, old_amounts, SaleService._line_amounts(sale_item))
+        return None
+
+    @staticmethod
+    def remove_sale_item_from_sale(sale_id, sale_item_id, expected_version=None):
+        """Returns (sale, error); the sale is the updated one, ready to serialise."""
+        sale = SaleService.load_sale_graph(sale_id)
         if not sale:
             return False, "Sale not found."
 
         if sale.status in ['Paid', 'Void']:
             return False, f"Cannot remove items from a sale with status '{sale.status}'."
 
-        sale_item = SaleItem.query.filter_by(id=sale_item_id, sale_id=sale_id).first()
-        if not sale_item:
-            return False, "Sale item not found in this sale."
-        
         try:
-            db.session.delete(sale_item)
-            db.session.commit()
-            SaleService.check_and_update_payment_status(sale_id)
-            return True, None
+            _, error = SaleService._remove_line(sale, sale_item_id)
+            if error:
+                return False, error
+            SaleService._commit_sale(sale, expected_version=expected_version)
+            return sale, None
         except Exception as e:
             db.session.rollback()
             return False, str(e)
 
+    @staticmethod
+    def _remove_line(sale, sale_item_id):
+        """Removes a line from a loaded sale and adjusts its stored totals. Returns (sale_item, error).
+        Does not commit."""
+        sale_item = SaleService._find_line(sale, sale_item_id)
+        if not sale_item:
+            return None, "Sale item not found in this sale."
+        # delete-orphan cascade deletes the row
+        sale.sale_items.remove(sale_item)
+        SaleService._adjust_line_totals(sale, SaleService._line_amounts(sale_item), (0, 0))
+        return sale_item, None
+
+    @staticmethod
+    def _add_combo(sale, combo_item_id, quantity):
+        """Expands a combination item into its components x quantity. A component already on the
+        sale has its line quantity increased instead of getting a second line, as the till does.
+        Does not commit."""
+        combo = CombinationItem.query.options(
+            selectinload(CombinationItem.components).joinedload(CombinationItemComponent.component_item_record).selectinload(Item.photos)
+        ).filter_by(item_id=combo_item_id).first()
+        if not combo or not combo.components:
+            return "Combination item not found or has no components."
+
+        for component in combo.components:
+            item = component.component_item_record
+            if not item or not item.is_current_version or not item.is_active:
+                return f"Component item {component.component_item_id} not found or not active."
+            component_quantity = component.quantity * quantity
+            # Matched on the item, so lines added earlier in the same batch (not yet flushed) count too
+            existing_line = next((si for si in sale.sale_items if si.item is item), None)
+            if existing_line:
+                error = SaleService._update_line(sale, existing_line, {'quantity': existing_line.quantity + component_quantity})
+            else:
+                _, error = SaleService._add_line(sale, {'quantity': component_quantity}, item=item)
+            if error:
+                return error
+        return None
+
+    @staticmethod
+    def apply_sale_item_operations(sale_id, operations, expected_version=None):
+        """Applies a list of line operations to a sale in one transaction, with one payment-status
+        recalculation. Each operation is a dict with an `op` of:
+          add        item_id, quantity, optional price_at_sale and notes (as POST /items)
+          update     sale_item_id plus quantity/discount_type+discount_value/notes (as PUT /items/<id>)
+          remove     sale_item_id
+          add_combo  item_id of a combination item and quantity (default 1)
+        Returns (sale, error). If any operation fails nothing is applied, and the error names
+        the index of the failing operation."""
+        if not isinstance(operations, list) or not operations:
+            return None, "operations must be a non-empty list."
+
+        sale = SaleService.load_sale_graph(sale_id)
+        if not sale:
+            return None, "Sale not found."
+
+        if sale.status in ['Paid', 'Void']:
+            return None, f"Cannot modify items in a sale with status '{sale.status}'."
+
+        try:
+            for index, operation in enumerate(operations):
+                op = operation.get('op') if isinstance(operation, dict) else None
+                if op == 'add':
+                    if 'item_id' not in operation:
+                        error = "item_id is required."
+                    else:
+                        _, error = SaleService._add_line(sale, operation)
+                elif op == 'update':
+                    sale_item = SaleService._find_line(sale, operation.get('sale_item_id'))
+                    error = SaleService._update_line(sale, sale_item, operation) if sale_item else "Sale item not found in this sale."
+                elif op == 'remove':
+                    _, error = SaleService._remove_line(sale, operation.get('sale_item_id'))
+                elif op == 'add_combo':
+                    quantity = int(operation.get('quantity', 1))
+                    error = "Quantity must be a positive integer." if quantity < 1 else SaleService._add_combo(sale, operation.get('item_id'), quantity)
+                else:
+                    error = "Unknown op; expected add, update, remove or add_combo."
+                if error:
+                    db.session.rollback()
+                    return None, f"Operation {index}: {error}"
+            SaleService._commit_sale(sale, expected_version=expected_version) # One status recalculation for the whole batch
+            return sale, None
+        except (ValueError, TypeError, ArithmeticError) as e:
+            db.session.rollback()
+            current_app.logger.error(f"Invalid batch operation for sale {sale_id}: {e} Data: {operations}")
+            return None, "Invalid quantity, price or discount format provided."
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Exception applying batch operations to sale {sale_id}: {e}")
+            return None, str(e)
+
+    @staticmethod
+    def _line_amounts(sale_item):
+        """(gross, line discount) in cents that a sale line contributes to its sale's stored totals."""
+        return totals.line_amounts(
+            to_cents(sale_item.price_at_sale),
+            to_cents(sale_item.sale_price) if sale_item.sale_price is not None else None,
+            sale_item.quantity
+        )
+
+    @staticmethod
+    def _adjust_line_totals(sale, old_amounts, new_amounts):
+        """Moves the stored sums from one line contribution to another; (0, 0) stands for no line.
+        The derived totals are refreshed by _commit_sale."""
+        sale.subtotal_gross = from_cents(to_cents(sale.subtotal_gross) + new_amounts[0] - old_amounts[0])
+        sale.line_discount_total = from_cents(to_cents(sale.line_discount_total) + new_amounts[1] - old_amounts[1])
+
+    @staticmethod
+    def stored_sums(sale):
+        """(subtotal_gross, line_discount_total, overall discount, transaction_fee, amount_paid)
+        of a sale in cents, the inputs of totals.derive_totals."""
+        return (
+            to_cents(sale.subtotal_gross),
+            to_cents(sale.line_discount_total),
+            to_cents(sale.overall_discount_amount_applied),
+            to_cents(sale.transaction_fee),
+            to_cents(sale.amount_paid)
+        )
+
+    @staticmethod
+    def _set_derived_totals(sale):
+        """Recomputes the stored GST, grand total and amount due from the stored sums. Does not commit."""
+        derived = totals.derive_totals(*SaleService.stored_sums(sale), SaleService._get_gst_rate())
+        sale.gst_amount = from_cents(derived.gst_amount)
+        sale.grand_total = from_cents(derived.grand_total)
+        sale.amount_due = from_cents(derived.amount_due)
+
+    @staticmethod
+    def calculate_sale_totals(sale):
+        """Aggregates the stored totals from scratch from the sale's lines and payments, as a dict
+        keyed by TOTAL_COLUMNS. Used to verify and rebuild the stored values."""
+        subtotal_gross, line_discount_total = totals.line_sums(
+            (si.price_at_sale, si.sale_price, si.quantity) for si in sale.sale_items
+        )
+        amount_paid = sum(to_cents(p.amount) for p in sale.payments)
+        derived = totals.derive_totals(
+            subtotal_gross,
+            line_discount_total,
+            to_cents(sale.overall_discount_amount_applied),
+            to_cents(sale.transaction_fee),
+            amount_paid,
+            SaleService._get_gst_rate()
+        )
+        values = (subtotal_gross, line_discount_total, derived.gst_amount, derived.grand_total, amount_paid, derived.amount_due)
+        return {column: from_cents(value) for column, value in zip(SaleService.TOTAL_COLUMNS, values)}
+
+    @staticmethod
+    def document_totals(sale, include_fee=True):
+        """The stored totals in the shape the print templates use. Quotes are printed without the
+        EFTPOS fee, so with include_fee=False the totals are re-derived from the stored sums."""
+        subtotal_gross, line_discount_total, overall_discount, transaction_fee, amount_paid = SaleService.stored_sums(sale)
+        if not include_fee:
+            transaction_fee = 0
+        gst_rate = SaleService._get_gst_rate()
+        derived = totals.derive_totals(subtotal_gross, line_discount_total, overall_discount, transaction_fee, amount_paid, gst_rate)
+        if include_fee:
+            derived = derived._replace(
+                gst_amount=to_cents(sale.gst_amount),
+                grand_total=to_cents(sale.grand_total),
+                amount_due=to_cents(sale.amount_due)
+            )
+        return {
+            "subtotal_gross_original": from_cents(subtotal_gross),
+            "total_line_item_discounts": from_cents(line_discount_total),
+            "overall_discount_applied": from_cents(overall_discount),
+            "net_subtotal_final": from_cents(derived.net_subtotal),
+            "gst_total": from_cents(derived.gst_amount),
+            "gst_rate_percentage": gst_rate,
+            "eftpos_fee_amount": from_cents(transaction_fee),
+            "grand_total_final": from_cents(derived.grand_total),
+            "amount_paid_total": from_cents(amount_paid),
+            "amount_due_final": from_cents(derived.amount_due)
+        }
+
     @staticmethod
     def _calculate_sale_details(sale_id):
         sale = Sale.query.get(sale_id)
@@ -273,44 +608,74 @@ class SaleService:
         return sale_total, amount_paid, amount_due, total_tax_amount.quantize(Decimal('0.01'))
 
     @staticmethod
-    def _update_stock_for_sale_items(sale_instance, increment=False):
-        """ Helper method to update stock quantities for items in a sale. """
-        if not sale_instance:
-            return False, "Sale instance not provided."
+    def _apply_stock_for_status_change(sale, original_status):
+        """Stock is held against a sale while it is 'Paid': entering Paid deducts its lines and
+        leaving Paid (Void, or reopened) returns them. Does not commit."""
+        if (original_status == 'Paid') == (sale.status == 'Paid'):
+            return
+        SaleService._update_stock_for_sale_items(sale, increment=original_status == 'Paid')
 
-        try:
+    @staticmethod
+    def get_component_maps(combo_item_ids):
+        """Returns {combo_item_id: ((component_item_id, quantity, is_stock_tracked), ...)}, from
+        component_map_cache where possible and otherwise with one query for all missing combos."""
+        combo_item_ids = sorted(set(combo_item_ids))
+        maps, missing_ids = component_map_cache.get_many(combo_item_ids)
+        if missing_ids:
+            generation = component_map_cache.generation
+            loaded = {combo_id: [] for combo_id in missing_ids}
+            rows = db.session.query(
+                CombinationItem.item_id, CombinationItemComponent.component_item_id,
+                CombinationItemComponent.quantity, Item.is_stock_tracked
+            ).join(CombinationItemComponent, CombinationItemComponent.combination_item_id == CombinationItem.id) \
+             .join(Item, Item.id == CombinationItemComponent.component_item_id) \
+             .filter(CombinationItem.item_id.in_(missing_ids)) \
+             .order_by(CombinationItemComponent.id).all()
+            for combo_id, component_item_id, quantity, is_stock_tracked in rows:
+                loaded[combo_id].append((component_item_id, quantity, is_stock_tracked))
+            for combo_id, components in loaded.items():
+                component_map_cache.put(combo_id, components, generation=generation)
+                maps[combo_id] = tuple(components)
+        return maps
+
+    @staticmethod
+    def _update_stock_for_sale_items(sale_instance, increment=False):
+        """Appends one stock movement per distinct item to the ledger, in one INSERT. Deducting
+        ('sale') covers the tracked items of the lines, with combination item lines exploded into
+        their components (component quantity x line quantity) and aggregated with any other lines
+        of the same items. Returning ('void') reverses what the ledger holds for the sale, so it
+        matches the deduction even if a combo's components changed in between. No item row is
+        written, so concurrent sales of the same item don't contend; StockService.materialise
+        folds the movements into stock_quantity and deactivates sold-out items. Does not commit."""
+        if increment:
+            quantities = {item_id: -quantity for item_id, quantity in StockService.sale_net_movements(sale_instance.id).items()}
+        else:
+            quantities = {}
+            combo_quantities = {}
             for sale_item in sale_instance.sale_items:
-                item = Item.query.get(sale_item.item_id)
-                if item and item.is_stock_tracked:
-                    if increment:
-                        item.stock_quantity += sale_item.quantity
-                    else:
-                        # Prevent stock from going excessively negative if not allowed
-                        # This basic deduction assumes sufficient stock or allows negative stock
-                        item.stock_quantity -= sale_item.quantity
-                        if item.stock_quantity <= 0:
-                            item.show_on_website = False
-                            item.is_active = False
-            # db.session.commit() will be handled by the calling function
-            return True, None
-        except Exception as e:
-            # db.session.rollback() should be handled by the calling function
-            return False, str(e)
+                if sale_item.item is None:
+                    continue
+                if sale_item.item.is_stock_tracked:
+                    quantities[sale_item.item_id] = quantities.get(sale_item.item_id, 0) - sale_item.quantity
+                if sale_item.item.parent_id == -3:
+                    combo_quantities[sale_item.item_id] = combo_quantities.get(sale_item.item_id, 0) + sale_item.quantity
+            if combo_quantities:
+                for combo_item_id, components in SaleService.get_component_maps(combo_quantities).items():
+                    for component_item_id, component_quantity, is_stock_tracked in components:
+                        if is_stock_tracked:
+                            quantities[component_item_id] = quantities.get(component_item_id, 0) - component_quantity * combo_quantities[combo_item_id]
+        StockService.record_movements([
+            {'item_id': item_id, 'movement_type': 'void' if increment else 'sale', 'quantity': quantity, 'sale_id': sale_instance.id}
+            for item_id, quantity in sorted(quantities.items()) if quantity
+        ])
 
     @staticmethod
     def _get_gst_rate():
         return Decimal(current_app.config.get('GST_RATE_PERCENTAGE', '10'))
 
     @staticmethod
-    def _calculate_tax_on_net(amount_net, gst_rate_percentage):
-        if amount_net <= 0: # No tax on zero or negative totals
-            return Decimal('0.00')
-        tax = (amount_net * (gst_rate_percentage / Decimal('100'))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        return tax
-
-    @staticmethod
-    def apply_overall_sale_discount(sale_id, discount_type, discount_value_str, rounding_target=None):
-        sale = Sale.query.get(sale_id)
+    def apply_overall_sale_discount(sale_id, discount_type, discount_value_str, rounding_target=None, expected_version=None):
+        sale = SaleService.load_sale_graph(sale_id)
         if not sale:
             return None, "Sale not found."
 
@@ -322,94 +687,20 @@ class SaleService:
         except Exception:
             return None, "Invalid discount value format."
 
-        subtotal_before_overall_discount = sum(
-            (si.sale_price * si.quantity) for si in sale.sale_items if si.sale_price is not None and si.quantity is not None
-        )
-        subtotal_before_overall_discount = Decimal(subtotal_before_overall_discount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-        calculated_discount_amount = Decimal('0.00')
-
-        if discount_type == 'none':
-            sale.overall_discount_type = 'none'
-            sale.overall_discount_value = Decimal('0.00')
-            calculated_discount_amount = Decimal('0.00')
-        elif discount_type == 'percentage':
-            if not (0 <= discount_value <= 100):
-                return None, "Percentage discount must be between 0 and 100."
-            calculated_discount_amount = (subtotal_before_overall_discount * discount_value / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            sale.overall_discount_type = 'percentage'
-            sale.overall_discount_value = discount_value.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        elif discount_type == 'fixed':
-            if discount_value < 0:
-                return None, "Fixed discount value cannot be negative."
-            calculated_discount_amount = discount_value.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            # Cap discount at subtotal to prevent negative total from discount alone
-            calculated_discount_amount = min(calculated_discount_amount, subtotal_before_overall_discount)
-            sale.overall_discount_type = 'fixed'
-            sale.overall_discount_value = discount_value.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        elif discount_type == 'target_total':
-            if discount_value < 0:
-                return None, "Target total cannot be negative."
-            target_total_val = discount_value.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            # Discount is difference; if target is higher, discount is 0 (no price increase)
-            calculated_discount_amount = max(Decimal('0.00'), subtotal_before_overall_discount - target_total_val)
-            sale.overall_discount_type = 'target_total'
-            sale.overall_discount_value = target_total_val # Store the target total itself
-        else:
-            return None, f"Invalid discount type: {discount_type}."
-        
-        sale.overall_discount_amount_applied = calculated_discount_amount
-
-        # Apply rounding if specified
-        if rounding_target:
-            current_net_subtotal_before_tax = subtotal_before_overall_discount - sale.overall_discount_amount_applied
-            gst_rate = SaleService._get_gst_rate()
-            current_gst = SaleService._calculate_tax_on_net(current_net_subtotal_before_tax, gst_rate)
-            current_grand_total = current_net_subtotal_before_tax + current_gst
-            
-            rounded_grand_total = current_grand_total # Default to current if no rounding applies
-
-            if rounding_target == 'round_down_dollar':
-                # Round down to the nearest whole dollar
-                rounded_grand_total = current_grand_total.quantize(Decimal('1.00'), rounding=ROUND_DOWN)
-            elif rounding_target == 'round_down_ten_dollar':
-                # Round down to the nearest $10
-                rounded_grand_total = (current_grand_total // Decimal('10')) * Decimal('10')
-            
-            if rounded_grand_total < current_grand_total : # Ensure we only apply discount, not increase price
-                # The difference is the additional discount needed to reach the rounded total
-                # We need to find what discount on the pre-tax amount results in this rounded grand total
-                # Let R = rounded_grand_total, G = gst_rate_decimal (e.g., 0.10 for 10%)
-                # R = NewNetSubtotal * (1 + G) => NewNetSubtotal = R / (1 + G)
-                # AdditionalDiscount = current_net_subtotal_before_tax - NewNetSubtotal
-                # TotalAppliedDiscount = sale.overall_discount_amount_applied + AdditionalDiscount
-                
-                # Simpler: The rounding effectively adjusts the grand total. The difference is an extra discount amount.
-                # This discount amount is applied to the pre-tax value.
-                # The difference (current_grand_total - rounded_grand_total) is the amount of total price reduction.
-                # This reduction comes from the pre-tax amount.
-                # If R = T_net * (1+g) where T_net is net subtotal
-                # if R_new = T_net_new * (1+g)
-                # current_grand_total - rounded_grand_total = (T_net - T_net_new) * (1+g)
-                # T_net - T_net_new = (current_grand_total - rounded_grand_total) / (1+g)
-                # This is the additional pre-tax discount.
-                additional_pre_tax_discount = (current_grand_total - rounded_grand_total) / (Decimal('1') + gst_rate / Decimal('100'))
-                additional_pre_tax_discount = additional_pre_tax_discount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-                sale.overall_discount_amount_applied += additional_pre_tax_discount
-                # After rounding, the discount is effectively a fixed amount
-                sale.overall_discount_type = 'fixed' 
-                sale.overall_discount_value = sale.overall_discount_amount_applied 
-        
-        # Ensure overall_discount_amount_applied doesn't exceed subtotal_before_overall_discount
-        sale.overall_discount_amount_applied = min(sale.overall_discount_amount_applied, subtotal_before_overall_discount)
-        sale.overall_discount_amount_applied = max(Decimal('0.00'), sale.overall_discount_amount_applied) # Ensure not negative
+        subtotal_before_overall_discount = to_cents(sale.subtotal_gross) - to_cents(sale.line_discount_total)
+        try:
+            sale.overall_discount_type, stored_value, applied = totals.overall_discount(
+                subtotal_before_overall_discount, discount_type, discount_value, SaleService._get_gst_rate(), rounding_target
+            )
+        except ValueError as e:
+            db.session.rollback()
+            return None, str(e)
+        sale.overall_discount_value = from_cents(stored_value)
+        sale.overall_discount_amount_applied = from_cents(applied)
 
         try:
-            db.session.add(sale) # Add sale to session before commit
-            db.session.commit()
-            # After discount application, update payment status as totals might have changed
-            SaleService.check_and_update_payment_status(sale_id)
+            # Totals changed, so the payment status is recalculated in the same commit
+            SaleService._commit_sale(sale, expected_version=expected_version)
             return sale, None
         except Exception as e:
             db.session.rollback()
@@ -417,44 +708,56 @@ class SaleService:
             return None, f"Error applying overall discount: {str(e)}"
 
     @staticmethod
-    def check_and_update_payment_status(sale_id):
-        sale = Sale.query.get(sale_id)
+    def check_and_update_payment_status(sale_id, attempts=3):
+        sale = SaleService.load_sale_graph(sale_id)
         if not sale:
             current_app.logger.error(f"[check_and_update_payment_status] Sale ID {sale_id} not found.")
             return None, "Sale not found for payment status check."
 
-        subtotal_items = sum(
-            (si.sale_price * si.quantity) for si in sale.sale_items if si.sale_price is not None and si.quantity is not None
-        )
-        subtotal_items = Decimal(subtotal_items).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        try:
+            # Deducts stock if this payment settles the sale
+            SaleService._commit_sale(sale)
+            return sale, None
+        except SaleConflictError:
+            db.session.rollback()
+            if attempts <= 1:
+                return None, SaleService.CONFLICT_ERROR
+            # The status follows from the stored totals alone, so recomputing on a fresh load is safe
+            db.session.expire_all()
+            return SaleService.check_and_update_payment_status(sale_id, attempts - 1)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error committing sale status update for Sale ID {sale.id}: {e}")
+            return None, f"Error updating sale status: {str(e)}"
 
-        overall_discount_amount = Decimal(sale.overall_discount_amount_applied or '0.00').quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        
-        net_subtotal_after_overall_discount = subtotal_items - overall_discount_amount
-        
-        gst_rate = SaleService._get_gst_rate()
-        gst_amount = SaleService._calculate_tax_on_net(net_subtotal_after_overall_discount, gst_rate)
-        
-        final_billable_total = net_subtotal_after_overall_discount + gst_amount
-        
-        total_paid = sum(p.amount for p in sale.payments if p.amount is not None)
-        total_paid = Decimal(total_paid).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    @staticmethod
+    def _apply_payment_status(sale):
+        """Sets sale.status from its stored totals: paid once the payments cover the GST-inclusive
+        grand total (fee included), i.e. once amount_due reaches zero. Call after
+        _set_derived_totals. Does not commit.
+
+        This deliberately departs from the original rule, which judged payments against the net
+        subtotal with GST added on top and the EFTPOS fee left out: a taxed sale paid in full was
+        left 'Invoice' with nothing due, and the fee was never part of what had to be paid.
+        benchmark_totals.py pins both differences."""
+        final_billable_total = to_cents(sale.grand_total)
+        total_paid = to_cents(sale.amount_paid)
 
         original_status = sale.status
         
         # Determine new status based on final_billable_total and total_paid
         if sale.status not in ['Void', 'Quote']: 
-            if final_billable_total <= Decimal('0.00') and total_paid == Decimal('0.00'):
+            if final_billable_total <= 0 and total_paid == 0:
                  # If total is zero (or less, e.g. due to large discount) and nothing paid
                 if not sale.sale_items: # No items
                     sale.status = 'Open' # Can be open if it's an empty sale
                 else: # Items exist, but total is zero (e.g. 100% discount)
                     sale.status = 'Paid' # Effectively paid if total is zero
-            elif total_paid >= final_billable_total and final_billable_total > Decimal('0.00'):
+            elif total_paid >= final_billable_total and final_billable_total > 0:
                 sale.status = 'Paid'
-            elif total_paid > Decimal('0.00') and total_paid < final_billable_total:
+            elif total_paid > 0 and total_paid < final_billable_total:
                 sale.status = 'Invoice' 
-            elif total_paid == Decimal('0.00') and final_billable_total > Decimal('0.00'):
+            elif total_paid == 0 and final_billable_total > 0:
                 if sale.status != 'Open': # If it was Invoice or Paid, and now has balance and no payment, set to Open
                      sale.status = 'Open'
                 # else keep as Open
@@ -462,20 +765,12 @@ class SaleService:
             # it's effectively Paid if items exist (e.g. 100% discount) or Open if no items.
             # This is covered by the first condition in this block.
 
-
-        try:
-            if sale.status != original_status:
-                current_app.logger.info(f"Sale {sale.id} status changing from {original_status} to {sale.status}. Final Total: {final_billable_total}, Paid: {total_paid}")
-            db.session.commit() 
-            return sale, None
-        except Exception as e:
-            db.session.rollback()
-            current_app.logger.error(f"Error committing sale status update for Sale ID {sale.id}: {e}")
-            return None, f"Error updating sale status: {str(e)}"
+        if sale.status != original_status:
+            current_app.logger.info(f"Sale {sale.id} status changing from {original_status} to {sale.status}. Final Total: {from_cents(final_billable_total)}, Paid: {from_cents(total_paid)}")
 
     @staticmethod
-    def update_sale_details(sale_id, data):
-        sale = Sale.query.get(sale_id)
+    def update_sale_details(sale_id, data, expected_version=None):
+        sale = SaleService.load_sale_graph(sale_id)
         if not sale:
             return None, "Sale not found."
 
@@ -489,10 +784,11 @@ class SaleService:
                 if customer_id is not None:
                     customer = Customer.query.get(customer_id)
                     if not customer:
+                        db.session.rollback()
                         return None, "Customer not found for association."
-                    sale.customer_id = customer_id
+                    sale.customer = customer
                 else:
-                    sale.customer_id = None # Allow disassociating customer
+                    sale.customer = None # Allow disassociating customer
             
             if 'customer_notes' in data:
                 sale.customer_notes = data['customer_notes']
@@ -503,15 +799,15 @@ class SaleService:
             
             # Add other updatable fields as needed
 
-            db.session.commit() # updated_at is handled by model
+            SaleService._commit_sale(sale, recompute_status=False, expected_version=expected_version) # updated_at is handled by model
             return sale, None
         except Exception as e:
             db.session.rollback()
             return None, str(e)
 
     @staticmethod
-    def toggle_eftpos_fee(sale_id, is_enabled):
-        sale = Sale.query.get(sale_id)
+    def toggle_eftpos_fee(sale_id, is_enabled, expected_version=None):
+        sale = SaleService.load_sale_graph(sale_id)
         if not sale:
             return None, "Sale not found."
 
@@ -519,32 +815,15 @@ class SaleService:
             return None, f"Cannot modify fee on a sale with status '{sale.status}'."
 
         if is_enabled:
-            # Recalculate the total on which the fee is based
-            subtotal_gross = sum(
-                (si.price_at_sale * si.quantity) for si in sale.sale_items if si.price_at_sale is not None and si.quantity is not None
-            )
-            total_line_item_discounts = sum(
-                ((si.price_at_sale - si.sale_price) * si.quantity) 
-                for si in sale.sale_items 
-                if si.price_at_sale is not None and si.sale_price is not None and si.quantity is not None
-            )
-            overall_discount = sale.overall_discount_amount_applied or Decimal('0.00')
-            
-            # This is the GST-inclusive subtotal after all discounts
-            net_subtotal_inc_tax = subtotal_gross - total_line_item_discounts - overall_discount
-
+            # The fee is based on the GST-inclusive subtotal after all discounts
+            net_subtotal_inc_tax = to_cents(sale.subtotal_gross) - to_cents(sale.line_discount_total) - to_cents(sale.overall_discount_amount_applied)
             eftpos_fee_percentage = Decimal(current_app.config.get('EFTPOS_FEE_PERCENTAGE', '2'))
-            
-            # The final, GST-inclusive fee is a straight percentage of the GST-inclusive subtotal.
-            fee_inc_gst = (net_subtotal_inc_tax * eftpos_fee_percentage / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            
-            sale.transaction_fee = max(Decimal('0.00'), fee_inc_gst)
+            sale.transaction_fee = from_cents(totals.eftpos_fee(net_subtotal_inc_tax, eftpos_fee_percentage))
         else:
             sale.transaction_fee = Decimal('0.00')
 
         try:
-            db.session.commit()
-            SaleService.check_and_update_payment_status(sale_id)
+            SaleService._commit_sale(sale, expected_version=expected_version)
             return sale, None
         except Exception as e:
             db.session.rollback()
@@ -0,0 +1,218 @@
+import bisect
+import threading
+from flask import current_app
+from app import db
+from app.models.item import Item
+
+
+def _normalise(value):
+    return (value or "").strip().lower()
+
+
+def _trigrams(text):
+    """Returns the set of 3-character substrings of an already normalised string."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ItemSearchIndex:
+    """In-process trigram index over the title and SKU of current, active items.
+
+    Mirrors the `ILIKE '%term%'` semantics of the SQL search path: trigram postings
+    narrow the candidate set and a plain substring check confirms each hit, so the
+    results are identical to the database query without touching the items table.
+    A sorted array of (normalised title or SKU, id) keys serves prefix typeahead by
+    bisection. The index is built once at startup and kept in step by ItemService and
+    the item routes, and with other processes by CatalogChangeFollower; if it is not
+    ready, callers fall back to the SQL path.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {}   # item_id -> (parent_id, title, title_lower, sku_lower, sku, price)
+        self._postings = {}  # trigram -> set(item_id)
+        self._children = {}  # parent item_id -> set(variant item_id)
+        self._prefix_keys = []  # sorted (title_lower or sku_lower, item_id)
+        self._ready = False
+
+    @property
+    def is_ready(self):
+        return self._ready
+
+    def build(self):
+        """(Re)builds the index from the database. Returns True on success."""
+        try:
+            rows = db.session.query(Item.id, Item.parent_id, Item.title, Item.sku, Item.price).filter(
+                Item.is_current_version == True,
+                Item.is_active == True
+            ).all()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f"[ItemSearchIndex] Build failed, SQL search will be used: {e}")
+            with self._lock:
+                self._ready = False
+            return False
+
+        with self._lock:
+            self._entries = {}
+            self._postings = {}
+            self._children = {}
+            self._prefix_keys = []
+            for item_id, parent_id, title, sku, price in rows:
+                self._add(item_id, parent_id, title, sku, price, sort_keys=False)
+            self._prefix_keys.sort()
+            self._ready = True
+        current_app.logger.info(f"[ItemSearchIndex] Built index for {len(rows)} items.")
+        return True
+
+    def upsert(self, item):
+        """Adds or refreshes an item. Items that are no longer current/active are dropped."""
+        if item is None or item.id is None:
+            return
+        with self._lock:
+            self._remove(item.id)
+            if item.is_current_version and item.is_active:
+                self._add(item.id, item.parent_id, item.title, item.sku, item.price)
+
+    def remove(self, item_id):
+        with self._lock:
+            self._remove(item_id)
+
+    def search(self, term):
+        """Returns ranked IDs of items whose title or SKU contains `term`, or None if not ready.
+
+        Ranking: exact SKU match, then title/SKU prefix match, then word-prefix match,
+        then any other substring match; ties are broken alphabetically by title.
+        """
+        if not self._ready:
+            self.build()
+            if not self._ready:
+                return None
+
+        needle = _normalise(term)
+        if not needle:
+            return []
+
+        with self._lock:
+            if len(needle) >= 3:
+                candidates = None
+                # Intersect from the smallest posting list upwards
+                for gram in sorted(_trigrams(needle), key=lambda g: len(self._postings.get(g, ()))):
+                    posting = self._postings.get(gram)
+                    if not posting:
+                        return []
+                    candidates = set(posting) if candidates is None else candidates & posting
+                    if not candidates:
+                        return []
+            else:
+                candidates = self._entries.keys()
+
+            ranked = []
+            for item_id in candidates:
+                parent_id, title, title_lower, sku_lower = self._entries[item_id][:4]
+                if needle not in title_lower and needle not in sku_lower:
+                    continue
+                if sku_lower == needle:
+                    tier = 0
+                elif title_lower.startswith(needle) or sku_lower.startswith(needle):
+                    tier = 1
+                elif f" {needle}" in title_lower:
+                    tier = 2
+                else:
+                    tier = 3
+                ranked.append((tier, title_lower, item_id))
+
+        ranked.sort()
+        return [item_id for _, _, item_id in ranked]
+
+    def typeahead(self, prefix, limit=10, include_variants=False):
+        """Returns up to `limit` items whose title or SKU starts with `prefix`, in key order, as
+        dicts of id, sku, title, price and parent_id; or None if the index is not ready.
+        Served entirely from memory. As in item_to_dict, a parent without variants is reported
+        as standalone (-1)."""
+        if not self._ready:
+            self.build()
+            if not self._ready:
+                return None
+
+        needle = _normalise(prefix)
+        if not needle:
+            return []
+
+        results = []
+        seen = set()
+        with self._lock:
+            position = bisect.bisect_left(self._prefix_keys, (needle,))
+            while position < len(self._prefix_keys) and len(results) < limit:
+                key, item_id = self._prefix_keys[position]
+                position += 1
+                if not key.startswith(needle):
+                    break
+                if item_id in seen:
+                    continue
+                seen.add(item_id)
+                parent_id, title, _, _, sku, price = self._entries[item_id]
+                if not include_variants and parent_id is not None and parent_id > 0:
+                    continue
+                if parent_id == -2 and not self._children.get(item_id):
+                    parent_id = -1
+                results.append({
+                    'id': item_id,
+                    'sku': sku,
+                    'title': title,
+                    'price': float(price) if price is not None else None,
+                    'parent_id': parent_id
+                })
+        return results
+
+    def get_parent_id(self, item_id):
+        entry = self._entries.get(item_id)
+        return entry[0] if entry else None
+
+    def get_title(self, item_id):
+        entry = self._entries.get(item_id)
+        return entry[1] if entry else None
+
+    def get_variant_ids(self, parent_item_id):
+        with self._lock:
+            return list(self._children.get(parent_item_id, ()))
+
+    # Internal helpers; callers must hold self._lock
+
+    def _add(self, item_id, parent_id, title, sku, price, sort_keys=True):
+        title_lower = _normalise(title)
+        sku_lower = _normalise(sku)
+        self._entries[item_id] = (parent_id, title or "", title_lower, sku_lower, sku, price)
+        for gram in _trigrams(title_lower) | _trigrams(sku_lower):
+            self._postings.setdefault(gram, set()).add(item_id)
+        for key in {title_lower, sku_lower} - {""}:
+            if sort_keys:
+                bisect.insort(self._prefix_keys, (key, item_id))
+            else:
+                self._prefix_keys.append((key, item_id))
+        if parent_id is not None and parent_id > 0:
+            self._children.setdefault(parent_id, set()).add(item_id)
+
+    def _remove(self, item_id):
+        entry = self._entries.pop(item_id, None)
+        if entry is None:
+            return
+        parent_id, _, title_lower, sku_lower = entry[:4]
+        for gram in _trigrams(title_lower) | _trigrams(sku_lower):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(item_id)
+                if not posting:
+                    del self._postings[gram]
+        for key in {title_lower, sku_lower} - {""}:
+            position = bisect.bisect_left(self._prefix_keys, (key, item_id))
+            if position < len(self._prefix_keys) and self._prefix_keys[position] == (key, item_id):
+                del self._prefix_keys[position]
+        if parent_id is not None and parent_id > 0:
+            siblings = self._children.get(parent_id)
+            if siblings is not None:
+                siblings.discard(item_id)
+                if not siblings:
+                    del self._children[parent_id]
+
+
+item_search_index = ItemSearchIndex()
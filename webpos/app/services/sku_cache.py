@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict
+
+
+class SkuCache:
+    """Thread-safe LRU map from SKU to the serialised current item, used by barcode scans.
+
+    Entries are dropped by ItemService.sync_item_caches whenever an item is written, so a
+    cached entry always reflects the last committed state of the current item version (writes
+    from other processes are picked up from the change log by CatalogChangeFollower).
+    Misses are not cached. Readers take `generation` before loading from the database and
+    pass it to put(), so a load that raced with an invalidation is not cached.
+    """
+
+    def __init__(self, maxsize=5000):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # sku -> (item_id, item_dict)
+        self._sku_by_item_id = {}
+        self._generation = 0
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def get(self, sku):
+        with self._lock:
+            entry = self._entries.get(sku)
+            if entry is None:
+                return None
+            self._entries.move_to_end(sku)
+            return entry[1]
+
+    def put(self, sku, item_id, item_dict, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._discard_sku(sku)
+            self._discard_sku(self._sku_by_item_id.get(item_id))
+            self._entries[sku] = (item_id, item_dict)
+            self._sku_by_item_id[item_id] = sku
+            while len(self._entries) > self.maxsize:
+                _, (evicted_id, _) = self._entries.popitem(last=False)
+                self._sku_by_item_id.pop(evicted_id, None)
+
+    def invalidate_item(self, item_id):
+        with self._lock:
+            self._generation += 1
+            self._discard_sku(self._sku_by_item_id.get(item_id))
+
+    def invalidate_sku(self, sku):
+        with self._lock:
+            self._generation += 1
+            self._discard_sku(sku)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._sku_by_item_id.clear()
+
+    def _discard_sku(self, sku):
+        if sku is None:
+            return
+        entry = self._entries.pop(sku, None)
+        if entry is not None:
+            self._sku_by_item_id.pop(entry[0], None)
+
+
+sku_cache = SkuCache()
@@ -0,0 +1,219 @@
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, func, bindparam, insert, or_
+from app import db
+from app.models.item import Item
+from app.models.stock_movement import StockMovement
+from app.services.workers import PeriodicWorker
+
+# One fold at a time per process; the per-item compare-and-set below keeps concurrent folds
+# (another process, or a fold racing a direct write) from applying a movement twice
+_materialise_lock = threading.Lock()
+
+
+class StockService:
+    """Append-only stock ledger (see StockMovement).
+
+    Writers append movements instead of updating items.stock_quantity, so concurrent sales of a
+    fast-moving item never wait on its row lock. materialise() folds settled movements into
+    items.stock_quantity in the background; current_stock() adds the not yet folded ones for
+    reads that must be exact, and stock_at() answers point-in-time questions from the ledger.
+    """
+
+    MOVEMENT_TYPES = ('sale', 'void', 'adjust', 'import', 'stocktake')
+
+    @staticmethod
+    def record_movements(movements):
+        """Appends movements, given as dicts with item_id, movement_type, quantity and optionally
+        is_absolute, sale_id and note, in one INSERT. Does not commit."""
+        rows = [dict({'is_absolute': False, 'sale_id': None, 'note': None}, **movement) for movement in movements]
+        for row in rows:
+            if row['movement_type'] not in StockService.MOVEMENT_TYPES:
+                raise ValueError(f"Invalid stock movement type: {row['movement_type']}")
+        if rows:
+            db.session.execute(insert(StockMovement), rows)
+
+    @staticmethod
+    def record_counts(counts, movement_type, note=None):
+        """Appends absolute levels ({item_id: quantity}) as one movement each. Does not commit."""
+        StockService.record_movements([
+            {'item_id': item_id, 'movement_type': movement_type, 'quantity': quantity, 'is_absolute': True, 'note': note}
+            for item_id, quantity in counts.items()
+        ])
+
+    @staticmethod
+    def _fold(base, movements):
+        for movement in movements:
+            base = movement.quantity if movement.is_absolute else base + movement.quantity
+        return base
+
+    @staticmethod
+    def current_stock(item_ids):
+        """Returns {item_id: stock} including movements not yet folded into stock_quantity, in two queries."""
+        item_ids = list(set(item_ids))
+        if not item_ids:
+            return {}
+        rows = db.session.query(Item.id, Item.stock_quantity, Item.stock_movement_seq).filter(Item.id.in_(item_ids)).all()
+        pending = {}
+        for movement in StockMovement.query.join(Item, Item.id == StockMovement.item_id).filter(
+            StockMovement.item_id.in_(item_ids),
+            StockMovement.id > Item.stock_movement_seq
+        ).order_by(StockMovement.id.asc()):
+            pending.setdefault(movement.item_id, []).append(movement)
+        return {row.id: StockService._fold(row.stock_quantity, pending.get(row.id, [])) for row in rows}
+
+    @staticmethod
+    def stock_at(item_ids, at):
+        """Returns {item_id: stock at datetime `at`}, replayed from the ledger: the last absolute
+        level at or before `at` plus the changes after it. Items with no recorded level by then
+        (created later, or untracked) map to None."""
+        item_ids = list(set(item_ids))
+        if not item_ids:
+            return {}
+        latest_levels = db.session.query(
+            StockMovement.item_id, func.max(StockMovement.id).label('movement_id')
+        ).filter(
+            StockMovement.item_id.in_(item_ids),
+            StockMovement.is_absolute == True,
+            StockMovement.created_at <= at
+        ).group_by(StockMovement.item_id).subquery()
+
+        levels = dict(db.session.query(StockMovement.item_id, StockMovement.quantity)
+                      .join(latest_levels, latest_levels.c.movement_id == StockMovement.id).all())
+        changes = dict(db.session.query(StockMovement.item_id, func.sum(StockMovement.quantity))
+                       .join(latest_levels, latest_levels.c.item_id == StockMovement.item_id)
+                       .filter(
+                           StockMovement.id > latest_levels.c.movement_id,
+                           StockMovement.is_absolute == False,
+                           StockMovement.created_at <= at
+                       ).group_by(StockMovement.item_id).all())
+        return {item_id: levels[item_id] + int(changes.get(item_id) or 0) if item_id in levels else None for item_id in item_ids}
+
+    @staticmethod
+    def sale_net_movements(sale_id):
+        """Returns {item_id: net quantity} the ledger currently holds against a sale."""
+        rows = db.session.query(StockMovement.item_id, func.sum(StockMovement.quantity)) \
+            .filter(StockMovement.sale_id == sale_id).group_by(StockMovement.item_id).all()
+        return {item_id: int(quantity) for item_id, quantity in rows if quantity}
+
+    @staticmethod
+    def get_movements(item_id, limit=100):
+        """The item's most recent movements, newest first."""
+        return StockMovement.query.filter_by(item_id=item_id).order_by(StockMovement.id.desc()).limit(limit).all()
+
+    @staticmethod
+    def materialise(batch_size=5000, settle_seconds=None):
+        """Folds settled movements into items.stock_quantity, batch by batch, and returns how many
+        were folded. Each item's unfolded movements are those after its own stock_movement_seq,
+        so one that committed late is still folded, unless a later movement of the same item was
+        folded first; movements younger than settle_seconds (config STOCK_SETTLE_SECONDS) wait
+        for the next run to keep that from happening, and an item's fold stops at its first such
+        movement. Sold-out tracked items are deactivated, as sales did before."""
+        if settle_seconds is None:
+            settle_seconds = current_app.config.get('STOCK_SETTLE_SECONDS', 2)
+        cutoff = datetime.now() - timedelta(seconds=settle_seconds)
+        folded = 0
+        with _materialise_lock:
+            # (item_id, movement id) of the last row read this run; folded rows drop out of the
+            # query on their own, so this only steps past the unsettled ones
+            after = (0, 0)
+            unsettled = set()
+            while True:
+                # In (item_id, id) order, which ix_stock_movements_item_id_id serves per item
+                rows = db.session.query(StockMovement, Item.stock_movement_seq) \
+                    .join(Item, Item.id == StockMovement.item_id) \
+                    .filter(
+                        StockMovement.id > Item.stock_movement_seq,
+                        or_(StockMovement.item_id > after[0], and_(StockMovement.item_id == after[0], StockMovement.id > after[1]))
+                    ) \
+                    .order_by(StockMovement.item_id.asc(), StockMovement.id.asc()).limit(batch_size).all()
+                if not rows:
+                    break
+
+                by_item = {}
+                for movement, seq in rows:
+                    if movement.item_id in unsettled:
+                        continue
+                    if movement.created_at > cutoff:
+                        unsettled.add(movement.item_id)
+                        continue
+                    by_item.setdefault(movement.item_id, (seq, []))[1].append(movement)
+                if by_item:
+                    deactivated_ids = StockService._fold_batch(by_item)
+                    db.session.commit()
+                    StockService._sync_caches(by_item, deactivated_ids)
+                    folded += sum(len(movements) for _, movements in by_item.values())
+                after = (rows[-1][0].item_id, rows[-1][0].id)
+                if len(rows) < batch_size:
+                    break
+        return folded
+
+    @staticmethod
+    def fold_positions():
+        """{item_id: stock_movement_seq} of every item with folded movements. Every fold moves at
+        least one of them up, so their sum tells other processes that stock levels changed."""
+        return dict(db.session.query(Item.id, Item.stock_movement_seq).filter(Item.stock_movement_seq > 0).all())
+
+    @staticmethod
+    def fold_position_total():
+        return int(db.session.query(func.coalesce(func.sum(Item.stock_movement_seq), 0)).scalar())
+
+    @staticmethod
+    def _sync_caches(folded, deactivated_ids):
+        """After a fold of {item_id: (seen_seq, movements)}: cached barcode lookups carry the stock
+        level, so they are dropped, and the stock version moves (every ETag over stock levels).
+        Only the items a fold hid are logged as catalogue changes (which bumps the catalogue
+        version); a stock count alone leaves the catalogue as it was."""
+        from app.services.catalog_service import catalog_change_follower
+        from app.services.item_service import ItemService
+        from app.services.sku_cache import sku_cache
+        from app.services.versions import stock_version
+
+        for item_id in folded:
+            sku_cache.invalidate_item(item_id)
+        stock_version.bump()
+        # Already applied here, so the follower need not refresh them again
+        catalog_change_follower.mark_folded({item_id: movements[-1].id for item_id, (_, movements) in folded.items()})
+        if deactivated_ids:
+            ItemService.sync_item_caches(*Item.query.filter(Item.id.in_(deactivated_ids)).all())
+
+    @staticmethod
+    def _fold_batch(by_item):
+        """Applies {item_id: (seen_seq, movements)} with one executemany UPDATE per shape, each
+        guarded by stock_movement_seq still being the value read, and returns the IDs of the items
+        it deactivated for selling out. Does not commit."""
+        items = Item.__table__
+        relative, absolute = [], []
+        for item_id in sorted(by_item):
+            seen_seq, movements = by_item[item_id]
+            params = {'b_item_id': item_id, 'b_seen_seq': seen_seq, 'b_seq': movements[-1].id}
+            last_level = max((i for i, movement in enumerate(movements) if movement.is_absolute), default=None)
+            if last_level is None:
+                relative.append(dict(params, b_quantity=sum(movement.quantity for movement in movements)))
+            else:
+                absolute.append(dict(params, b_quantity=StockService._fold(0, movements[last_level:])))
+
+        guard = (items.c.id == bindparam('b_item_id'), items.c.stock_movement_seq == bindparam('b_seen_seq'))
+        if relative:
+            db.session.execute(items.update().where(*guard).values(
+                stock_quantity=items.c.stock_quantity + bindparam('b_quantity'), stock_movement_seq=bindparam('b_seq')
+            ), relative)
+        if absolute:
+            db.session.execute(items.update().where(*guard).values(
+                stock_quantity=bindparam('b_quantity'), stock_movement_seq=bindparam('b_seq')
+            ), absolute)
+
+        sold_ids = sorted(item_id for item_id, (_, movements) in by_item.items() if any(m.movement_type == 'sale' for m in movements))
+        if not sold_ids:
+            return []
+        # Sold out means hidden until restocked
+        sold_out = (items.c.id.in_(sold_ids), items.c.is_stock_tracked == True, items.c.stock_quantity <= 0, items.c.is_active == True)
+        deactivated_ids = [item_id for (item_id,) in db.session.execute(db.select(items.c.id).where(*sold_out))]
+        if deactivated_ids:
+            db.session.execute(items.update().where(items.c.id.in_(deactivated_ids), *sold_out[1:]).values(is_active=False, show_on_website=False))
+        return deactivated_ids
+
+
+# Folds in several processes are safe: each item's fold is a compare-and-set on its stock_movement_seq
+stock_materialiser = PeriodicWorker('stock-materialiser', StockService.materialise)
@@ -0,0 +1,40 @@
+import threading
+import uuid
+
+
+class VersionCounter:
+    """Monotonically increasing in-process version of a group of resources, used as an ETag.
+
+    Services bump it after every committed write that can change what the matching read
+    endpoints return. The token is unique per process start, so an ETag issued before a
+    restart never matches afterwards. Writes from other processes reach it through
+    CatalogChangeFollower (CATALOG_FOLLOW_INTERVAL): item, category, quick-add and customer
+    writes because they are logged with CatalogService.record_changes, and stock folds through
+    the items' fold positions.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.token = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._value = 0
+
+    @property
+    def value(self):
+        return self._value
+
+    @property
+    def etag(self):
+        return f"{self.name}-{self.token}-{self._value}"
+
+    def bump(self):
+        with self._lock:
+            self._value += 1
+            return self._value
+
+
+# Items, photos, variants, combinations and the quick-add grid (which embeds item details)
+catalogue_version = VersionCounter('catalogue')
+customer_version = VersionCounter('customers')
+# Item stock levels, moved by every fold of the stock ledger, which leaves the catalogue version alone
+stock_version = VersionCounter('stock')
@@ -0,0 +1,39 @@
+import threading
+from app import db
+
+
+class PeriodicWorker:
+    """Daemon thread calling `fn` in an application context every `interval` seconds. A failed
+    call is rolled back, logged and retried on the next tick; the session is removed after each
+    call either way."""
+
+    def __init__(self, name, fn):
+        self.name = name
+        self.fn = fn
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, app, interval):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                with app.app_context():
+                    try:
+                        self.fn()
+                    except Exception as e:
+                        db.session.rollback()
+                        app.logger.error(f"[{self.name}] {self.fn.__qualname__} failed, will retry: {e}")
+                    finally:
+                        db.session.remove()
+
+        self._thread = threading.Thread(target=run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
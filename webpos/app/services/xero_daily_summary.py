@@ -0,0 +1,284 @@
+import json
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import and_, case, exists, func
+from app import db
+from app.models.payment import Payment
+from app.models.sale import Sale
+from app.models.xero_daily_summary import XeroDailySummary
+from app.models.xero_outbox import XeroOutboxEvent
+from app.services.workers import PeriodicWorker
+
+# One run at a time per process
+_run_lock = threading.Lock()
+
+
+class XeroDailySummaryService:
+    """End-of-day summarised Xero journal (XERO_DAILY_SUMMARY mode).
+
+    Paid walk-in sales are not sent to Xero one by one: once their day is over, close_days() rolls
+    them into one XeroDailySummary per day and GST treatment, with set-based aggregates over the
+    sales and payments tables, and push_pending() sends each as a single invoice paid per tender
+    type. Sales with a customer still go through the outbox individually, as does any sale that
+    already has something queued there. The tree has no per-item tax codes, so the treatment is
+    the sale's: GST-inclusive if it carries GST, GST-free if not.
+
+    A summary is fixed once closed. Reopening or voiding a summarised sale afterwards is not sent
+    to Xero (it is logged); correct the day's invoice there by hand. Likewise, give a sale its
+    customer before taking payment, as walk-in payments are left for the summary.
+    """
+
+    @staticmethod
+    def is_enabled():
+        return bool(current_app.config.get('XERO_DAILY_SUMMARY'))
+
+    @staticmethod
+    def start_date():
+        """XERO_DAILY_SUMMARY_START as a date: sales created before it are never summarised (they
+        were sent individually). None if unset, which keeps close_days from running."""
+        start = current_app.config.get('XERO_DAILY_SUMMARY_START')
+        if isinstance(start, str):
+            return date.fromisoformat(start)
+        return start
+
+    @staticmethod
+    def summarises(sale):
+        """Whether a payment or void of the sale is left for the daily summary rather than queued
+        for Xero: walk-in sales in summary mode, unless already on the individual path."""
+        if not XeroDailySummaryService.is_enabled() or sale.customer_id is not None or sale.xero_invoice_id:
+            return False
+        return not db.session.query(exists().where(XeroOutboxEvent.sale_id == sale.id)).scalar()
+
+    @staticmethod
+    def _eligible(start, end):
+        """The unclaimed, fully paid walk-in sales created in [start, end) that never went to Xero on
+        their own. Paid by the stored totals: sales settled before the status rules counted GST as
+        included can still be 'Invoice' with nothing due (see SaleService._apply_payment_status)."""
+        return and_(
+            Sale.xero_summary_id.is_(None),
+            Sale.status.in_(('Paid', 'Invoice')),
+            Sale.amount_due <= 0,
+            Sale.created_at >= start,
+            Sale.created_at < end,
+            Sale.customer_id.is_(None),
+            Sale.xero_invoice_id.is_(None),
+            ~exists().where(XeroOutboxEvent.sale_id == Sale.id)
+        )
+
+    @staticmethod
+    def close_days(today=None):
+        """Claims the eligible sales of every day before `today` into new summaries (one per day
+        and tax treatment) and fixes their totals, all in one commit. Sales paid after their day
+        was closed go into another summary for that day on the next run. Returns the new summaries.
+
+        Safe to run in several processes at once: the claim re-checks that each sale is unclaimed,
+        so a sale goes into one summary only, and a summary left with no sales is dropped."""
+        start = XeroDailySummaryService.start_date()
+        if start is None:
+            current_app.logger.error("[XeroDailySummary] XERO_DAILY_SUMMARY_START is not set; no days closed")
+            return []
+        eligible = XeroDailySummaryService._eligible(datetime.combine(start, time.min), datetime.combine(today or date.today(), time.min))
+        is_gst_free = Sale.gst_amount == 0
+        treatment = case((is_gst_free, 'NoTax'), else_='Inclusive')
+        day = func.date(Sale.created_at)
+        groups = db.session.query(day, treatment).filter(eligible).group_by(day, treatment).order_by(day).all()
+        if not groups:
+            return []
+
+        summaries = []
+        sales = Sale.__table__
+        for summary_date, tax_treatment in groups:
+            summary_date = date.fromisoformat(str(summary_date))
+            day_start = datetime.combine(summary_date, time.min)
+            summary = XeroDailySummary(summary_date=summary_date, tax_treatment=tax_treatment)
+            db.session.add(summary)
+            db.session.flush()
+            # Written in SQL so neither the sales' versions nor their updated_at move (see XeroOutboxService._store_xero_ids)
+            db.session.execute(
+                sales.update().where(
+                    XeroDailySummaryService._eligible(day_start, day_start + timedelta(days=1)),
+                    is_gst_free if tax_treatment == 'NoTax' else ~is_gst_free
+                ).values(xero_summary_id=summary.id, updated_at=sales.c.updated_at)
+            )
+            summaries.append(summary)
+
+        by_id = {summary.id: summary for summary in summaries}
+        for summary_id, sale_count, net_amount, fee_amount, total_amount in db.session.query(
+            Sale.xero_summary_id, func.count(Sale.id), func.sum(Sale.grand_total - Sale.transaction_fee),
+            func.sum(Sale.transaction_fee), func.sum(Sale.grand_total)
+        ).filter(Sale.xero_summary_id.in_(by_id)).group_by(Sale.xero_summary_id):
+            summary = by_id[summary_id]
+            summary.sale_count = sale_count
+            summary.net_amount = Decimal(str(net_amount))
+            summary.fee_amount = Decimal(str(fee_amount))
+            summary.total_amount = Decimal(str(total_amount))
+
+        received = {}
+        for summary_id, payment_type, amount in db.session.query(
+            Sale.xero_summary_id, Payment.payment_type, func.sum(Payment.amount)
+        ).join(Payment, Payment.sale_id == Sale.id).filter(Sale.xero_summary_id.in_(by_id)).group_by(Sale.xero_summary_id, Payment.payment_type):
+            received.setdefault(summary_id, {})[payment_type] = Decimal(str(amount))
+
+        for summary in list(summaries):
+            if not summary.sale_count:
+                # Its sales changed between the grouping and the claim
+                db.session.delete(summary)
+                summaries.remove(summary)
+                continue
+            tenders = XeroDailySummaryService._tenders(summary.total_amount, received.get(summary.id, {}))
+            summary.tenders = json.dumps({payment_type: str(amount) for payment_type, amount in tenders.items()})
+        db.session.commit()
+        for summary in summaries:
+            current_app.logger.info(f"[XeroDailySummary] Closed {summary.summary_date} ({summary.tax_treatment}): {summary.sale_count} sales, {summary.total_amount}")
+        return summaries
+
+    @staticmethod
+    def _tenders(total, received):
+        """What to record in Xero per payment type: what was received, less the change given, which
+        comes out of the cash first, so the payments never exceed the invoice total."""
+        tenders = dict(received)
+        excess = sum(tenders.values(), Decimal('0')) - total
+        for payment_type in sorted(tenders, key=lambda payment_type: payment_type != 'Cash'):
+            if excess <= 0:
+                break
+            taken = min(excess, tenders[payment_type])
+            tenders[payment_type] -= taken
+            excess -= taken
+        return {payment_type: amount for payment_type, amount in tenders.items() if amount > 0}
+
+    @staticmethod
+    def push_pending(limit=50, xero_service=None):
+        """Sends up to `limit` due summaries, oldest first, committing each outcome, and returns
+        (sent, failed). Failures are retried with the outbox's backoff and attempt limit. Each
+        summary is claimed before it is sent (see _claim_due), so one pushed from several
+        processes at once still becomes a single invoice."""
+        from app.services.xero_service import xero_service as shared_xero_service
+        if xero_service is None:
+            xero_service = shared_xero_service
+
+        sent = failed = 0
+        summary_ids = XeroDailySummaryService._claim_due(limit)
+        if not summary_ids:
+            return 0, 0
+        due = XeroDailySummary.query.filter(XeroDailySummary.id.in_(summary_ids)).order_by(XeroDailySummary.id.asc()).all()
+        for summary in due:
+            details = XeroDailySummaryService._summary_details(summary)
+            try:
+                _, error = xero_service.create_summary_invoice(
+                    details, idempotency_key=f"basicpos-summary-{summary.id}",
+                    check_existing=summary.attempts > 0 or summary.last_error is not None
+                )
+            except Exception as e:
+                db.session.rollback()
+                error = f"{e.__class__.__name__}: {e}"
+            if details.get('xero_invoice_id') and details['xero_invoice_id'] != summary.xero_invoice_id:
+                summary.xero_invoice_id = details['xero_invoice_id']
+            if XeroDailySummaryService._record_outcome(summary, error):
+                sent += 1
+            else:
+                failed += 1
+            db.session.commit()
+        return sent, failed
+
+    @staticmethod
+    def _claim_due(limit):
+        """Claims up to `limit` due summaries and returns their IDs, oldest first, as
+        XeroOutboxService._claim_due does for events: a compare-and-set on the next_attempt_at
+        read, moved to the end of the lease (XERO_OUTBOX_LEASE_SECONDS). A summary whose lease
+        ran out is reclaimed with a last_error, so its next send looks for the invoice the dead
+        sender may have created. Commits the claims."""
+        now = datetime.now()
+        candidates = db.session.query(XeroDailySummary.id, XeroDailySummary.status, XeroDailySummary.next_attempt_at).filter(
+            XeroDailySummary.status.in_(('pending', 'sending')),
+            XeroDailySummary.next_attempt_at <= now
+        ).order_by(XeroDailySummary.id.asc()).limit(limit).all()
+        if not candidates:
+            return []
+
+        summaries = XeroDailySummary.__table__
+        lease_until = now + timedelta(seconds=current_app.config.get('XERO_OUTBOX_LEASE_SECONDS', 300))
+        claimed = []
+        for summary_id, seen_status, seen_next_attempt_at in candidates:
+            values = {'status': 'sending', 'next_attempt_at': lease_until}
+            if seen_status == 'sending':
+                values['last_error'] = func.coalesce(summaries.c.last_error, 'Send lease expired; the invoice may exist in Xero')
+            result = db.session.execute(
+                summaries.update().where(
+                    summaries.c.id == summary_id,
+                    summaries.c.status == seen_status,
+                    summaries.c.next_attempt_at == seen_next_attempt_at
+                ).values(**values)
+            )
+            if result.rowcount == 1:
+                claimed.append(summary_id)
+        db.session.commit()
+        return claimed
+
+    @staticmethod
+    def _summary_details(summary):
+        return {
+            'id': summary.id,
+            'summary_date': summary.summary_date.isoformat(),
+            'tax_treatment': summary.tax_treatment,
+            'sale_count': summary.sale_count,
+            'net_amount': str(summary.net_amount),
+            'fee_amount': str(summary.fee_amount),
+            'total_amount': str(summary.total_amount),
+            'tenders': json.loads(summary.tenders or '{}'),
+            'xero_invoice_id': summary.xero_invoice_id
+        }
+
+    @staticmethod
+    def _record_outcome(summary, error):
+        """Marks an attempted summary done, or failed with backoff (dead once out of attempts).
+        Returns whether it was sent. Does not commit."""
+        from app.services.xero_outbox import XeroOutboxService
+        summary.attempts += 1
+        if error is None:
+            summary.status = 'done'
+            summary.processed_at = datetime.now()
+            summary.last_error = None
+            return True
+
+        summary.last_error = error
+        if summary.attempts >= current_app.config.get('XERO_OUTBOX_MAX_ATTEMPTS', 10):
+            summary.status = 'dead'
+            current_app.logger.error(f"[XeroDailySummary] Summary {summary.id} ({summary.summary_date}) is dead after {summary.attempts} attempts: {error}")
+        else:
+            summary.status = 'pending'
+            summary.next_attempt_at = datetime.now() + XeroOutboxService.backoff(summary.attempts)
+            current_app.logger.warning(f"[XeroDailySummary] Summary {summary.id} failed (attempt {summary.attempts}), retrying at {summary.next_attempt_at}: {error}")
+        return False
+
+    @staticmethod
+    def run(today=None, xero_service=None):
+        """Closes the finished days and sends the pending summaries. Returns (sent, failed)."""
+        with _run_lock:
+            XeroDailySummaryService.close_days(today)
+            return XeroDailySummaryService.push_pending(xero_service=xero_service)
+
+    @staticmethod
+    def recent(limit=30):
+        """The latest summaries, newest first."""
+        return XeroDailySummary.query.order_by(XeroDailySummary.id.desc()).limit(limit).all()
+
+    @staticmethod
+    def requeue(summary_ids=None):
+        """Makes dead summaries (all of them, or those in summary_ids) due again with fresh
+        attempts. Returns how many were requeued."""
+        query = XeroDailySummary.query.filter(XeroDailySummary.status == 'dead')
+        if summary_ids is not None:
+            query = query.filter(XeroDailySummary.id.in_(summary_ids))
+        requeued = query.update({
+            XeroDailySummary.status: 'pending',
+            XeroDailySummary.attempts: 0,
+            XeroDailySummary.next_attempt_at: datetime.now()
+        }, synchronize_session=False)
+        db.session.commit()
+        return requeued
+
+
+# Workers in several processes are safe: days are closed and summaries sent under row-level claims
+xero_daily_summary_worker = PeriodicWorker('xero-daily-summary', XeroDailySummaryService.run)
@@ -0,0 +1,305 @@
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models.customer import Customer
+from app.models.sale import Sale
+from app.models.xero_outbox import XeroOutboxEvent
+from app.utils.serializers import sale_to_dict, payment_to_dict
+from app.services.workers import PeriodicWorker
+
+# One drain at a time per process
+_drain_lock = threading.Lock()
+
+
+class XeroOutboxService:
+    """Transactional outbox for Xero (see XeroOutboxEvent).
+
+    Payments and voids add an event to the session that commits them, so the till never waits
+    on Xero; drain() sends due events from the background, retrying failures with exponential
+    backoff until XERO_OUTBOX_MAX_ATTEMPTS, after which the event is dead until requeued.
+    """
+
+    EVENT_TYPES = ('payment', 'void')
+
+    @staticmethod
+    def enqueue(event_type, sale_id, payment=None):
+        """Adds an event to the session, to commit with the change it reports. Does not commit."""
+        if event_type not in XeroOutboxService.EVENT_TYPES:
+            raise ValueError(f"Invalid Xero outbox event type: {event_type}")
+        event = XeroOutboxEvent(event_type=event_type, sale_id=sale_id, payment=payment)
+        db.session.add(event)
+        return event
+
+    @staticmethod
+    def backoff(attempts):
+        """Delay before retrying an event that has failed `attempts` times: doubling from
+        XERO_OUTBOX_BACKOFF_SECONDS, capped at XERO_OUTBOX_MAX_BACKOFF_SECONDS."""
+        base = current_app.config.get('XERO_OUTBOX_BACKOFF_SECONDS', 30)
+        cap = current_app.config.get('XERO_OUTBOX_MAX_BACKOFF_SECONDS', 3600)
+        return timedelta(seconds=min(cap, base * 2 ** (attempts - 1)))
+
+    @staticmethod
+    def drain(limit=200, xero_service=None):
+        """Sends up to `limit` due events, oldest first, committing each outcome, and returns
+        (sent, failed). An event waits while an earlier one for the same sale is unsent (pending,
+        being sent or dead), so a void never overtakes the payment it undoes. Events are claimed
+        before they are sent (see _claim_due), so concurrent drains in other processes never send
+        the same one; claimed events left waiting are handed back at the end.
+
+        With XERO_BATCH_SIZE above 1, payments go in chunks of that many per Xero call (see
+        XeroService.create_invoices_and_payments); several payments of one sale can share a
+        chunk. Voids, and payments behind them, go one at a time."""
+        from app.services.xero_service import XeroService, xero_service as shared_xero_service
+
+        sent = failed = 0
+        with _drain_lock:
+            event_ids = XeroOutboxService._claim_due(limit)
+            if not event_ids:
+                return 0, 0
+            due = XeroOutboxEvent.query.options(joinedload(XeroOutboxEvent.payment)).filter(
+                XeroOutboxEvent.id.in_(event_ids)
+            ).order_by(XeroOutboxEvent.id.asc()).all()
+
+            unsent_by_sale = {}
+            for sale_id, event_id in db.session.query(XeroOutboxEvent.sale_id, XeroOutboxEvent.id).filter(
+                XeroOutboxEvent.sale_id.in_({event.sale_id for event in due}),
+                XeroOutboxEvent.status.in_(('pending', 'sending', 'dead'))
+            ).order_by(XeroOutboxEvent.id.asc()):
+                unsent_by_sale.setdefault(sale_id, []).append(event_id)
+
+            if xero_service is None:
+                xero_service = shared_xero_service
+            chunk_size = min(current_app.config.get('XERO_BATCH_SIZE', XeroService.MAX_BATCH_SIZE), XeroService.MAX_BATCH_SIZE)
+
+            handled = set()
+            if chunk_size > 1:
+                batchable = XeroOutboxService._batchable_payments(due, unsent_by_sale)
+                for start in range(0, len(batchable), chunk_size):
+                    chunk = batchable[start:start + chunk_size]
+                    try:
+                        errors = XeroOutboxService._send_payments(xero_service, chunk)
+                    except Exception as e:
+                        db.session.rollback()
+                        errors = [f"{e.__class__.__name__}: {e}"] * len(chunk)
+                    for event, error in zip(chunk, errors):
+                        if XeroOutboxService._record_outcome(event, error, unsent_by_sale[event.sale_id]):
+                            sent += 1
+                        else:
+                            failed += 1
+                        handled.add(event.id)
+                    db.session.commit()
+
+            for event in due:
+                unsent = unsent_by_sale[event.sale_id]
+                if event.id in handled or unsent[0] != event.id:
+                    continue
+                try:
+                    error = XeroOutboxService._send(xero_service, event)
+                except Exception as e:
+                    db.session.rollback()
+                    error = f"{e.__class__.__name__}: {e}"
+                if XeroOutboxService._record_outcome(event, error, unsent):
+                    sent += 1
+                else:
+                    failed += 1
+                handled.add(event.id)
+                db.session.commit()
+
+            waiting = [event.id for event in due if event.id not in handled]
+            if waiting:
+                XeroOutboxEvent.query.filter(
+                    XeroOutboxEvent.id.in_(waiting), XeroOutboxEvent.status == 'sending'
+                ).update({XeroOutboxEvent.status: 'pending', XeroOutboxEvent.next_attempt_at: datetime.now()}, synchronize_session=False)
+                db.session.commit()
+        return sent, failed
+
+    @staticmethod
+    def _claim_due(limit):
+        """Claims up to `limit` due events for this drain and returns their IDs, oldest first. Due
+        means pending and past next_attempt_at, or claimed by a sender whose lease ran out (it
+        died mid-send). Each claim is a compare-and-set on the next_attempt_at read, which it
+        moves to the end of the lease (XERO_OUTBOX_LEASE_SECONDS), so of several processes
+        draining at once exactly one gets each event. Commits the claims."""
+        now = datetime.now()
+        candidates = db.session.query(XeroOutboxEvent.id, XeroOutboxEvent.next_attempt_at).filter(
+            XeroOutboxEvent.status.in_(('pending', 'sending')),
+            XeroOutboxEvent.next_attempt_at <= now
+        ).order_by(XeroOutboxEvent.id.asc()).limit(limit).all()
+        if not candidates:
+            return []
+
+        outbox = XeroOutboxEvent.__table__
+        lease_until = now + timedelta(seconds=current_app.config.get('XERO_OUTBOX_LEASE_SECONDS', 300))
+        claimed = []
+        for event_id, seen_next_attempt_at in candidates:
+            result = db.session.execute(
+                outbox.update().where(
+                    outbox.c.id == event_id,
+                    outbox.c.status.in_(('pending', 'sending')),
+                    outbox.c.next_attempt_at == seen_next_attempt_at
+                ).values(status='sending', next_attempt_at=lease_until)
+            )
+            if result.rowcount == 1:
+                claimed.append(event_id)
+        db.session.commit()
+        return claimed
+
+    @staticmethod
+    def _batchable_payments(due, unsent_by_sale):
+        """The due payment events whose sale has nothing unsent before them but other payments
+        in the same selection, in ID order."""
+        selected, selected_ids = [], set()
+        for event in due:
+            if event.event_type != 'payment':
+                continue
+            unsent = unsent_by_sale[event.sale_id]
+            if all(event_id in selected_ids for event_id in unsent[:unsent.index(event.id)]):
+                selected.append(event)
+                selected_ids.add(event.id)
+        return selected
+
+    @staticmethod
+    def _record_outcome(event, error, unsent):
+        """Marks an attempted event done, or failed with backoff (dead once out of attempts), and
+        drops a done event from its sale's unsent IDs. Returns whether it was sent. Does not commit."""
+        event.attempts += 1
+        if error is None:
+            event.status = 'done'
+            event.processed_at = datetime.now()
+            event.last_error = None
+            unsent.remove(event.id)
+            return True
+
+        event.last_error = error
+        if event.attempts >= current_app.config.get('XERO_OUTBOX_MAX_ATTEMPTS', 10):
+            event.status = 'dead'
+            current_app.logger.error(f"[XeroOutbox] Event {event.id} ({event.event_type}, sale {event.sale_id}) is dead after {event.attempts} attempts: {error}")
+        else:
+            event.status = 'pending'
+            event.next_attempt_at = datetime.now() + XeroOutboxService.backoff(event.attempts)
+            current_app.logger.warning(f"[XeroOutbox] Event {event.id} failed (attempt {event.attempts}), retrying at {event.next_attempt_at}: {error}")
+        return False
+
+    @staticmethod
+    def _send(xero_service, event):
+        """Pushes one event to Xero. Returns None on success, else the error."""
+        if event.event_type == 'void':
+            sale = db.session.get(Sale, event.sale_id)
+            _, error = xero_service.void_sale_invoice(event.sale_id, invoice_id=sale.xero_invoice_id if sale else None)
+            if error is None and sale is not None and sale.xero_invoice_id:
+                # A reopened sale gets a new invoice
+                XeroOutboxService._store_xero_ids(sale, {'xero_invoice_id': None})
+            return error
+
+        from app.services.sale_service import SaleService
+        sale = SaleService.load_sale_graph(event.sale_id)
+        if not sale or not event.payment:
+            return "Sale or payment no longer exists."
+        sale_details = XeroOutboxService._sale_details(sale)
+        # The payment ID keeps a retry of a push that reached Xero from recording it twice
+        _, error = xero_service.create_invoice_and_payment(
+            sale_details, payment_to_dict(event.payment), idempotency_key=f"basicpos-payment-{event.payment.id}",
+            check_existing=XeroOutboxService._attempted(event)
+        )
+        XeroOutboxService._store_xero_ids(sale, sale_details)
+        return error
+
+    @staticmethod
+    def _send_payments(xero_service, events):
+        """Pushes payment events in one batch. Returns their errors (None for sent), in order."""
+        from app.services.sale_service import SaleService
+        sales = {sale.id: sale for sale in Sale.query.options(*SaleService.sale_graph_options()).filter(
+            Sale.id.in_({event.sale_id for event in events})
+        )}
+        sendable = [event for event in events if event.sale_id in sales and event.payment]
+        results = {}
+        if sendable:
+            # Same chunk, same key: a retried call that had reached Xero is not applied twice
+            payment_ids = ','.join(str(event.payment_id) for event in sendable)
+            idempotency_key = f"basicpos-payments-{hashlib.sha256(payment_ids.encode()).hexdigest()[:40]}"
+            sale_details = {sale_id: XeroOutboxService._sale_details(sale) for sale_id, sale in sales.items()}
+            entries = [(sale_details[event.sale_id], payment_to_dict(event.payment)) for event in sendable]
+            outcomes = xero_service.create_invoices_and_payments(
+                entries, idempotency_key=idempotency_key, check_existing=any(XeroOutboxService._attempted(event) for event in sendable)
+            )
+            for event, (_, error) in zip(sendable, outcomes):
+                results[event.id] = error
+            for sale_id, details in sale_details.items():
+                XeroOutboxService._store_xero_ids(sales[sale_id], details)
+        return [results.get(event.id, "Sale or payment no longer exists.") for event in events]
+
+    @staticmethod
+    def _attempted(event):
+        """Whether an earlier send of the event may have reached Xero (requeued events keep their last error)."""
+        return event.attempts > 0 or event.last_error is not None
+
+    @staticmethod
+    def _sale_details(sale):
+        """sale_to_dict plus the stored Xero IDs, which XeroService uses to skip its lookups."""
+        sale_details = sale_to_dict(sale)
+        sale_details['xero_invoice_id'] = sale.xero_invoice_id
+        if sale_details['customer'] is not None:
+            sale_details['customer']['xero_contact_id'] = sale.customer.xero_contact_id
+        return sale_details
+
+    @staticmethod
+    def _store_xero_ids(sale, sale_details):
+        """Saves the Xero IDs XeroService found or created into sale_details. Written in SQL so
+        neither the sale's version nor its updated_at moves: tills need not reload for this, and
+        the sale keeps its place in the lists. Does not commit."""
+        invoice_id = sale_details.get('xero_invoice_id')
+        if invoice_id != sale.xero_invoice_id:
+            db.session.execute(
+                Sale.__table__.update().where(Sale.__table__.c.id == sale.id)
+                .values(xero_invoice_id=invoice_id, updated_at=Sale.__table__.c.updated_at)
+            )
+        customer_details = sale_details.get('customer')
+        if customer_details and customer_details.get('xero_contact_id') and sale.customer.xero_contact_id != customer_details['xero_contact_id']:
+            db.session.execute(
+                Customer.__table__.update().where(Customer.__table__.c.id == sale.customer_id)
+                .values(xero_contact_id=customer_details['xero_contact_id'])
+            )
+
+    @staticmethod
+    def stats(dead_limit=20):
+        """Queue depth per status, the age of the oldest unsent event (lag) and the latest dead events."""
+        counts = dict(db.session.query(XeroOutboxEvent.status, func.count(XeroOutboxEvent.id)).group_by(XeroOutboxEvent.status).all())
+        oldest_pending, next_attempt = db.session.query(
+            func.min(XeroOutboxEvent.created_at), func.min(XeroOutboxEvent.next_attempt_at)
+        ).filter(XeroOutboxEvent.status.in_(('pending', 'sending'))).one()
+        last_sent = db.session.query(func.max(XeroOutboxEvent.processed_at)).filter(XeroOutboxEvent.status == 'done').scalar()
+        dead = XeroOutboxEvent.query.filter_by(status='dead').order_by(XeroOutboxEvent.id.desc()).limit(dead_limit).all()
+        return {
+            'pending': counts.get('pending', 0),
+            'sending': counts.get('sending', 0),
+            'dead': counts.get('dead', 0),
+            'done': counts.get('done', 0),
+            'oldest_pending_at': oldest_pending,
+            'lag_seconds': (datetime.now() - oldest_pending).total_seconds() if oldest_pending else 0,
+            'next_attempt_at': next_attempt,
+            'last_sent_at': last_sent,
+            'dead_events': dead
+        }
+
+    @staticmethod
+    def requeue(event_ids=None):
+        """Makes dead events (all of them, or those in event_ids) due again with fresh attempts.
+        Returns how many were requeued."""
+        query = XeroOutboxEvent.query.filter(XeroOutboxEvent.status == 'dead')
+        if event_ids is not None:
+            query = query.filter(XeroOutboxEvent.id.in_(event_ids))
+        requeued = query.update({
+            XeroOutboxEvent.status: 'pending',
+            XeroOutboxEvent.attempts: 0,
+            XeroOutboxEvent.next_attempt_at: datetime.now()
+        }, synchronize_session=False)
+        db.session.commit()
+        return requeued
+
+
+# Workers in several processes are safe: each event is claimed by exactly one drain
+xero_outbox_worker = PeriodicWorker('xero-outbox', XeroOutboxService.drain)
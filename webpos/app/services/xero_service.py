@@ -1,55 +1,122 @@
 import logging
+import threading
+import time
 from datetime import datetime
+import requests
 from xero_python.api_client import ApiClient
 from xero_python.api_client.configuration import Configuration
 from xero_python.api_client.oauth2 import OAuth2Token
 from xero_python.exceptions import OpenApiException
 from xero_python.identity import IdentityApi
-from xero_python.accounting import AccountingApi, Contact, Contacts, Invoice, Invoices, LineItem, Payment, Payments, Account, LineAmountTypes
+from xero_python.accounting import AccountingApi, Contact, Contacts, Invoice, Invoices, LineItem, Payment, Payments, PaymentDelete, Account, LineAmountTypes
 import json
 import os
 from flask import current_app
 from decimal import Decimal
 
-logging.basicConfig(level=logging.DEBUG)
+CREDENTIALS_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'xero_credentials.json')
+TOKEN_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'xero_token.json')
+TOKEN_URL = "https://identity.xero.com/connect/token"
 
 class XeroService:
+    """Xero accounting client. One instance (xero_service, below) serves the whole process: the
+    credentials and token are read from disk once and kept in memory, and the ApiClient, with
+    its HTTP connection pool, is built once and reused."""
+
+    # Elements per create call in create_invoices_and_payments, the most Xero recommends
+    MAX_BATCH_SIZE = 50
+    # Refresh the access token when it has less than this long left
+    REFRESH_MARGIN_SECONDS = 300
+
     def __init__(self):
+        self._api_client = None
+        self.xero_credentials = None
+        self._token = None
+        self.tenant_id = None
+        # Contact IDs of sales with no customer row to store them on (the walk-in contact)
+        self._contact_ids = {}
+        self._lock = threading.Lock()
+        self._http = requests.Session()
+
+    @property
+    def api_client(self):
+        """The shared ApiClient, built on first use. None if the credentials cannot be read
+        (tried again on the next call)."""
+        if self._api_client is None:
+            with self._lock:
+                if self._api_client is None:
+                    self._api_client = self._build_api_client()
+        return self._api_client
+
+    def _build_api_client(self):
         try:
-            with open(os.path.join(os.path.dirname(__file__), '..', '..', 'xero_credentials.json')) as f:
+            with open(CREDENTIALS_PATH) as f:
                 self.xero_credentials = json.load(f)
-            
+
             # Extract only the client_id and client_secret for OAuth2Token
             oauth2_params = {
                 'client_id': self.xero_credentials.get('client_id'),
                 'client_secret': self.xero_credentials.get('client_secret')
             }
-            
-            self.api_client = ApiClient(
+
+            api_client = ApiClient(
                 Configuration(
-                    debug=True,
+                    debug=False,
                     oauth2_token=OAuth2Token(**oauth2_params)
                 ),
                 pool_threads=1,
             )
-            
-            # Register token getter and saver
-            @self.api_client.oauth2_token_getter
+
+            # Register token getter
+            @api_client.oauth2_token_getter
             def get_oauth2_token():
                 return self._get_token()
+
+            return api_client
         except FileNotFoundError:
             logging.error("xero_credentials.json not found.")
-            self.api_client = None
+            return None
         except Exception as e:
             logging.error(f"Failed to initialize Xero API client: {e}")
-            self.api_client = None
+            return None
+
+    def _token_is_fresh(self, token):
+        return token.get('expires_at') is None or token['expires_at'] - time.time() > self.REFRESH_MARGIN_SECONDS
 
     def _get_token(self):
-        logging.debug("Getting Xero token...")
+        """The access token, from memory after the first read of xero_token.json, refreshed
+        REFRESH_MARGIN_SECONDS before it expires. The lock makes concurrent callers wait for
+        one refresh rather than each refreshing (which would spend the single-use refresh token
+        twice)."""
+        token = self._token
+        if token is not None and self._token_is_fresh(token):
+            return token
+
+        with self._lock:
+            if self._token is None:
+                self._token = self._read_token()
+            token = self._token
+            if token is None or self._token_is_fresh(token):
+                return token
+
+            logging.debug("Xero token about to expire, refreshing...")
+            refreshed = self._refresh_token(token)
+            if refreshed is not None:
+                self._token = refreshed
+                return refreshed
+            if token['expires_at'] > time.time():
+                # Still usable; the next call retries the refresh
+                return token
+            self._token = None
+            return None
+
+    def _read_token(self):
+        """The token in xero_token.json, with expires_at as a timestamp (the file may hold an ISO
+        date, or only the expires_in of the token response, counted from when it was written)."""
         try:
-            with open(os.path.join(os.path.dirname(__file__), '..', '..', 'xero_token.json')) as f:
+            with open(TOKEN_PATH) as f:
                 token_data = json.load(f)
-            
+
             # Check if the token data has the new structure with tenant_id
             if isinstance(token_data, dict) and 'token' in token_data:
                 self.tenant_id = token_data.get('tenant_id')
@@ -59,16 +126,10 @@ class XeroService:
                 self.tenant_id = None
                 token = token_data
 
-            # Check if token is expired or about to expire (within 5 minutes)
-            if isinstance(token, dict) and 'expires_at' in token:
-                expires_at = datetime.fromisoformat(token['expires_at'])
-                if expires_at <= datetime.now():
-                    logging.debug("Token expired, refreshing...")
-                    return self._refresh_token(token)
-                elif (expires_at - datetime.now()).total_seconds() < 300:  # 5 minutes
-                    logging.debug("Token about to expire, refreshing...")
-                    return self._refresh_token(token)
-            
+            if isinstance(token.get('expires_at'), str):
+                token['expires_at'] = datetime.fromisoformat(token['expires_at']).timestamp()
+            elif token.get('expires_at') is None and token.get('expires_in'):
+                token['expires_at'] = os.path.getmtime(TOKEN_PATH) + token['expires_in']
             return token
 
         except FileNotFoundError:
@@ -81,25 +142,28 @@ class XeroService:
             return None
 
     def _refresh_token(self, old_token):
-        """Refresh the OAuth2 token using the refresh token."""
+        """Exchanges the refresh token for a new token and saves it. None on failure."""
         try:
-            if not isinstance(old_token, dict) or 'refresh_token' not in old_token:
+            if not old_token.get('refresh_token') or not self.xero_credentials:
                 logging.error("No refresh token available")
                 return None
 
-            # Get new token using refresh token
-            new_token = self.api_client.oauth2_token.refresh_token(
-                refresh_token=old_token['refresh_token']
+            response = self._http.post(
+                TOKEN_URL,
+                data={'grant_type': 'refresh_token', 'refresh_token': old_token['refresh_token']},
+                auth=(self.xero_credentials.get('client_id'), self.xero_credentials.get('client_secret')),
+                headers={'Content-Type': 'application/x-www-form-urlencoded'},
+                timeout=30
             )
+            if response.status_code != 200:
+                logging.error(f"Xero token refresh failed: {response.status_code} - {response.text}")
+                return None
+            new_token = response.json()
+            new_token['expires_at'] = time.time() + new_token.get('expires_in', 1800)
 
             # Save the new token
-            token_data = {
-                'token': new_token,
-                'tenant_id': self.tenant_id
-            }
-            
-            with open(os.path.join(os.path.dirname(__file__), '..', '..', 'xero_token.json'), 'w') as f:
-                json.dump(token_data, f)
+            with open(TOKEN_PATH, 'w') as f:
+                json.dump({'token': new_token, 'tenant_id': self.tenant_id}, f)
 
             logging.debug("Successfully refreshed Xero token")
             return new_token
@@ -108,6 +172,16 @@ class XeroService:
             logging.error(f"Error refreshing Xero token: {e}")
             return None
 
+    def reset_token(self):
+        """Forgets the in-memory token, e.g. after /callback saved a new one."""
+        with self._lock:
+            self._token = None
+            self.tenant_id = None
+
+    def _accounting_api(self):
+        # XERO_API_URL points the client at another host, e.g. a local mock of the accounting API
+        return AccountingApi(self.api_client, base_url=current_app.config.get('XERO_API_URL'))
+
     def _get_tenant_id(self):
         # Get the tenant ID from the token file or use a default for testing
         if hasattr(self, 'tenant_id') and self.tenant_id:
@@ -128,56 +202,12 @@ class XeroService:
         # Get the tenant ID from the token file
         xero_tenant_id = self._get_tenant_id()
             
-        accounting_api = AccountingApi(self.api_client)
+        accounting_api = self._accounting_api()
 
         logging.debug(f"Creating Xero invoice for sale ID: {sale_details['id']}")
         
         try:
-            gst_rate = Decimal(current_app.config.get('GST_RATE_PERCENTAGE', '10')) / Decimal('100')
-            gst_divisor = Decimal('1') + gst_rate
-
-            line_items = []
-            for item in sale_details['sale_items']:
-                item_title = item.get('item', {}).get('title')
-                if not item_title:
-                    logging.warning(f"Skipping item in Xero invoice for sale {sale_details['id']} due to missing title: {item}")
-                    continue
-                
-                price_inclusive = Decimal(str(item.get('sale_price', 0)))
-
-                line_item = LineItem(
-                    description=item_title,
-                    quantity=item['quantity'],
-                    unit_amount=price_inclusive,
-                    account_code=current_app.config['XERO_SALES_ACCOUNT']
-                )
-                line_items.append(line_item)
-
-            if not line_items:
-                logging.warning(f"No valid line items found for Xero invoice for sale {sale_details['id']}. Creating a single summary line.")
-                total_amount_inclusive = Decimal(str(sale_details.get('final_grand_total', 0)))
-                total_amount_exclusive = total_amount_inclusive / gst_divisor
-                line_item = LineItem(
-                    description=f"Sale #{sale_details['id']}",
-                    quantity=1,
-                    unit_amount=total_amount_exclusive,
-                    account_code=current_app.config['XERO_SALES_ACCOUNT']
-                )
-                line_items.append(line_item)
-
-            invoice_date = datetime.fromisoformat(sale_details['created_at']) if sale_details.get('created_at') else datetime.now()
-            
-            invoice = Invoice(
-                type='ACCREC',
-                contact=contact,
-                line_items=line_items,
-                date=invoice_date,
-                due_date=invoice_date,
-                reference=f"Sale #{sale_details['id']}",
-                status='AUTHORISED',
-                line_amount_types=LineAmountTypes.INCLUSIVE
-            )
-
+            invoice = self._build_invoice(sale_details, contact)
             invoices_container = Invoices(invoices=[invoice])
             created_invoice = accounting_api.create_invoices(xero_tenant_id, invoices=invoices_container, unitdp=4)
             logging.debug(f"Successfully created Xero invoice: {created_invoice.invoices[0].invoice_id}")
@@ -194,37 +224,105 @@ class XeroService:
             logging.info("Continuing with local processing despite Xero error")
             return {"invoice_id": "local-only"}, None
 
-    def find_or_create_contact(self, customer_details, accounting_api, xero_tenant_id):
+    def _build_invoice(self, sale_details, contact):
+        """The AUTHORISED, GST-inclusive Xero invoice for a sale, referenced "Sale #<id>"."""
+        gst_rate = Decimal(current_app.config.get('GST_RATE_PERCENTAGE', '10')) / Decimal('100')
+        gst_divisor = Decimal('1') + gst_rate
+
+        line_items = []
+        for item in sale_details['sale_items']:
+            item_title = item.get('item', {}).get('title')
+            if not item_title:
+                logging.warning(f"Skipping item in Xero invoice for sale {sale_details['id']} due to missing title: {item}")
+                continue
+
+            price_inclusive = Decimal(str(item.get('sale_price', 0)))
+
+            line_item = LineItem(
+                description=item_title,
+                quantity=item['quantity'],
+                unit_amount=price_inclusive,
+                account_code=current_app.config['XERO_SALES_ACCOUNT']
+            )
+            line_items.append(line_item)
+
+        if not line_items:
+            logging.warning(f"No valid line items found for Xero invoice for sale {sale_details['id']}. Creating a single summary line.")
+            total_amount_inclusive = Decimal(str(sale_details.get('final_grand_total', 0)))
+            total_amount_exclusive = total_amount_inclusive / gst_divisor
+            line_item = LineItem(
+                description=f"Sale #{sale_details['id']}",
+                quantity=1,
+                unit_amount=total_amount_exclusive,
+                account_code=current_app.config['XERO_SALES_ACCOUNT']
+            )
+            line_items.append(line_item)
+
+        invoice_date = datetime.fromisoformat(sale_details['created_at']) if sale_details.get('created_at') else datetime.now()
+
+        invoice = Invoice(
+            type='ACCREC',
+            contact=contact,
+            line_items=line_items,
+            date=invoice_date,
+            due_date=invoice_date,
+            reference=f"Sale #{sale_details['id']}",
+            status='AUTHORISED',
+            line_amount_types=LineAmountTypes.INCLUSIVE
+        )
+        return invoice
+
+    @staticmethod
+    def _contact_name(customer_details):
         # Default to walk-in customer
-        contact_name = "Walk-in Customer"
         if customer_details and customer_details.get("name"):
-            contact_name = customer_details["name"]
-        
+            return customer_details["name"]
+        return "Walk-in Customer"
+
+    def find_or_create_contact(self, customer_details, accounting_api, xero_tenant_id):
+        """The customer's Xero contact: by the stored xero_contact_id if there is one, else found
+        by name or created, and the ID written back into customer_details for the caller to store.
+        The walk-in contact (no customer) is looked up once per process."""
+        if customer_details and customer_details.get('xero_contact_id'):
+            return Contact(contact_id=customer_details['xero_contact_id']), None
+        contact_name = self._contact_name(customer_details)
+        if not customer_details and contact_name in self._contact_ids:
+            return Contact(contact_id=self._contact_ids[contact_name]), None
+
         try:
             where_clause = f'Name=="{contact_name}"'
             existing_contacts = accounting_api.get_contacts(xero_tenant_id, where=where_clause).contacts
             if existing_contacts:
                 logging.debug(f"Found existing contact in Xero: {contact_name}")
-                return existing_contacts[0], None
-            
-            logging.debug(f"Creating new contact in Xero: {contact_name}")
-            new_contact_obj = Contact(name=contact_name)
-            contacts_container = Contacts(contacts=[new_contact_obj])
-            created_contacts = accounting_api.create_contacts(xero_tenant_id, contacts=contacts_container)
-            return created_contacts.contacts[0], None
+                contact = existing_contacts[0]
+            else:
+                logging.debug(f"Creating new contact in Xero: {contact_name}")
+                new_contact_obj = Contact(name=contact_name)
+                contacts_container = Contacts(contacts=[new_contact_obj])
+                created_contacts = accounting_api.create_contacts(xero_tenant_id, contacts=contacts_container)
+                contact = created_contacts.contacts[0]
+            self._remember_contact(customer_details, contact_name, contact.contact_id)
+            return contact, None
 
         except OpenApiException as e:
             logging.error(f"Error finding or creating Xero contact: {e}")
             return None, str(e)
 
+    def _remember_contact(self, customer_details, contact_name, contact_id):
+        if customer_details:
+            customer_details['xero_contact_id'] = contact_id
+        else:
+            self._contact_ids[contact_name] = contact_id
+
     def find_or_create_invoice(self, sale_details, contact, accounting_api, xero_tenant_id):
         reference = f"Sale #{sale_details['id']}"
         try:
             where_clause = f'Reference=="{reference}"'
             invoices = accounting_api.get_invoices(xero_tenant_id, where=where_clause).invoices
-            if invoices:
+            invoice = next((i for i in invoices or [] if i.status not in ('VOIDED', 'DELETED')), None)
+            if invoice is not None:
                 logging.debug(f"Found existing invoice in Xero: {reference}")
-                return invoices[0], None
+                return invoice, None
             else:
                 logging.debug(f"Creating new invoice in Xero: {reference}")
                 return self.create_invoice(sale_details, contact)
@@ -232,7 +330,15 @@ class XeroService:
             logging.error(f"Error finding or creating Xero invoice: {e}")
             return None, str(e)
 
-    def create_invoice_and_payment(self, sale_details, payment_details):
+    def create_invoice_and_payment(self, sale_details, payment_details, idempotency_key=None, check_existing=True):
+        """Records the payment against the sale's invoice, finding or creating the contact and
+        invoice unless sale_details carries the stored xero_invoice_id; the IDs found or created
+        are written back into sale_details (and its customer) for the caller to store.
+
+        With check_existing, a payment already on the invoice (matched by payment_reference, from
+        an earlier attempt that reached Xero) is returned rather than recorded twice; callers
+        that know the payment was never attempted skip that lookup. With an idempotency_key, Xero
+        also ignores a repeat of the same call."""
         if not self.api_client:
             return None, "Xero API client not initialized."
 
@@ -241,50 +347,358 @@ class XeroService:
             return None, "Xero token not available."
             
         xero_tenant_id = self._get_tenant_id()
-        accounting_api = AccountingApi(self.api_client)
-        
-        # 1. Find or create contact
-        contact, error = self.find_or_create_contact(sale_details.get('customer'), accounting_api, xero_tenant_id)
-        if error:
-            return None, f"Failed to process contact in Xero: {error}"
-        if not contact:
-             return None, "Failed to find or create a Xero contact."
-
-        # 2. Find or create invoice
-        invoice, error = self.find_or_create_invoice(sale_details, contact, accounting_api, xero_tenant_id)
-        if error:
-            return None, f"Failed to process invoice in Xero: {error}"
-        
-        if not hasattr(invoice, 'invoice_id'):
-            return None, f"Failed to create a valid invoice in Xero. Received: {invoice}"
-        
-        # 3. Create payment
-        payment_date = datetime.fromisoformat(payment_details['payment_date']) if payment_details.get('payment_date') else datetime.now()
-        
-        payment_type = payment_details.get('payment_type')
+        accounting_api = self._accounting_api()
+
+        invoice = None
+        invoice_id = sale_details.get('xero_invoice_id')
+        if invoice_id and check_existing:
+            try:
+                invoice = accounting_api.get_invoice(xero_tenant_id, invoice_id).invoices[0]
+            except OpenApiException as e:
+                logging.error(f"Error reading Xero invoice {invoice_id}: {e}")
+                return None, f"Failed to process invoice in Xero: {e}"
+
+        if not invoice_id:
+            # 1. Find or create contact
+            contact, error = self.find_or_create_contact(sale_details.get('customer'), accounting_api, xero_tenant_id)
+            if error:
+                return None, f"Failed to process contact in Xero: {error}"
+            if not contact:
+                 return None, "Failed to find or create a Xero contact."
+
+            # 2. Find or create invoice
+            invoice, error = self.find_or_create_invoice(sale_details, contact, accounting_api, xero_tenant_id)
+            if error:
+                return None, f"Failed to process invoice in Xero: {error}"
+
+            if not hasattr(invoice, 'invoice_id'):
+                return None, f"Failed to create a valid invoice in Xero. Received: {invoice}"
+            invoice_id = sale_details['xero_invoice_id'] = invoice.invoice_id
+
+        # 3. Create payment, unless an earlier attempt already recorded it
+        existing = self._find_payment(invoice, payment_details) if invoice is not None and check_existing else None
+        if existing is not None:
+            logging.debug(f"Xero payment already recorded: {existing.payment_id}")
+            return existing, None
+        payment = self._build_payment(invoice_id, payment_details)
+
+        try:
+            payments_container = Payments(payments=[payment])
+            if idempotency_key:
+                created_payments = accounting_api.create_payments(xero_tenant_id, payments=payments_container, idempotency_key=idempotency_key)
+            else:
+                created_payments = accounting_api.create_payments(xero_tenant_id, payments=payments_container)
+            logging.debug(f"Successfully created Xero payment: {created_payments.payments[0].payment_id}")
+            return created_payments.payments[0], None
+        except OpenApiException as e:
+            logging.error(f"Error creating Xero payment: {e}")
+            return None, str(e)
+
+    @staticmethod
+    def payment_reference(payment_details):
+        """The reference a POS payment carries in Xero, which identifies it on its invoice."""
+        return f"POS payment #{payment_details['id']}"
+
+    def _find_payment(self, invoice, payment_details):
+        """The payment already on a Xero invoice for a POS payment (by payment_reference), or None."""
+        reference = self.payment_reference(payment_details)
+        return next((p for p in getattr(invoice, 'payments', None) or [] if p.reference == reference and p.status != 'DELETED'), None)
+
+    @staticmethod
+    def _payment_account_code(payment_type):
+        """The Xero bank account a payment type is received into."""
         if payment_type == 'Cash':
-            account_code = current_app.config['XERO_BANK_ACCOUNT_CASH']
+            return current_app.config['XERO_BANK_ACCOUNT_CASH']
         elif payment_type == 'EFTPOS':
-            account_code = current_app.config['XERO_BANK_ACCOUNT_EFTPOS']
+            return current_app.config['XERO_BANK_ACCOUNT_EFTPOS']
         elif payment_type == 'Cheque':
-            account_code = current_app.config['XERO_BANK_ACCOUNT_CHEQUE']
-        else:
-            account_code = current_app.config['XERO_BANK_ACCOUNT']
+            return current_app.config['XERO_BANK_ACCOUNT_CHEQUE']
+        return current_app.config['XERO_BANK_ACCOUNT']
+
+    def _build_payment(self, invoice_id, payment_details):
+        payment_date = datetime.fromisoformat(payment_details['payment_date']) if payment_details.get('payment_date') else datetime.now()
 
-        payment = Payment(
-            invoice=Invoice(invoice_id=invoice.invoice_id),
-            account=Account(code=account_code),
+        return Payment(
+            invoice=Invoice(invoice_id=invoice_id),
+            account=Account(code=self._payment_account_code(payment_details.get('payment_type'))),
             amount=payment_details['amount'],
-            date=payment_date
+            date=payment_date,
+            reference=self.payment_reference(payment_details)
         )
-        
+
+    @staticmethod
+    def _where_any(field, values):
+        """A where clause matching any of values, e.g. Name=="A" OR Name=="B"."""
+        quoted = [value.replace('"', '\\"') for value in values]
+        return ' OR '.join(f'{field}=="{value}"' for value in quoted)
+
+    @staticmethod
+    def _element_error(element):
+        """The validation errors of one element of a summarize_errors=False response, or None."""
+        if element.validation_errors:
+            return '; '.join(error.message for error in element.validation_errors)
+        if element.status_attribute_string == 'ERROR':
+            return "Rejected by Xero."
+        return None
+
+    def create_invoices_and_payments(self, entries, idempotency_key=None, check_existing=True):
+        """create_invoice_and_payment for many payments at once. entries is a list of
+        (sale_details, payment_details), at most MAX_BATCH_SIZE; returns a list of
+        (xero_payment, error) in the same order. As there, stored IDs skip the lookups, the IDs
+        found or created are written back into the dicts and check_existing guards against
+        recording a payment twice.
+
+        Contacts, invoices and payments each take at most one lookup and one create call for the
+        whole batch, sent with summarize_errors=False so that a rejected element fails on its own."""
+        if not self.api_client:
+            return [(None, "Xero API client not initialized.")] * len(entries)
+
+        token = self._get_token()
+        if not token:
+            return [(None, "Xero token not available.")] * len(entries)
+
+        xero_tenant_id = self._get_tenant_id()
+        accounting_api = self._accounting_api()
+        results = [None] * len(entries)
+
+        sales = {}
+        for sale_details, _ in entries:
+            sales.setdefault(sale_details['id'], sale_details)
+        invoice_ids = {sale_id: sale_details['xero_invoice_id'] for sale_id, sale_details in sales.items() if sale_details.get('xero_invoice_id')}
+        unmapped = [sale_id for sale_id in sales if sale_id not in invoice_ids]
+        invoices = {}
+        sale_errors = {}
+
         try:
-            payments_container = Payments(payments=[payment])
-            created_payments = accounting_api.create_payments(xero_tenant_id, payments=payments_container)
-            logging.debug(f"Successfully created Xero payment: {created_payments.payments[0].payment_id}")
-            return created_payments.payments[0], None
+            # Mapped invoices are only read to look for payments an earlier attempt recorded
+            if invoice_ids and check_existing:
+                sale_by_invoice_id = {invoice_id: sale_id for sale_id, invoice_id in invoice_ids.items()}
+                for invoice in accounting_api.get_invoices(xero_tenant_id, i_ds=list(sale_by_invoice_id)).invoices or []:
+                    if invoice.invoice_id in sale_by_invoice_id:
+                        invoices[sale_by_invoice_id[invoice.invoice_id]] = invoice
+
+            if unmapped:
+                # 1. Find or create the contacts not stored yet
+                contact_ids = dict(self._contact_ids)
+                for sale_id in unmapped:
+                    customer_details = sales[sale_id].get('customer')
+                    if customer_details and customer_details.get('xero_contact_id'):
+                        contact_ids[self._contact_name(customer_details)] = customer_details['xero_contact_id']
+                names = sorted({self._contact_name(sales[sale_id].get('customer')) for sale_id in unmapped} - set(contact_ids))
+                contact_errors = {}
+                if names:
+                    for contact in accounting_api.get_contacts(xero_tenant_id, where=self._where_any('Name', names)).contacts or []:
+                        contact_ids.setdefault(contact.name, contact.contact_id)
+                    missing_names = [name for name in names if name not in contact_ids]
+                    if missing_names:
+                        logging.debug(f"Creating {len(missing_names)} contacts in Xero")
+                        created = accounting_api.create_contacts(
+                            xero_tenant_id, contacts=Contacts(contacts=[Contact(name=name) for name in missing_names]), summarize_errors=False
+                        ).contacts
+                        for name, contact in zip(missing_names, created):
+                            error = self._element_error(contact)
+                            if error:
+                                contact_errors[name] = error
+                            else:
+                                contact_ids[name] = contact.contact_id
+                for sale_id in unmapped:
+                    customer_details = sales[sale_id].get('customer')
+                    name = self._contact_name(customer_details)
+                    if name in contact_ids:
+                        self._remember_contact(customer_details, name, contact_ids[name])
+                    else:
+                        sale_errors[sale_id] = f"Failed to process contact in Xero: {contact_errors.get(name, 'not found')}"
+
+                # 2. Find or create the invoices not stored yet, one per sale
+                references = {f"Sale #{sale_id}": sale_id for sale_id in unmapped if sale_id not in sale_errors}
+                if references:
+                    for invoice in accounting_api.get_invoices(xero_tenant_id, where=self._where_any('Reference', references)).invoices or []:
+                        if invoice.reference in references and invoice.status not in ('VOIDED', 'DELETED'):
+                            invoices.setdefault(references[invoice.reference], invoice)
+                new_invoice_sales = [sale_id for sale_id in references.values() if sale_id not in invoices]
+                if new_invoice_sales:
+                    logging.debug(f"Creating {len(new_invoice_sales)} invoices in Xero")
+                    created = accounting_api.create_invoices(
+                        xero_tenant_id,
+                        invoices=Invoices(invoices=[
+                            self._build_invoice(sales[sale_id], Contact(contact_id=contact_ids[self._contact_name(sales[sale_id].get('customer'))]))
+                            for sale_id in new_invoice_sales
+                        ]),
+                        summarize_errors=False,
+                        unitdp=4
+                    ).invoices
+                    for sale_id, invoice in zip(new_invoice_sales, created):
+                        error = self._element_error(invoice)
+                        if error:
+                            sale_errors[sale_id] = f"Failed to process invoice in Xero: {error}"
+                        else:
+                            invoices[sale_id] = invoice
+                for sale_id in references.values():
+                    if sale_id in invoices:
+                        invoice_ids[sale_id] = invoices[sale_id].invoice_id
+
+            # 3. Create payments
+            payments, positions = [], []
+            for position, (sale_details, payment_details) in enumerate(entries):
+                sale_id = sale_details['id']
+                if sale_id not in invoice_ids:
+                    results[position] = (None, sale_errors.get(sale_id, "Failed to process invoice in Xero: not found"))
+                    continue
+                sale_details['xero_invoice_id'] = invoice_ids[sale_id]
+                existing = self._find_payment(invoices[sale_id], payment_details) if sale_id in invoices and check_existing else None
+                if existing is not None:
+                    results[position] = (existing, None)
+                    continue
+                payments.append(self._build_payment(invoice_ids[sale_id], payment_details))
+                positions.append(position)
+
+            if payments:
+                logging.debug(f"Creating {len(payments)} payments in Xero")
+                options = {'idempotency_key': idempotency_key} if idempotency_key else {}
+                created = accounting_api.create_payments(
+                    xero_tenant_id, payments=Payments(payments=payments), summarize_errors=False, **options
+                ).payments
+                for position, payment in zip(positions, created):
+                    error = self._element_error(payment)
+                    results[position] = (None, error) if error else (payment, None)
         except OpenApiException as e:
-            logging.error(f"Error creating Xero payment: {e}")
+            logging.error(f"Error in batched Xero sync: {e}")
+            return [result or (None, str(e)) for result in results]
+
+        return results
+
+    @staticmethod
+    def summary_reference(summary_details):
+        """The reference of a daily summary invoice, e.g. "POS daily sales 2026-10-17 #12"."""
+        return f"POS daily sales {summary_details['summary_date']} #{summary_details['id']}"
+
+    def _build_summary_invoice(self, summary_details, contact):
+        """The AUTHORISED invoice for a daily summary: one line for the day's sales and one for card
+        fees, GST-inclusive or GST-free as the summary's tax_treatment says."""
+        summary_date = datetime.fromisoformat(summary_details['summary_date'])
+        line_items = [LineItem(
+            description=f"Walk-in sales {summary_details['summary_date']} ({summary_details['sale_count']} sales)",
+            quantity=1,
+            unit_amount=Decimal(summary_details['net_amount']),
+            account_code=current_app.config['XERO_SALES_ACCOUNT']
+        )]
+        if Decimal(summary_details['fee_amount']):
+            line_items.append(LineItem(
+                description=f"EFTPOS fees {summary_details['summary_date']}",
+                quantity=1,
+                unit_amount=Decimal(summary_details['fee_amount']),
+                account_code=current_app.config['XERO_SALES_ACCOUNT']
+            ))
+        return Invoice(
+            type='ACCREC',
+            contact=contact,
+            line_items=line_items,
+            date=summary_date,
+            due_date=summary_date,
+            reference=self.summary_reference(summary_details),
+            status='AUTHORISED',
+            line_amount_types=LineAmountTypes(summary_details['tax_treatment'])
+        )
+
+    def create_summary_invoice(self, summary_details, idempotency_key=None, check_existing=True):
+        """Sends a daily summary (see XeroDailySummary) as one walk-in invoice with a payment per
+        tender type, each into that type's bank account. Returns (invoice_id, error); the invoice ID
+        is also written back into summary_details as soon as the invoice exists, for the caller to
+        store, so a retry after a failed payment goes straight to it.
+
+        With check_existing, an invoice already created under the summary's reference and payments
+        already on it (matched by reference) are reused rather than sent twice."""
+        if not self.api_client:
+            return None, "Xero API client not initialized."
+
+        token = self._get_token()
+        if not token:
+            return None, "Xero token not available."
+
+        xero_tenant_id = self._get_tenant_id()
+        accounting_api = self._accounting_api()
+        reference = self.summary_reference(summary_details)
+        options = {'idempotency_key': idempotency_key} if idempotency_key else {}
+
+        try:
+            invoice = None
+            invoice_id = summary_details.get('xero_invoice_id')
+            if invoice_id and check_existing:
+                invoice = accounting_api.get_invoice(xero_tenant_id, invoice_id).invoices[0]
+            elif not invoice_id:
+                if check_existing:
+                    invoices = accounting_api.get_invoices(xero_tenant_id, where=f'Reference=="{reference}"').invoices
+                    invoice = next((i for i in invoices or [] if i.status not in ('VOIDED', 'DELETED')), None)
+                if invoice is None:
+                    contact, error = self.find_or_create_contact(None, accounting_api, xero_tenant_id)
+                    if error:
+                        return None, f"Failed to process contact in Xero: {error}"
+                    if idempotency_key:
+                        options['idempotency_key'] = f"{idempotency_key}-invoice"
+                    invoice = accounting_api.create_invoices(
+                        xero_tenant_id, invoices=Invoices(invoices=[self._build_summary_invoice(summary_details, contact)]), unitdp=4, **options
+                    ).invoices[0]
+                    logging.debug(f"Created Xero daily summary invoice {invoice.invoice_id}: {reference}")
+                invoice_id = summary_details['xero_invoice_id'] = invoice.invoice_id
+
+            recorded = {p.reference for p in getattr(invoice, 'payments', None) or [] if p.status != 'DELETED'}
+            payments = [
+                Payment(
+                    invoice=Invoice(invoice_id=invoice_id),
+                    account=Account(code=self._payment_account_code(payment_type)),
+                    amount=Decimal(amount),
+                    date=datetime.fromisoformat(summary_details['summary_date']),
+                    reference=f"{reference} {payment_type}"
+                )
+                for payment_type, amount in sorted(summary_details['tenders'].items())
+                if Decimal(amount) > 0 and f"{reference} {payment_type}" not in recorded
+            ]
+            if payments:
+                if idempotency_key:
+                    options['idempotency_key'] = f"{idempotency_key}-payments"
+                accounting_api.create_payments(xero_tenant_id, payments=Payments(payments=payments), **options)
+                logging.debug(f"Created {len(payments)} Xero payments for {reference}")
+            return invoice_id, None
+        except OpenApiException as e:
+            logging.error(f"Error sending Xero daily summary {reference}: {e}")
+            return None, str(e)
+
+    def void_sale_invoice(self, sale_id, invoice_id=None):
+        """Voids the sale's invoice (the stored invoice_id, else found by reference), deleting its
+        payments first as Xero requires. A sale with no invoice in Xero (never paid, or already
+        voided) is left alone."""
+        if not self.api_client:
+            return None, "Xero API client not initialized."
+
+        token = self._get_token()
+        if not token:
+            return None, "Xero token not available."
+
+        xero_tenant_id = self._get_tenant_id()
+        accounting_api = self._accounting_api()
+
+        try:
+            if invoice_id:
+                invoices = accounting_api.get_invoice(xero_tenant_id, invoice_id).invoices
+            else:
+                where_clause = f'Reference=="Sale #{sale_id}"'
+                invoices = accounting_api.get_invoices(xero_tenant_id, where=where_clause).invoices
+            invoice = next((i for i in invoices or [] if i.status not in ('VOIDED', 'DELETED')), None)
+            if invoice is None:
+                logging.debug(f"No Xero invoice to void for sale ID: {sale_id}")
+                return None, None
+
+            for payment in invoice.payments or []:
+                if payment.status != 'DELETED':
+                    accounting_api.delete_payment(xero_tenant_id, payment.payment_id, PaymentDelete(status='DELETED'))
+
+            voided = accounting_api.update_invoice(
+                xero_tenant_id, invoice.invoice_id, Invoices(invoices=[Invoice(invoice_id=invoice.invoice_id, status='VOIDED')])
+            )
+            logging.debug(f"Voided Xero invoice {invoice.invoice_id} for sale ID: {sale_id}")
+            return voided.invoices[0], None
+        except OpenApiException as e:
+            logging.error(f"Error voiding Xero invoice for sale ID {sale_id}: {e}")
             return None, str(e)
 
     def create_payment(self, sale_id, payment_details):
@@ -299,7 +713,7 @@ class XeroService:
         # Get the tenant ID from the token file
         xero_tenant_id = self._get_tenant_id()
 
-        accounting_api = AccountingApi(self.api_client)
+        accounting_api = self._accounting_api()
 
         logging.debug(f"Creating Xero payment for sale ID: {sale_id}")
 
@@ -335,4 +749,7 @@ class XeroService:
             logging.error(f"Unexpected error creating Xero payment: {e}")
             # Continue with local processing despite Xero error
             logging.info("Continuing with local processing despite Xero error")
-            return {"payment_id": "local-only"}, None
\ No newline at end of file
+            return {"payment_id": "local-only"}, None
+
+
+xero_service = XeroService()
@@ -0,0 +1,41 @@
+from functools import wraps
+from flask import current_app, make_response, request
+
+
+def conditional_get(*counters):
+    """Decorates a GET view so it carries a strong ETag derived from one or more VersionCounters
+    (every group of resources its body draws on).
+
+    A matching If-None-Match is answered with 304 before the view (and the database) is
+    touched. The version is read before the view runs, so a write that lands mid-request can
+    only make the ETag older than the body, never newer; the next request then misses.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = '.'.join(counter.etag for counter in counters)
+            if etag in request.if_none_match:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Let browsers keep the body but revalidate it on every use
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+def expected_version_from_request():
+    """The record version a write was based on, from an If-Match header (a bare or quoted
+    version number) or a `version` field in the JSON body. None, meaning "do not check", if the
+    client sent neither or sent If-Match: *."""
+    value = request.headers.get('If-Match') or (request.get_json(silent=True) or {}).get('version')
+    if value in (None, '', '*'):
+        return None
+    try:
+        return int(str(value).replace('W/', '').strip().strip('"'))
+    except ValueError:
+        return None
@@ -0,0 +1,57 @@
+from flask import request
+
+
+def _split(raw):
+    return [part.strip() for part in (raw or '').split(',') if part.strip()]
+
+
+def parse_fieldset(fields=None, include=None):
+    """Parses `fields=` / `include=` query values into a nested fieldset, or None for "everything".
+
+    Both take comma-separated keys; dotted keys select inside nested objects and lists, e.g.
+    `fields=id,status,sale_items.quantity,sale_items.item.title`. `include` names nested objects
+    to embed whole on top of `fields` (`fields=id,final_grand_total&include=payments`), so on
+    its own it changes nothing. A key maps to True (whole value) or to a nested fieldset dict.
+    """
+    if not _split(fields):
+        return None
+    fieldset = {}
+    for path in _split(fields) + _split(include):
+        node = fieldset
+        parts = path.split('.')
+        for part in parts[:-1]:
+            child = node.get(part)
+            if child is True:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = True
+    return fieldset
+
+
+def fieldset_from_request():
+    return parse_fieldset(request.args.get('fields'), request.args.get('include'))
+
+
+def wants(fieldset, key):
+    """True if `key` should be serialised under this fieldset."""
+    return fieldset is None or key in fieldset
+
+
+def sub_fieldset(fieldset, key):
+    """The fieldset to apply to the nested value under `key` (None means the whole value)."""
+    if fieldset is None:
+        return None
+    child = fieldset.get(key)
+    return child if isinstance(child, dict) else None
+
+
+def project(data, fieldset):
+    """Drops every key of a serialised dict (recursing into nested dicts/lists) not in the fieldset."""
+    if fieldset is None or data is None:
+        return data
+    if isinstance(data, list):
+        return [project(entry, fieldset) for entry in data]
+    if not isinstance(data, dict):
+        return data
+    return {key: project(data[key], sub_fieldset(fieldset, key)) for key in fieldset if key in data}
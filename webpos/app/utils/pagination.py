@@ -0,0 +1,87 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import and_, or_
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'dec': str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'dec' in value:
+            return Decimal(value['dec'])
+    return value
+
+
+def encode_cursor(order_key, values):
+    """Encodes the sort values of the last row of a page into an opaque, URL-safe cursor.
+    The order key is embedded so a cursor cannot be replayed against a different ordering."""
+    payload = {'k': order_key, 'v': [_encode_value(v) for v in values]}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(order_key, cursor):
+    """Decodes a cursor produced by encode_cursor. Raises ValueError if it is malformed or
+    was issued for a different ordering."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        values = [_decode_value(v) for v in payload['v']]
+    except Exception:
+        raise ValueError("Invalid cursor.")
+    if payload.get('k') != order_key:
+        raise ValueError("Cursor does not match the requested ordering.")
+    return values
+
+
+def keyset_paginate(query, order_key, sort_column, id_column, descending=False, limit=50, cursor=None):
+    """Applies keyset (seek) pagination to a query ordered by (sort_column, id_column).
+
+    Rather than OFFSET, each page continues strictly after the (sort value, id) of the previous
+    page's last row, so any page costs the same as the first given an index on those columns.
+    Returns (rows, next_cursor, has_more). Raises ValueError for a bad cursor.
+    """
+    same_column = sort_column is id_column
+
+    if cursor:
+        values = decode_cursor(order_key, cursor)
+        if same_column:
+            last_id = values[0]
+            query = query.filter(id_column < last_id if descending else id_column > last_id)
+        else:
+            last_value, last_id = values
+            if descending:
+                query = query.filter(or_(sort_column < last_value, and_(sort_column == last_value, id_column < last_id)))
+            else:
+                query = query.filter(or_(sort_column > last_value, and_(sort_column == last_value, id_column > last_id)))
+
+    if same_column:
+        query = query.order_by(id_column.desc() if descending else id_column.asc())
+    elif descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more and rows:
+        last_row = rows[-1]
+        sort_key = sort_column.key
+        id_key = id_column.key
+        if same_column:
+            next_cursor = encode_cursor(order_key, [getattr(last_row, id_key)])
+        else:
+            next_cursor = encode_cursor(order_key, [getattr(last_row, sort_key), getattr(last_row, id_key)])
+    return rows, next_cursor, has_more
@@ -1,5 +1,7 @@
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal
 from flask import current_app
+from app.utils.fieldsets import wants, sub_fieldset, project
+from app.utils.totals import to_cents, cents_to_float
 
 def payment_to_dict(payment):
     if not payment:
@@ -22,11 +24,14 @@ def _simple_payment_to_dict_for_sale(payment):
         'payment_date': payment.payment_date.isoformat() if payment.payment_date else None
     }
 
-def sale_item_to_dict(sale_item):
+def sale_item_to_dict(sale_item, item_details=None, fields=None):
     from app.routes.items import item_to_dict
     
     if not sale_item:
         return None
+    # item_details may be pre-serialised in bulk by the caller (see sale_to_dict)
+    if item_details is None and sale_item.item and wants(fields, 'item'):
+        item_details = item_to_dict(sale_item.item, fields=sub_fieldset(fields, 'item'))
     # Ensure sale_item.item is loaded, might need to adjust lazy loading or query options
     # For now, assuming it gets loaded by accessing it.
 
@@ -35,11 +40,11 @@ def sale_item_to_dict(sale_item):
     discount_type_value = getattr(sale_item, 'discount_type', None)
     discount_value_value = getattr(sale_item, 'discount_value', None)
 
-    return {
+    sale_item_details = {
         'id': sale_item.id,
         'sale_id': sale_item.sale_id,
         'item_id': sale_item.item_id,
-        'item': item_to_dict(sale_item.item) if sale_item.item else None, 
+        'item': item_details, 
         'quantity': sale_item.quantity,
         'price_at_sale': float(price_at_sale_value) if price_at_sale_value is not None else None,
         'discount_type': discount_type_value,
@@ -48,62 +53,83 @@ def sale_item_to_dict(sale_item):
         'notes': sale_item.notes,
         'line_total': float(sale_item.line_total) if hasattr(sale_item, 'line_total') and sale_item.line_total is not None else (sale_item.quantity * sale_item.sale_price)
     }
+    # item_details is already projected by item_to_dict/items_to_dicts
+    if fields is not None and 'item' in fields:
+        fields = dict(fields, item=True)
+    return project(sale_item_details, fields)
+
+def _sale_line_items_to_dicts(sale_items, fields=None):
+    """Serialises the items of all sale lines with a fixed number of queries, keyed by item ID."""
+    from app.models.item import Item
+    from app.routes.items import items_to_dicts
+    from sqlalchemy import inspect
+    from sqlalchemy.orm import selectinload
+
+    # Lines loaded together with their items (see SaleService.load_sale_graph) need no item query
+    unloaded_ids = {si.item_id for si in sale_items if si.item_id is not None and 'item' in inspect(si).unloaded}
+    # Loading the items (and photos) puts them in the identity map, so si.item below needs no further
+    # queries. The list must stay referenced: the identity map only holds weak references.
+    preloaded_items = []
+    if unloaded_ids:
+        query = Item.query.filter(Item.id.in_(unloaded_ids))
+        if wants(fields, 'photos'):
+            query = query.options(selectinload(Item.photos))
+        preloaded_items = query.all()
+    items = [si.item for si in sale_items if si.item]
+    return {item.id: item_dict for item, item_dict in zip(items, items_to_dicts(items, fields=fields))}
+
+def sale_summary_to_dict(row):
+    """Serialises a row of SaleService.get_sales_summary_page."""
+    return {
+        'id': row.id,
+        'status': row.status,
+        'customer_id': row.customer_id,
+        'customer_name': row.customer_name,
+        'customer_phone': row.customer_phone,
+        'customer_email': row.customer_email,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'updated_at': row.updated_at.isoformat() if row.updated_at else None,
+        'final_grand_total': cents_to_float(to_cents(row.grand_total)),
+        'amount_paid': cents_to_float(to_cents(row.amount_paid)),
+        'amount_due': cents_to_float(to_cents(row.amount_due)),
+        'line_count': row.line_count
+    }
 
-def sale_to_dict(sale):
-    from app.models.customer import Customer
+def sale_to_dict(sale, fields=None):
+    """Serialises a sale with its customer, lines and payments. `fields` is a fieldset from
+    app.utils.fieldsets; the customer, line item and payment loads are skipped when not requested."""
     from app.routes.customers import customer_to_dict
     
     if not sale:
         return None
     
     customer_details = None
-    if sale.customer_id:
-        customer = Customer.query.get(sale.customer_id) # Fetch the customer object
-        customer_details = customer_to_dict(customer) # Serialize it
-
-    # Calculate new detailed breakdown of totals
-    subtotal_gross_original_calc = sum(
-        (si.price_at_sale * si.quantity) for si in sale.sale_items if si.price_at_sale is not None and si.quantity is not None
-    )
-    subtotal_gross_original_calc = Decimal(subtotal_gross_original_calc).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-    total_line_item_discounts_calc = sum(
-        ((si.price_at_sale - si.sale_price) * si.quantity) 
-        for si in sale.sale_items 
-        if si.price_at_sale is not None and si.sale_price is not None and si.quantity is not None
-    )
-    total_line_item_discounts_calc = Decimal(total_line_item_discounts_calc).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    if sale.customer_id and wants(fields, 'customer'):
+        # Already loaded when the sale came from SaleService.load_sale_graph
+        customer_details = project(customer_to_dict(sale.customer), sub_fieldset(fields, 'customer'))
 
-    overall_discount_amount_applied_calc = Decimal(sale.overall_discount_amount_applied or '0.00').quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    transaction_fee_calc = Decimal(sale.transaction_fee or '0.00').quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    
+    # Totals are stored on the sale (maintained by SaleService/PaymentService), so no line aggregation
+    subtotal_gross_original_calc = to_cents(sale.subtotal_gross)
+    total_line_item_discounts_calc = to_cents(sale.line_discount_total)
+    overall_discount_amount_applied_calc = to_cents(sale.overall_discount_amount_applied)
     net_subtotal_inc_tax_calc = subtotal_gross_original_calc - total_line_item_discounts_calc - overall_discount_amount_applied_calc
-    net_subtotal_inc_tax_calc = net_subtotal_inc_tax_calc.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
     gst_rate_percentage = Decimal(current_app.config.get('GST_RATE_PERCENTAGE', '10'))
-    gst_divisor = Decimal('1') + (gst_rate_percentage / Decimal('100'))
-
-    # Calculate GST from the subtotal (which is inc-GST)
-    gst_from_subtotal = (net_subtotal_inc_tax_calc - (net_subtotal_inc_tax_calc / gst_divisor)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    
-    # Calculate GST from the fee (which is also inc-GST)
-    gst_from_fee = (transaction_fee_calc - (transaction_fee_calc / gst_divisor)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
-    # Total GST is the sum of the two
-    gst_amount_calc = gst_from_subtotal + gst_from_fee
-    
-    # Grand total is simply the inc-GST subtotal plus the inc-GST fee
-    final_grand_total_calc = net_subtotal_inc_tax_calc + transaction_fee_calc
-    
-    amount_paid_calc = sum(p.amount for p in sale.payments if p.amount is not None)
-    amount_paid_calc = Decimal(amount_paid_calc).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    amount_due_calc = final_grand_total_calc - amount_paid_calc
+    sale_items_fields = sub_fieldset(fields, 'sale_items')
+    sale_item_dicts = None
+    if wants(fields, 'sale_items'):
+        item_fields = sub_fieldset(sale_items_fields, 'item')
+        line_item_dicts = {}
+        if wants(sale_items_fields, 'item'):
+            line_item_dicts = _sale_line_items_to_dicts(sale.sale_items, fields=item_fields)
+        sale_item_dicts = [sale_item_to_dict(si, line_item_dicts.get(si.item_id), fields=sale_items_fields) for si in sale.sale_items]
 
-    return {
+    sale_details = {
         'id': sale.id,
         'customer_id': sale.customer_id,
         'customer': customer_details,
         'status': sale.status,
+        'version': sale.version, # Send back as If-Match (or `version`) on writes; see SaleService._commit_sale
         'created_at': sale.created_at.isoformat() if sale.created_at else None,
         'updated_at': sale.updated_at.isoformat() if sale.updated_at else None,
         'customer_notes': sale.customer_notes,
@@ -114,19 +140,23 @@ def sale_to_dict(sale):
         'overall_discount_value': float(sale.overall_discount_value) if sale.overall_discount_value is not None else 0.0,
         # 'overall_discount_amount_applied' is one of the main fields below
 
-        'sale_items': [sale_item_to_dict(si) for si in sale.sale_items],
+        'sale_items': sale_item_dicts,
         'payments': [_simple_payment_to_dict_for_sale(p) for p in sale.payments], 
         
         # New detailed financial breakdown
-        'subtotal_gross_original': float(subtotal_gross_original_calc),
-        'total_line_item_discounts': float(total_line_item_discounts_calc),
-        'overall_discount_amount_applied': float(overall_discount_amount_applied_calc),
-        'net_subtotal_inc_tax': float(net_subtotal_inc_tax_calc),
-        'gst_amount': float(gst_amount_calc),
-        'transaction_fee': float(transaction_fee_calc),
-        'final_grand_total': float(final_grand_total_calc),
+        'subtotal_gross_original': cents_to_float(subtotal_gross_original_calc),
+        'total_line_item_discounts': cents_to_float(total_line_item_discounts_calc),
+        'overall_discount_amount_applied': cents_to_float(overall_discount_amount_applied_calc),
+        'net_subtotal_inc_tax': cents_to_float(net_subtotal_inc_tax_calc),
+        'gst_amount': cents_to_float(to_cents(sale.gst_amount)),
+        'transaction_fee': cents_to_float(to_cents(sale.transaction_fee)),
+        'final_grand_total': cents_to_float(to_cents(sale.grand_total)),
         
-        'amount_paid': float(amount_paid_calc),
-        'amount_due': float(amount_due_calc),
+        'amount_paid': cents_to_float(to_cents(sale.amount_paid)),
+        'amount_due': cents_to_float(to_cents(sale.amount_due)),
         'gst_rate_percentage': float(gst_rate_percentage)
-    }
\ No newline at end of file
+    }
+    # sale_items and customer are already projected above
+    if fields is not None:
+        fields = dict(fields, **{key: True for key in ('sale_items', 'customer') if key in fields})
+    return project(sale_details, fields)
\ No newline at end of file
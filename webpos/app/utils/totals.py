@@ -0,0 +1,166 @@
+"""Sale totals arithmetic on integer cents.
+
+Every amount here is an int number of cents. Rates (GST, the EFTPOS fee, percentage
+discounts) are anything Decimal() accepts and are applied as exact fractions. The rounding
+rules, which are those of the ROUND_HALF_UP quantize calls this replaced:
+
+  - amounts enter through to_cents, rounded half up (away from zero) to whole cents
+  - sums and differences of cents are exact
+  - a rate applied to an amount is rounded half up to whole cents once, after the division
+
+Nothing here touches the database or the app config; callers pass the stored amounts and the
+configured rates in, and convert back with from_cents (Decimal, for the Numeric columns and
+the print templates) or cents_to_float (JSON).
+"""
+
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+
+# Amounts derived from a sale's stored sums (see derive_totals)
+DerivedTotals = namedtuple('DerivedTotals', 'net_subtotal gst_amount grand_total amount_due')
+
+_ZERO = Decimal(0)
+
+
+def to_cents(value):
+    """Whole cents of a money value (Decimal, str, int or float); None counts as zero."""
+    if value is None:
+        return 0
+    if value.__class__ is not Decimal:
+        value = Decimal(str(value))
+    return int((value * 100).to_integral_value(ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    """Decimal with two places, e.g. 1234 -> Decimal('12.34')."""
+    return Decimal(cents).scaleb(-2)
+
+
+def cents_to_float(cents):
+    return cents / 100
+
+
+@lru_cache(maxsize=64)
+def _ratio(rate):
+    """(numerator, denominator) of a rate, exactly. Cached: the configured rates repeat."""
+    if not isinstance(rate, Decimal):
+        rate = Decimal(str(rate))
+    return rate.as_integer_ratio()
+
+
+def _divide(numerator, denominator):
+    """numerator / denominator rounded half up (away from zero); denominator must be positive."""
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if 2 * remainder >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+def percent_of(cents, rate):
+    """cents * rate / 100."""
+    numerator, denominator = _ratio(rate)
+    return _divide(cents * numerator, 100 * denominator)
+
+
+def tax_included_in(cents, gst_rate):
+    """The GST contained in a GST-inclusive amount: cents * rate / (100 + rate)."""
+    numerator, denominator = _ratio(gst_rate)
+    return _divide(cents * numerator, 100 * denominator + numerator)
+
+
+def tax_on_net(cents, gst_rate):
+    """GST added on top of a GST-exclusive amount; nothing on zero or negative amounts."""
+    return percent_of(cents, gst_rate) if cents > 0 else 0
+
+
+def remove_tax(cents, gst_rate):
+    """The GST-exclusive part of a GST-inclusive amount: cents * 100 / (100 + rate)."""
+    numerator, denominator = _ratio(gst_rate)
+    return _divide(cents * 100 * denominator, 100 * denominator + numerator)
+
+
+def line_amounts(price_at_sale, sale_price, quantity):
+    """(gross, line discount) a sale line contributes to its sale's stored sums. Prices in
+    cents; sale_price None means undiscounted."""
+    if sale_price is None:
+        sale_price = price_at_sale
+    quantity = quantity or 0
+    return price_at_sale * quantity, (price_at_sale - sale_price) * quantity
+
+
+def line_sums(lines):
+    """(gross, line discount) in cents of many lines, given as (price_at_sale, sale_price,
+    quantity) with the stored Decimal prices. Products of two-place prices and whole quantities
+    sum exactly, so the sums are converted once instead of every price."""
+    gross = discount = _ZERO
+    for price_at_sale, sale_price, quantity in lines:
+        if price_at_sale is None:
+            price_at_sale = _ZERO
+        if sale_price is None:
+            sale_price = price_at_sale
+        quantity = quantity or 0
+        gross += price_at_sale * quantity
+        discount += (price_at_sale - sale_price) * quantity
+    return to_cents(gross), to_cents(discount)
+
+
+def derive_totals(subtotal_gross, line_discount_total, overall_discount, transaction_fee, amount_paid, gst_rate):
+    """The stored GST, grand total and amount due from the summed amounts. Every amount is
+    GST-inclusive, so GST is the tax fraction of the net subtotal plus that of the fee, each
+    rounded on its own."""
+    net_subtotal = subtotal_gross - line_discount_total - overall_discount
+    gst_amount = tax_included_in(net_subtotal, gst_rate) + tax_included_in(transaction_fee, gst_rate)
+    grand_total = net_subtotal + transaction_fee
+    return DerivedTotals(net_subtotal, gst_amount, grand_total, grand_total - amount_paid)
+
+
+def eftpos_fee(net_subtotal, fee_percentage):
+    """The GST-inclusive card fee: a straight percentage of the GST-inclusive subtotal."""
+    return max(0, percent_of(net_subtotal, fee_percentage))
+
+
+def overall_discount(subtotal, discount_type, discount_value, gst_rate, rounding_target=None):
+    """Applies an overall discount to a subtotal (cents, after line discounts) and returns
+    (stored type, stored value in cents, discount amount in cents). discount_value is the
+    Decimal the user entered: a percentage, a fixed amount or a target total. Raises
+    ValueError for an unknown type or an out of range value.
+
+    rounding_target 'round_down_ten_dollar' adds the pre-tax discount that brings the total
+    with GST on top down to the $10 below, and stores the result as a fixed discount.
+    'round_down_dollar' rounds down to whole cents, which is what the Decimal code it came
+    from did (quantize to '1.00'), so it never changes the total."""
+    if discount_type == 'none':
+        stored_value, amount = 0, 0
+    elif discount_type == 'percentage':
+        if not (0 <= discount_value <= 100):
+            raise ValueError("Percentage discount must be between 0 and 100.")
+        stored_value, amount = to_cents(discount_value), percent_of(subtotal, discount_value)
+    elif discount_type == 'fixed':
+        if discount_value < 0:
+            raise ValueError("Fixed discount value cannot be negative.")
+        stored_value = to_cents(discount_value)
+        # Capped at the subtotal so the discount alone cannot make the total negative
+        amount = min(stored_value, subtotal)
+    elif discount_type == 'target_total':
+        if discount_value < 0:
+            raise ValueError("Target total cannot be negative.")
+        stored_value = to_cents(discount_value) # The target total itself
+        # A target above the subtotal is no discount, not a price increase
+        amount = max(0, subtotal - stored_value)
+    else:
+        raise ValueError(f"Invalid discount type: {discount_type}.")
+
+    if rounding_target:
+        net_subtotal = subtotal - amount
+        grand_total = net_subtotal + tax_on_net(net_subtotal, gst_rate)
+        rounded = grand_total
+        if rounding_target == 'round_down_ten_dollar':
+            # Towards zero, like Decimal floor division
+            rounded = abs(grand_total) // 1000 * 1000 * (1 if grand_total >= 0 else -1)
+        if rounded < grand_total:
+            # The reduction comes off the pre-tax amount
+            amount += remove_tax(grand_total - rounded, gst_rate)
+            discount_type, stored_value = 'fixed', amount
+
+    return discount_type, stored_value, max(0, min(amount, subtotal))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+One-off backfill of the local Xero IDs (customers.xero_contact_id and sales.xero_invoice_id).
+Pages once through the organisation's contacts and sales invoices and stores the ContactID of
+each customer whose name matches a contact, and the InvoiceID of each sale with an invoice
+referenced "Sale #<id>" (voided and deleted invoices are skipped). IDs already stored are left
+alone, so re-running it only fills the gaps. With --dry-run nothing is written.
+
+Needs a working Xero connection (xero_credentials.json and xero_token.json, see /login).
+
+    python backfill_xero_ids.py --dry-run
+    python backfill_xero_ids.py
+"""
+
+import argparse
+import re
+
+from sqlalchemy import bindparam
+from xero_python.exceptions import OpenApiException
+
+from app import create_app, db
+from app.models import Customer, Sale
+from app.services.xero_service import xero_service
+
+SALE_REFERENCE = re.compile(r'^Sale #(\d+)$')
+
+
+def fetch_pages(fetch, page_size):
+    """Yields the records of every page until a short one."""
+    page = 1
+    while True:
+        records = fetch(page=page, page_size=page_size)
+        yield from records
+        if len(records) < page_size:
+            return
+        page += 1
+
+
+def contact_ids_by_name(accounting_api, tenant_id, page_size):
+    contact_ids = {}
+    for contact in fetch_pages(
+        lambda **paging: accounting_api.get_contacts(tenant_id, summary_only=True, **paging).contacts or [], page_size
+    ):
+        if contact.contact_status != 'ARCHIVED':
+            contact_ids.setdefault(contact.name, contact.contact_id)
+    return contact_ids
+
+
+def invoice_ids_by_sale(accounting_api, tenant_id, page_size):
+    invoice_ids = {}
+    for invoice in fetch_pages(
+        lambda **paging: accounting_api.get_invoices(tenant_id, where='Type=="ACCREC"', summary_only=True, **paging).invoices or [], page_size
+    ):
+        match = SALE_REFERENCE.match(invoice.reference or '')
+        if match and invoice.status not in ('VOIDED', 'DELETED'):
+            invoice_ids.setdefault(int(match.group(1)), invoice.invoice_id)
+    return invoice_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help='report what would be stored without writing')
+    parser.add_argument('--page-size', type=int, default=1000, help='records per Xero page (at most 1000)')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if not xero_service.api_client or not xero_service._get_token():
+            print("❌ No Xero connection; authenticate at /login first")
+            return 1
+        accounting_api = xero_service._accounting_api()
+        tenant_id = xero_service._get_tenant_id()
+
+        try:
+            contact_ids = contact_ids_by_name(accounting_api, tenant_id, args.page_size)
+            invoice_ids = invoice_ids_by_sale(accounting_api, tenant_id, args.page_size)
+        except OpenApiException as e:
+            print(f"❌ Xero request failed: {e}")
+            return 1
+        print(f"Read {len(contact_ids)} contacts and {len(invoice_ids)} sale invoices from Xero")
+
+        customer_rows = [
+            {'b_id': customer_id, 'b_xero_id': contact_ids[name]}
+            for customer_id, name in db.session.query(Customer.id, Customer.name).filter(Customer.xero_contact_id.is_(None))
+            if name in contact_ids
+        ]
+        sale_rows = [
+            {'b_id': sale_id, 'b_xero_id': invoice_ids[sale_id]}
+            for (sale_id,) in db.session.query(Sale.id).filter(Sale.xero_invoice_id.is_(None))
+            if sale_id in invoice_ids
+        ]
+
+        if not args.dry_run:
+            customers, sales = Customer.__table__, Sale.__table__
+            if customer_rows:
+                db.session.execute(
+                    customers.update().where(customers.c.id == bindparam('b_id')).values(xero_contact_id=bindparam('b_xero_id')),
+                    customer_rows
+                )
+            if sale_rows:
+                # updated_at is kept, so the sales keep their place in the lists
+                db.session.execute(
+                    sales.update().where(sales.c.id == bindparam('b_id')).values(xero_invoice_id=bindparam('b_xero_id'), updated_at=sales.c.updated_at),
+                    sale_rows
+                )
+            db.session.commit()
+
+        if args.dry_run:
+            print(f"✅ {len(customer_rows)} customers and {len(sale_rows)} sales would be mapped (dry run)")
+        else:
+            print(f"✅ {len(customer_rows)} customers and {len(sale_rows)} sales mapped")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
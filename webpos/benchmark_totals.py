@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Equivalence check and benchmark for the integer-cents totals engine (app/utils/totals.py).
+
+The check runs the engine and the Decimal code it replaced (kept below as the reference) on
+random sales, discounts, fees and GST rates, and reports every case where they disagree. It
+also pins the payment status rule on explicit sales with an EFTPOS fee and GST: a sale is Paid
+once the payments cover the GST-inclusive grand total, fee included. That is a deliberate
+departure from the legacy rule (net subtotal plus GST on top, fee left out), so those cases
+check that the two disagree where expected. The benchmark then times both on one large sale: aggregating the stored sums from its lines (what
+check_sale_totals.py and calculate_sale_totals do) and the per-request work of serialising
+the totals and re-deriving the stored totals.
+
+Needs no database; run it where the app imports (config.py present).
+
+    python benchmark_totals.py
+    python benchmark_totals.py --cases 200000 --lines 20000
+"""
+
+import argparse
+import random
+import time
+from decimal import Decimal, ROUND_HALF_UP, ROUND_DOWN
+from types import SimpleNamespace
+
+from flask import Flask
+
+from app.services.sale_service import SaleService
+from app.utils import totals
+from app.utils.totals import to_cents, from_cents, cents_to_float
+
+CENT = Decimal('0.01')
+GST_RATES = [Decimal(rate) for rate in ('10', '15', '12.5', '7.7', '20', '0')]
+FEE_PERCENTAGES = [Decimal(rate) for rate in ('2', '1.5', '3.3', '0')]
+DISCOUNT_TYPES = ('none', 'percentage', 'fixed', 'target_total', 'bogus')
+ROUNDING_TARGETS = (None, None, 'round_down_dollar', 'round_down_ten_dollar')
+
+
+# --- Reference: the Decimal code the engine replaced ---
+
+def _q(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def legacy_derive_totals(subtotal_gross, line_discount_total, overall_discount, transaction_fee, amount_paid, gst_rate):
+    net_subtotal = subtotal_gross - line_discount_total - overall_discount
+    gst_divisor = Decimal('1') + (gst_rate / Decimal('100'))
+    gst_from_subtotal = _q(net_subtotal - (net_subtotal / gst_divisor))
+    gst_from_fee = _q(transaction_fee - (transaction_fee / gst_divisor))
+    grand_total = net_subtotal + transaction_fee
+    return net_subtotal, gst_from_subtotal + gst_from_fee, grand_total, grand_total - amount_paid
+
+
+def legacy_tax_on_net(amount_net, gst_rate):
+    if amount_net <= 0:
+        return Decimal('0.00')
+    return _q(amount_net * (gst_rate / Decimal('100')))
+
+
+def legacy_billable_total(subtotal_gross, line_discount_total, overall_discount, gst_rate):
+    """The total the payment status used to be judged against (no longer matched; see
+    check_payment_status)."""
+    net = _q(subtotal_gross - line_discount_total) - _q(overall_discount)
+    return net + legacy_tax_on_net(net, gst_rate)
+
+
+def legacy_eftpos_fee(net_subtotal, fee_percentage):
+    return max(Decimal('0.00'), _q(net_subtotal * fee_percentage / Decimal('100')))
+
+
+def legacy_overall_discount(subtotal, discount_type, discount_value, gst_rate, rounding_target):
+    """Returns (type, value, applied) or the error message."""
+    subtotal = _q(subtotal)
+    if discount_type == 'none':
+        stored_type, stored_value, applied = 'none', Decimal('0.00'), Decimal('0.00')
+    elif discount_type == 'percentage':
+        if not (0 <= discount_value <= 100):
+            return "Percentage discount must be between 0 and 100."
+        applied = _q(subtotal * discount_value / Decimal('100'))
+        stored_type, stored_value = 'percentage', _q(discount_value)
+    elif discount_type == 'fixed':
+        if discount_value < 0:
+            return "Fixed discount value cannot be negative."
+        applied = min(_q(discount_value), subtotal)
+        stored_type, stored_value = 'fixed', _q(discount_value)
+    elif discount_type == 'target_total':
+        if discount_value < 0:
+            return "Target total cannot be negative."
+        stored_value = _q(discount_value)
+        applied = max(Decimal('0.00'), subtotal - stored_value)
+        stored_type = 'target_total'
+    else:
+        return f"Invalid discount type: {discount_type}."
+
+    if rounding_target:
+        net = subtotal - applied
+        grand_total = net + legacy_tax_on_net(net, gst_rate)
+        rounded = grand_total
+        if rounding_target == 'round_down_dollar':
+            rounded = grand_total.quantize(Decimal('1.00'), rounding=ROUND_DOWN)
+        elif rounding_target == 'round_down_ten_dollar':
+            rounded = (grand_total // Decimal('10')) * Decimal('10')
+        if rounded < grand_total:
+            applied += _q((grand_total - rounded) / (Decimal('1') + gst_rate / Decimal('100')))
+            stored_type, stored_value = 'fixed', applied
+    applied = max(Decimal('0.00'), min(applied, subtotal))
+    return stored_type, stored_value, applied
+
+
+def legacy_line_sums(lines):
+    subtotal_gross = line_discount_total = Decimal('0.00')
+    for line in lines:
+        price_at_sale = Decimal(line.price_at_sale if line.price_at_sale is not None else '0.00')
+        sale_price = Decimal(line.sale_price if line.sale_price is not None else price_at_sale)
+        subtotal_gross += price_at_sale * line.quantity
+        line_discount_total += (price_at_sale - sale_price) * line.quantity
+    return _q(subtotal_gross), _q(line_discount_total)
+
+
+def legacy_money_floats(sale):
+    return [float(_q(Decimal(getattr(sale, column) if getattr(sale, column) is not None else '0.00'))) for column in MONEY_COLUMNS]
+
+
+# --- Engine equivalents of the same steps ---
+
+def engine_line_sums(lines):
+    return totals.line_sums((line.price_at_sale, line.sale_price, line.quantity) for line in lines)
+
+
+def engine_line_sums_per_line(lines):
+    """Converting every price, as _line_amounts does for the single line a write touches."""
+    subtotal_gross = line_discount_total = 0
+    for line in lines:
+        gross, discount = totals.line_amounts(
+            to_cents(line.price_at_sale), to_cents(line.sale_price) if line.sale_price is not None else None, line.quantity
+        )
+        subtotal_gross += gross
+        line_discount_total += discount
+    return subtotal_gross, line_discount_total
+
+
+def engine_money_floats(sale):
+    return [cents_to_float(to_cents(getattr(sale, column))) for column in MONEY_COLUMNS]
+
+
+MONEY_COLUMNS = ('subtotal_gross', 'line_discount_total', 'overall_discount_amount_applied', 'transaction_fee',
+                 'gst_amount', 'grand_total', 'amount_paid', 'amount_due')
+
+
+def money(rng, low, high):
+    return from_cents(rng.randint(low, high))
+
+
+def random_sale(rng, lines):
+    sale_lines = []
+    for _ in range(lines):
+        price_at_sale = money(rng, 0, 500000)
+        sale_price = rng.choice([None, price_at_sale, money(rng, 0, to_cents(price_at_sale))])
+        sale_lines.append(SimpleNamespace(price_at_sale=price_at_sale, sale_price=sale_price, quantity=rng.randint(1, 50)))
+    return sale_lines
+
+
+def check(cases, rng):
+    failures = []
+
+    def expect(label, case, legacy, engine):
+        if legacy != engine:
+            failures.append(f"{label} {case}: Decimal {legacy!r}, cents {engine!r}")
+
+    for _ in range(cases):
+        gst_rate = rng.choice(GST_RATES)
+        sums = [money(rng, 0, 5000000), money(rng, 0, 500000), money(rng, 0, 500000), money(rng, 0, 20000), money(rng, 0, 5000000)]
+        if rng.random() < 0.2:
+            sums[2] = money(rng, 0, 10000000) # Discounts past the subtotal, for negative nets
+        case = (sums, gst_rate)
+
+        legacy = legacy_derive_totals(*sums, gst_rate)
+        engine = totals.derive_totals(*[to_cents(value) for value in sums], gst_rate)
+        expect('derive_totals', case, legacy, tuple(from_cents(value) for value in engine))
+
+        fee_percentage = rng.choice(FEE_PERCENTAGES)
+        net = sums[0] - sums[1] - sums[2]
+        expect('eftpos_fee', (net, fee_percentage), legacy_eftpos_fee(net, fee_percentage),
+               from_cents(totals.eftpos_fee(to_cents(net), fee_percentage)))
+
+        subtotal = sums[0] - sums[1]
+        discount_type = rng.choice(DISCOUNT_TYPES)
+        rounding_target = rng.choice(ROUNDING_TARGETS)
+        if discount_type == 'percentage':
+            discount_value = Decimal(rng.randint(-500, 11000)).scaleb(-rng.choice([0, 1, 2, 3]))
+        else:
+            discount_value = Decimal(rng.randint(-1000, 6000000)).scaleb(-rng.choice([2, 3]))
+        case = (subtotal, discount_type, discount_value, gst_rate, rounding_target)
+        legacy = legacy_overall_discount(subtotal, discount_type, discount_value, gst_rate, rounding_target)
+        try:
+            stored_type, stored_value, applied = totals.overall_discount(to_cents(subtotal), discount_type, discount_value, gst_rate, rounding_target)
+            engine = (stored_type, from_cents(stored_value), from_cents(applied))
+        except ValueError as e:
+            engine = str(e)
+        expect('overall_discount', case, legacy, engine)
+
+    for _ in range(max(1, cases // 100)):
+        sale_lines = random_sale(rng, rng.randint(0, 40))
+        expect('line sums', len(sale_lines), legacy_line_sums(sale_lines), tuple(from_cents(value) for value in engine_line_sums(sale_lines)))
+        expect('line amounts', len(sale_lines), legacy_line_sums(sale_lines), tuple(from_cents(value) for value in engine_line_sums_per_line(sale_lines)))
+        sale = SimpleNamespace(**{column: rng.choice([None, money(rng, -500000, 5000000)]) for column in MONEY_COLUMNS})
+        expect('serialised totals', vars(sale), legacy_money_floats(sale), engine_money_floats(sale))
+
+    return failures
+
+
+# (net subtotal, fee %, GST %, amount paid, status under the current rule, status under the legacy rule)
+PAYMENT_STATUS_CASES = [
+    ('110.00', '2', '10', '112.20', 'Paid', 'Invoice'),    # Grand total 110.00 + 2.20 fee; legacy wanted 121.00
+    ('110.00', '2', '10', '112.19', 'Invoice', 'Invoice'), # One cent short of the fee-inclusive total
+    ('110.00', '2', '10', '110.00', 'Invoice', 'Invoice'), # The fee is part of what is owed
+    ('110.00', '0', '10', '110.00', 'Paid', 'Invoice'),    # GST is included in the price, not added on top
+    ('110.00', '2', '10', '121.00', 'Paid', 'Paid'),
+    ('110.00', '2', '0', '112.20', 'Paid', 'Paid'),        # Without GST only the fee separates the rules
+    ('110.00', '2', '0', '110.00', 'Invoice', 'Paid'),
+]
+
+
+def check_payment_status():
+    """Runs SaleService._apply_payment_status on the explicit PAYMENT_STATUS_CASES."""
+    failures = []
+    # The status change is logged through current_app; no database is involved
+    with Flask(__name__).app_context():
+        for net, fee_percentage, gst_rate, paid, expected, expected_legacy in PAYMENT_STATUS_CASES:
+            net, gst_rate = to_cents(Decimal(net)), Decimal(gst_rate)
+            fee = totals.eftpos_fee(net, Decimal(fee_percentage))
+            derived = totals.derive_totals(net, 0, 0, fee, to_cents(Decimal(paid)), gst_rate)
+            sale = SimpleNamespace(id=0, status='Open', sale_items=[object()], grand_total=from_cents(derived.grand_total),
+                                   amount_paid=Decimal(paid), amount_due=from_cents(derived.amount_due))
+            SaleService._apply_payment_status(sale)
+            legacy = 'Paid' if Decimal(paid) >= legacy_billable_total(from_cents(net), Decimal('0'), Decimal('0'), gst_rate) else 'Invoice'
+            case = f"net {from_cents(net)} + fee {from_cents(fee)} at {gst_rate}% GST, paid {paid}"
+            if sale.status != expected:
+                failures.append(f"payment status, {case}: {sale.status}, expected {expected}")
+            if (sale.status == 'Paid') != (sale.amount_due <= 0):
+                failures.append(f"payment status, {case}: {sale.status} with {sale.amount_due} due")
+            if legacy != expected_legacy:
+                failures.append(f"payment status, {case}: legacy rule gives {legacy}, expected {expected_legacy}")
+    return failures
+
+
+def timed(label, runs, fn):
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    elapsed_ms = (time.perf_counter() - start) * 1000 / runs
+    print(f"   {label:40s} {elapsed_ms:9.3f} ms")
+    return elapsed_ms
+
+
+def benchmark(lines, runs, rng):
+    sale_lines = random_sale(rng, lines)
+    subtotal_gross, line_discount_total = legacy_line_sums(sale_lines)
+    sale = SimpleNamespace(
+        subtotal_gross=subtotal_gross, line_discount_total=line_discount_total,
+        overall_discount_amount_applied=Decimal('12.34'), transaction_fee=Decimal('5.67'),
+        gst_amount=Decimal('0.00'), grand_total=Decimal('0.00'), amount_paid=Decimal('100.00'), amount_due=Decimal('0.00')
+    )
+    gst_rate, fee_percentage = Decimal('10'), Decimal('2')
+
+    def legacy_request():
+        legacy_money_floats(sale)
+        legacy_eftpos_fee(sale.subtotal_gross - sale.line_discount_total - sale.overall_discount_amount_applied, fee_percentage)
+        legacy_derive_totals(sale.subtotal_gross, sale.line_discount_total, sale.overall_discount_amount_applied,
+                             sale.transaction_fee, sale.amount_paid, gst_rate)
+
+    def engine_request():
+        engine_money_floats(sale)
+        sums = [to_cents(getattr(sale, column)) for column in MONEY_COLUMNS[:4]] + [to_cents(sale.amount_paid)]
+        totals.eftpos_fee(sums[0] - sums[1] - sums[2], fee_percentage)
+        totals.derive_totals(*sums, gst_rate)
+
+    print(f"\n===== One sale of {lines} lines =====")
+    legacy = timed('aggregate lines (Decimal)', max(1, runs // 100), lambda: legacy_line_sums(sale_lines))
+    timed('aggregate lines (cents, per line)', max(1, runs // 100), lambda: engine_line_sums_per_line(sale_lines))
+    engine = timed('aggregate lines (cents)', max(1, runs // 100), lambda: engine_line_sums(sale_lines))
+    print(f"-- line aggregation {legacy / engine:.1f}x")
+    legacy = timed('per-request totals (Decimal)', runs, legacy_request)
+    engine = timed('per-request totals (cents)', runs, engine_request)
+    print(f"-- per-request totals {legacy / engine:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', type=int, default=50000, help='random cases for the equivalence check')
+    parser.add_argument('--lines', type=int, default=5000, help='lines in the benchmarked sale')
+    parser.add_argument('--runs', type=int, default=20000, help='repetitions of the per-request benchmark')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print(f"===== Equivalence with the Decimal code, {args.cases} cases =====")
+    failures = check(args.cases, rng)
+    for failure in failures[:20]:
+        print(f"   ❌ {failure}")
+    print(f"-- {len(failures)} mismatches" if failures else "✅ engine and Decimal code agree on every case")
+
+    print(f"\n===== Payment status rule, {len(PAYMENT_STATUS_CASES)} explicit fee and GST cases =====")
+    status_failures = check_payment_status()
+    for failure in status_failures:
+        print(f"   ❌ {failure}")
+    if not status_failures:
+        print("✅ sales are Paid exactly when the GST-inclusive, fee-inclusive grand total is covered")
+    failures += status_failures
+
+    benchmark(args.lines, args.runs, rng)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
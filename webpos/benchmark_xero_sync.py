@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Xero sync benchmark: one-at-a-time versus batched pushes from the outbox.
+
+Starts a local mock of the Xero accounting API (contacts, invoices and payments, with a fixed
+latency per call), seeds a throwaway database with paid sales, then drains the Xero outbox
+(XeroOutboxService.drain) against the mock twice: with XERO_BATCH_SIZE = 1, the per-payment
+calls, and with the batch size given. Each pass reports the API calls made, the wall time and
+how long Xero's limit of 60 calls per minute would stretch the calls to.
+
+Both passes are then checked against the mock: every sent payment is on its sale's invoice
+exactly once, and only the payments of sales whose invoice the mock rejected (--reject-every)
+are still unsent, while the rest of their batch went through.
+
+Never point this at a live database: it creates tables and inserts rows. The default is an
+in-memory SQLite database. Run it where the app imports (config.py present).
+
+    python benchmark_xero_sync.py
+    python benchmark_xero_sync.py --sales 500 --latency 0.3 --reject-every 25
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from xero_python.api_client import ApiClient
+from xero_python.api_client.configuration import Configuration
+from xero_python.api_client.oauth2 import OAuth2Token
+
+from app import create_app, db
+from app.models import Item, Sale, Customer, XeroOutboxEvent
+from app.services.payment_service import PaymentService
+from app.services.sale_service import SaleService
+from app.services.xero_outbox import XeroOutboxService
+from app.services.xero_service import XeroService
+from config import Config
+
+XERO_CALLS_PER_MINUTE = 60
+WHERE_TERM = re.compile(r'(\w+)=="((?:[^"\\]|\\.)*)"')
+
+
+class MockXero:
+    """In-memory Xero organisation behind the handful of accounting endpoints XeroService uses."""
+
+    def __init__(self, latency, reject_every):
+        self.latency = latency
+        self.reject_every = reject_every
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.contacts = {}
+        self.invoices = {}
+        self.payments = {}
+        self.idempotent = {}
+        self.calls = Counter()
+
+    def _rejects(self, reference):
+        """Whether the mock refuses the invoice of a sale, e.g. "Sale #25" with --reject-every 25."""
+        sale_id = int(reference.rsplit('#', 1)[1])
+        return bool(self.reject_every) and sale_id % self.reject_every == 0
+
+    @staticmethod
+    def _matches(where, record):
+        terms = WHERE_TERM.findall(where or '')
+        return not terms or any(record.get(field) == value.replace('\\"', '"') for field, value in terms)
+
+    @staticmethod
+    def _page(query, records):
+        if 'page' not in query:
+            return records
+        page, page_size = int(query['page'][0]), int(query.get('pageSize', ['100'])[0])
+        return records[(page - 1) * page_size:page * page_size]
+
+    def _invoice_view(self, invoice):
+        return dict(invoice, Payments=[self.payments[payment_id] for payment_id in invoice['PaymentIDs']], PaymentIDs=None)
+
+    def handle(self, method, path, query, body, headers):
+        """Returns (status, body) for one request."""
+        time.sleep(self.latency)
+        parts = path.rstrip('/').split('/')
+        resource = parts[-1] if parts[-2] == '2.0' else parts[-2]
+        with self.lock:
+            self.calls[f"{method} {resource}"] += 1
+            key = headers.get('Idempotency-Key')
+            if key and key in self.idempotent:
+                return self.idempotent[key]
+            result = self._dispatch(method, resource, parts, query, body)
+            if key and result[0] == 200:
+                self.idempotent[key] = result
+            return result
+
+    def _dispatch(self, method, resource, parts, query, body):
+        where = query.get('where', [None])[0]
+        summarize = query.get('summarizeErrors', ['true'])[0].lower() != 'false'
+
+        if resource == 'Contacts' and method == 'GET':
+            return 200, {'Contacts': self._page(query, [c for c in self.contacts.values() if self._matches(where, c)])}
+        if resource == 'Contacts' and method == 'PUT':
+            created = []
+            for contact in body['Contacts']:
+                contact = {'ContactID': str(uuid.uuid4()), 'Name': contact['Name'], 'ContactStatus': 'ACTIVE'}
+                self.contacts[contact['ContactID']] = contact
+                created.append(contact)
+            return 200, {'Contacts': created}
+
+        if resource == 'Invoices' and method == 'GET':
+            if parts[-1] != resource:
+                return 200, {'Invoices': [self._invoice_view(self.invoices[parts[-1]])]}
+            ids = query['IDs'][0].split(',') if 'IDs' in query else None
+            return 200, {'Invoices': self._page(query, [self._invoice_view(i) for i in self.invoices.values()
+                                                        if self._matches(where, i) and (ids is None or i['InvoiceID'] in ids)])}
+        if resource == 'Invoices' and method == 'PUT':
+            results, rejected = [], False
+            for invoice in body['Invoices']:
+                if self._rejects(invoice['Reference']):
+                    rejected = True
+                    results.append({'Reference': invoice['Reference'], 'Type': 'ACCREC', 'HasErrors': True, 'StatusAttributeString': 'ERROR',
+                                    'ValidationErrors': [{'Message': f"Mock rejects {invoice['Reference']}"}]})
+                    continue
+                invoice = {'InvoiceID': str(uuid.uuid4()), 'Type': 'ACCREC', 'Reference': invoice['Reference'], 'Status': 'AUTHORISED',
+                           'ContactID': invoice['Contact'].get('ContactID'), 'PaymentIDs': []}
+                self.invoices[invoice['InvoiceID']] = invoice
+                results.append(self._invoice_view(invoice))
+            if rejected and summarize:
+                return 400, {'Type': 'ValidationException', 'Message': 'A validation exception occurred', 'Elements': results}
+            return 200, {'Invoices': results}
+        if resource == 'Invoices' and method == 'POST':
+            invoice = self.invoices[parts[-1]]
+            invoice['Status'] = body['Invoices'][0]['Status']
+            return 200, {'Invoices': [self._invoice_view(invoice)]}
+
+        if resource == 'Payments' and method == 'PUT':
+            created = []
+            for payment in body['Payments']:
+                invoice = self.invoices[payment['Invoice']['InvoiceID']]
+                payment = {'PaymentID': str(uuid.uuid4()), 'Reference': payment.get('Reference'), 'Amount': payment['Amount'], 'Status': 'AUTHORISED'}
+                self.payments[payment['PaymentID']] = payment
+                invoice['PaymentIDs'].append(payment['PaymentID'])
+                created.append(payment)
+            return 200, {'Payments': created}
+        if resource == 'Payments' and method == 'POST':
+            self.payments[parts[-1]]['Status'] = 'DELETED'
+            return 200, {'Payments': [self.payments[parts[-1]]]}
+
+        return 404, {'Message': f"Mock has no {method} {resource}"}
+
+
+def serve(mock):
+    """Starts the mock on a free local port. Returns (server, base URL)."""
+    class Handler(BaseHTTPRequestHandler):
+        def _respond(self):
+            url = urlparse(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length)) if length else None
+            status, payload = mock.handle(self.command, url.path, parse_qs(url.query), body, self.headers)
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_PUT = do_POST = _respond
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/api.xro/2.0"
+
+
+class MockXeroService(XeroService):
+    """XeroService with a fixed token instead of the credential and token files."""
+
+    def __init__(self):
+        super().__init__()
+        self._api_client = ApiClient(Configuration(oauth2_token=OAuth2Token(client_id='mock', client_secret='mock')), pool_threads=1)
+        self._api_client.oauth2_token_getter(self._get_token)
+        self._token = {'access_token': 'mock', 'scope': ['accounting.transactions'], 'token_type': 'Bearer',
+                       'expires_in': 3600, 'expires_at': time.time() + 3600}
+        self.tenant_id = 'mock-tenant'
+
+
+def seed(sale_count):
+    """Paid sales through PaymentService, so each queues its outbox events as in the shop. Every
+    third sale is paid in two parts and every fifth has a named customer. Returns the payment count."""
+    items = [Item(parent_id=-1, sku=f'XB{i:03d}', title=f'Benchmark Item {i}', price=5 + i) for i in range(1, 11)]
+    customers = [Customer(name=f'Benchmark Customer {i}') for i in range(1, 6)]
+    db.session.add_all(items + customers)
+    db.session.commit()
+
+    payments = 0
+    for n in range(sale_count):
+        sale, error = SaleService.create_sale({'status': 'Open', 'customer_id': customers[n // 5 % 5].id if n % 5 == 0 else None})
+        if error:
+            raise RuntimeError(error)
+        for i in range(1 + n % 3):
+            item = items[(n * 7 + i) % len(items)]
+            _, error = SaleService.add_item_to_sale(sale.id, {'item_id': item.id, 'quantity': 1 + i})
+            if error:
+                raise RuntimeError(error)
+        total = db.session.get(Sale, sale.id).amount_due
+        half = (total / 2).quantize(Decimal('0.01'))
+        parts = [total] if n % 3 else [half, total - half]
+        for amount in parts:
+            _, error = PaymentService.record_payment(sale.id, {'payment_type': 'EFTPOS', 'amount': str(amount)})
+            if error:
+                raise RuntimeError(error)
+            payments += 1
+    return payments
+
+
+def run_pass(app, mock, label, batch_size):
+    """Requeues every payment event against an empty mock and drains the outbox until nothing is due."""
+    mock.reset()
+    XeroOutboxEvent.query.update({'status': 'pending', 'attempts': 0, 'next_attempt_at': XeroOutboxEvent.created_at, 'last_error': None, 'processed_at': None})
+    Sale.query.update({'xero_invoice_id': None})
+    Customer.query.update({'xero_contact_id': None})
+    db.session.commit()
+    app.config['XERO_BATCH_SIZE'] = batch_size
+
+    service = MockXeroService()
+    sent = failed = 0
+    started = time.perf_counter()
+    while True:
+        pass_sent, pass_failed = XeroOutboxService.drain(xero_service=service)
+        sent, failed = sent + pass_sent, failed + pass_failed
+        if not pass_sent and not pass_failed:
+            break
+    elapsed = time.perf_counter() - started
+
+    calls = sum(mock.calls.values())
+    print(f"\n{label}")
+    print(f"  sent {sent}, failed {failed}, {calls} API calls in {elapsed:.2f}s "
+          f"({calls / XERO_CALLS_PER_MINUTE:.1f} min at {XERO_CALLS_PER_MINUTE} calls/min)")
+    print("  " + ", ".join(f"{endpoint} {count}" for endpoint, count in sorted(mock.calls.items())))
+    return sent, failed, calls, elapsed
+
+
+def verify(mock):
+    """Checks the mock against the outbox. Returns a list of problems."""
+    problems = []
+    references = Counter(p['Reference'] for p in mock.payments.values() if p['Status'] != 'DELETED')
+    for event in XeroOutboxEvent.query.filter_by(event_type='payment'):
+        reference = XeroService.payment_reference({'id': event.payment_id})
+        sent_count = references.get(reference, 0)
+        if event.status == 'done' and sent_count != 1:
+            problems.append(f"event {event.id}: done but {reference} is in the mock {sent_count} times")
+        if event.status != 'done':
+            if not mock._rejects(f"Sale #{event.sale_id}"):
+                problems.append(f"event {event.id}: {event.status} though the mock accepts sale {event.sale_id}: {event.last_error}")
+            elif sent_count:
+                problems.append(f"event {event.id}: not done but {reference} is in the mock")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite://', help='SQLAlchemy URL of a scratch database')
+    parser.add_argument('--sales', type=int, default=200, help='paid sales to sync')
+    parser.add_argument('--batch-size', type=int, default=XeroService.MAX_BATCH_SIZE)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the mock takes per call')
+    parser.add_argument('--reject-every', type=int, default=40, help='the mock rejects the invoice of every Nth sale (0 for none)')
+    args = parser.parse_args()
+
+    mock = MockXero(args.latency, args.reject_every)
+    server, url = serve(mock)
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.database_url
+        STOCK_MATERIALISE_INTERVAL = 0
+        XERO_OUTBOX_INTERVAL = 0 # Drained explicitly by each pass
+        XERO_API_URL = url
+        # Dummy account codes: the fake API accepts any, and config.py.sample does not set them
+        XERO_SALES_ACCOUNT = '200'
+        XERO_BANK_ACCOUNT = '090'
+        XERO_BANK_ACCOUNT_CASH = '091'
+        XERO_BANK_ACCOUNT_EFTPOS = '092'
+        XERO_BANK_ACCOUNT_CHEQUE = '093'
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        if Sale.query.first() is not None:
+            print("❌ Target database already has sales; refusing to seed. Use an empty scratch database.")
+            return 1
+        payments = seed(args.sales)
+        print(f"Seeded {args.sales} sales with {payments} payments; mock latency {args.latency * 1000:.0f} ms per call")
+
+        results = {}
+        for label, batch_size in (('Single (one payment per push)', 1), (f'Batched ({args.batch_size} per push)', args.batch_size)):
+            results[batch_size] = run_pass(app, mock, label, batch_size)
+            problems = verify(mock)
+            for problem in problems[:10]:
+                print(f"  ❌ {problem}")
+            if problems:
+                return 1
+            print("  ✅ every sent payment is in the mock once; only the rejected sales are unsent")
+
+        single, batched = results[1], results[args.batch_size]
+        print("\n===== Summary =====")
+        print(f"API calls {single[2]} -> {batched[2]} ({single[2] / batched[2]:.1f}x fewer), "
+              f"wall time {single[3]:.2f}s -> {batched[3]:.2f}s")
+    server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Consistency check for the totals stored on each sale.
+Re-aggregates every sale's lines and payments and reports the sales whose stored subtotal,
+line discounts, GST, grand total, amount paid or amount due disagree. With --fix, the stored
+values are overwritten with the recomputed ones (after a bulk import that bypasses SaleService,
+or for the odd cent the SQL backfill in docs/schema.sql rounds differently).
+
+    python check_sale_totals.py
+    python check_sale_totals.py --fix
+"""
+
+import argparse
+
+from sqlalchemy.orm import selectinload
+
+from app import create_app, db
+from app.models import Sale
+from app.services.sale_service import SaleService
+
+
+def check_batch(sales, fix):
+    """Returns the number of mismatched sales in the batch, correcting them if fix is set."""
+    mismatched = 0
+    for sale in sales:
+        expected = SaleService.calculate_sale_totals(sale)
+        diffs = {column: (getattr(sale, column), value) for column, value in expected.items() if getattr(sale, column) != value}
+        if not diffs:
+            continue
+        mismatched += 1
+        print(f"Sale {sale.id} ({sale.status}): " + ', '.join(f"{column} stored {stored} expected {value}" for column, (stored, value) in diffs.items()))
+        if fix:
+            for column, value in expected.items():
+                setattr(sale, column, value)
+            # Tills holding the sale reload it before their next edit
+            sale.version = sale.version + 1
+    return mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fix', action='store_true', help='overwrite mismatched stored totals')
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        checked = mismatched = 0
+        last_id = 0
+        while True:
+            sales = Sale.query.options(selectinload(Sale.sale_items), selectinload(Sale.payments)) \
+                .filter(Sale.id > last_id).order_by(Sale.id.asc()).limit(args.batch_size).all()
+            if not sales:
+                break
+            mismatched += check_batch(sales, args.fix)
+            checked += len(sales)
+            last_id = sales[-1].id
+            if args.fix:
+                db.session.commit()
+            # Keep memory flat on large sales histories
+            db.session.expunge_all()
+
+        if mismatched == 0:
+            print(f"✅ {checked} sales checked, stored totals are consistent")
+        elif args.fix:
+            print(f"✅ {checked} sales checked, {mismatched} corrected")
+        else:
+            print(f"❌ {checked} sales checked, {mismatched} inconsistent (re-run with --fix to correct)")
+    return 1 if mismatched and not args.fix else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
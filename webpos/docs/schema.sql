@@ -5,6 +5,7 @@ CREATE TABLE Items (
     is_current_version BOOLEAN NOT NULL DEFAULT TRUE,
     sku VARCHAR(255),
     stock_quantity INTEGER NOT NULL DEFAULT 0,
+    stock_movement_seq INTEGER NOT NULL DEFAULT 0,
     is_stock_tracked BOOLEAN NOT NULL DEFAULT TRUE,
     title VARCHAR(2048) NOT NULL,
     description TEXT,
@@ -44,6 +45,28 @@ CREATE TABLE Customers (
     name VARCHAR(255) NOT NULL,
     address TEXT,
     company_name VARCHAR(255),
+    xero_contact_id VARCHAR(36),
+    PRIMARY KEY (id)
+);
+
+-- Paid walk-in sales rolled into one Xero invoice per day and GST treatment (XERO_DAILY_SUMMARY mode),
+-- sent by XeroDailySummaryService in the background. Created before Sales, which refers to it.
+CREATE TABLE xero_daily_summaries (
+    id INTEGER NOT NULL AUTO_INCREMENT,
+    summary_date DATE NOT NULL,
+    tax_treatment VARCHAR(20) NOT NULL,
+    sale_count INTEGER NOT NULL DEFAULT 0,
+    net_amount DECIMAL(12, 2) NOT NULL DEFAULT 0.00,
+    fee_amount DECIMAL(12, 2) NOT NULL DEFAULT 0.00,
+    total_amount DECIMAL(12, 2) NOT NULL DEFAULT 0.00,
+    tenders TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at DATETIME NOT NULL,
+    last_error TEXT,
+    xero_invoice_id VARCHAR(36),
+    created_at DATETIME NOT NULL,
+    processed_at DATETIME,
     PRIMARY KEY (id)
 );
 
@@ -55,13 +78,23 @@ CREATE TABLE Sales (
     overall_discount_value DECIMAL(10, 2) DEFAULT 0.00,
     overall_discount_amount_applied DECIMAL(10, 2) DEFAULT 0.00,
     transaction_fee DECIMAL(10, 2) NOT NULL DEFAULT 0.00,
+    subtotal_gross DECIMAL(10, 2) NOT NULL DEFAULT 0.00,
+    line_discount_total DECIMAL(10, 2) NOT NULL DEFAULT 0.00,
+    gst_amount DECIMAL(10, 2) NOT NULL DEFAULT 0.00,
+    grand_total DECIMAL(10, 2) NOT NULL DEFAULT 0.00,
+    amount_paid DECIMAL(10, 2) NOT NULL DEFAULT 0.00,
+    amount_due DECIMAL(10, 2) NOT NULL DEFAULT 0.00,
+    version INTEGER NOT NULL DEFAULT 1,
+    xero_invoice_id VARCHAR(36),
+    xero_summary_id INTEGER,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     customer_notes TEXT,
     internal_notes TEXT,
     purchase_order_number VARCHAR(100),
     PRIMARY KEY (id),
-    FOREIGN KEY(customer_id) REFERENCES Customers (id)
+    FOREIGN KEY(customer_id) REFERENCES Customers (id),
+    CONSTRAINT fk_sales_xero_summary_id FOREIGN KEY(xero_summary_id) REFERENCES xero_daily_summaries (id)
 );
 
 -- SaleItems Table (Line items for a sale)
@@ -126,4 +159,130 @@ CREATE TABLE combination_item_components (
     PRIMARY KEY (id),
     FOREIGN KEY(combination_item_id) REFERENCES combination_items (id) ON DELETE CASCADE,
     FOREIGN KEY(component_item_id) REFERENCES Items (id) ON DELETE CASCADE
-);
\ No newline at end of file
+);
+
+-- Change log: one row per changed item/category (read by tills via /api/catalog/changes) or
+-- quick-add button/customer (followed by the other application processes)
+CREATE TABLE catalog_changes (
+    id INTEGER NOT NULL AUTO_INCREMENT,
+    entity VARCHAR(20) NOT NULL,
+    entity_id INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id)
+);
+
+-- Append-only stock ledger, folded into Items.stock_quantity by StockService.materialise
+CREATE TABLE stock_movements (
+    id INTEGER NOT NULL AUTO_INCREMENT,
+    item_id INTEGER NOT NULL,
+    movement_type VARCHAR(20) NOT NULL,
+    quantity INTEGER NOT NULL,
+    is_absolute BOOLEAN NOT NULL DEFAULT FALSE,
+    sale_id INTEGER,
+    note VARCHAR(255),
+    created_at DATETIME NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(item_id) REFERENCES Items (id),
+    FOREIGN KEY(sale_id) REFERENCES Sales (id)
+);
+
+-- Changes waiting to be pushed to Xero, drained by XeroOutboxService in the background
+CREATE TABLE xero_outbox (
+    id INTEGER NOT NULL AUTO_INCREMENT,
+    event_type VARCHAR(20) NOT NULL,
+    sale_id INTEGER NOT NULL,
+    payment_id INTEGER,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at DATETIME NOT NULL,
+    last_error TEXT,
+    created_at DATETIME NOT NULL,
+    processed_at DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(sale_id) REFERENCES Sales (id),
+    FOREIGN KEY(payment_id) REFERENCES Payments (id)
+);
+
+-- Secondary indexes for the hot query paths. Kept in step with the __table_args__ of the models.
+-- On an existing database, `python upgrade_database.py` adds the missing ones.
+-- InnoDB appends the primary key to every secondary index, so (status, updated_at) also serves ORDER BY ... id tie-breaks.
+CREATE INDEX ix_items_current_active_parent ON Items (is_current_version, is_active, parent_id);
+-- Prefix index: serves `title LIKE 'abc%'` lookups and title-ordered listings without indexing the full 2048 chars
+CREATE INDEX ix_items_title_prefix ON Items (title(32));
+CREATE INDEX ix_photos_item_id ON Photos (item_id);
+CREATE INDEX ix_saleitems_sale_id ON SaleItems (sale_id);
+CREATE INDEX ix_saleitems_item_id ON SaleItems (item_id);
+CREATE INDEX ix_payments_sale_id ON Payments (sale_id);
+CREATE INDEX ix_sales_status_updated_at ON Sales (status, updated_at);
+CREATE INDEX ix_sales_customer_id ON Sales (customer_id);
+CREATE INDEX ix_quick_add_items_page_position ON quick_add_items (page_number, position);
+CREATE INDEX ix_categories_parent_id ON Categories (parent_id);
+CREATE INDEX ix_combination_item_components_combo_id ON combination_item_components (combination_item_id);
+CREATE INDEX ix_stock_movements_item_id_id ON stock_movements (item_id, id);
+CREATE INDEX ix_stock_movements_sale_id ON stock_movements (sale_id);
+CREATE INDEX ix_xero_outbox_status_next_attempt_at ON xero_outbox (status, next_attempt_at);
+CREATE INDEX ix_xero_outbox_sale_id ON xero_outbox (sale_id);
+CREATE INDEX ix_xero_daily_summaries_status_next_attempt_at ON xero_daily_summaries (status, next_attempt_at);
+CREATE INDEX ix_xero_daily_summaries_summary_date ON xero_daily_summaries (summary_date);
+
+-- Upgrades of a database created from an earlier version of this file, in the order
+-- `python upgrade_database.py` applies them. Prefer the script: it checks the live schema before
+-- each step, so it can be re-run, and it backfills the totals with the application's own rounding.
+-- The statements are kept so the upgrade can also be run by hand. On a fresh database they fail
+-- harmlessly (the columns exist) or find nothing to update.
+
+-- Stored sale totals. On an existing database, add the columns and backfill them from the lines
+-- and payments in the same run: until then every existing sale reads as $0.00, and a write that
+-- recomputes its status would take it for settled. The backfill recomputes from the source rows,
+-- so re-running it is harmless (on a fresh database the ALTERs fail harmlessly and it updates nothing).
+ALTER TABLE Sales ADD COLUMN subtotal_gross DECIMAL(10, 2) NOT NULL DEFAULT 0.00;
+ALTER TABLE Sales ADD COLUMN line_discount_total DECIMAL(10, 2) NOT NULL DEFAULT 0.00;
+ALTER TABLE Sales ADD COLUMN gst_amount DECIMAL(10, 2) NOT NULL DEFAULT 0.00;
+ALTER TABLE Sales ADD COLUMN grand_total DECIMAL(10, 2) NOT NULL DEFAULT 0.00;
+ALTER TABLE Sales ADD COLUMN amount_paid DECIMAL(10, 2) NOT NULL DEFAULT 0.00;
+ALTER TABLE Sales ADD COLUMN amount_due DECIMAL(10, 2) NOT NULL DEFAULT 0.00;
+-- updated_at is kept, so the sales keep their place in the lists
+UPDATE Sales s
+    LEFT JOIN (
+        SELECT sale_id,
+               SUM(price_at_sale * quantity) AS gross,
+               SUM((price_at_sale - COALESCE(sale_price, price_at_sale)) * quantity) AS discount
+        FROM SaleItems GROUP BY sale_id
+    ) line_sums ON line_sums.sale_id = s.id
+    LEFT JOIN (SELECT sale_id, SUM(amount) AS paid FROM Payments GROUP BY sale_id) payment_sums ON payment_sums.sale_id = s.id
+SET s.subtotal_gross = COALESCE(line_sums.gross, 0),
+    s.line_discount_total = COALESCE(line_sums.discount, 0),
+    s.amount_paid = COALESCE(payment_sums.paid, 0),
+    s.updated_at = s.updated_at;
+-- GST is the included fraction of the net subtotal and of the fee, each rounded on its own
+-- (app/utils/totals.derive_totals). The 10s below are GST_RATE_PERCENTAGE, change them to match
+-- config.py. `python check_sale_totals.py` then confirms the result (--fix corrects any stray cent).
+UPDATE Sales SET
+    gst_amount = ROUND((subtotal_gross - line_discount_total - COALESCE(overall_discount_amount_applied, 0)) * 10 / (100 + 10), 2)
+               + ROUND(transaction_fee * 10 / (100 + 10), 2),
+    grand_total = subtotal_gross - line_discount_total - COALESCE(overall_discount_amount_applied, 0) + transaction_fee,
+    amount_due = subtotal_gross - line_discount_total - COALESCE(overall_discount_amount_applied, 0) + transaction_fee - amount_paid,
+    updated_at = updated_at;
+
+-- Stock ledger. On an existing database, add the fold watermark and give every tracked item an
+-- opening balance, so point-in-time stock queries have a starting level (skipped for items that
+-- already have movements, so re-running this is harmless).
+ALTER TABLE Items ADD COLUMN stock_movement_seq INTEGER NOT NULL DEFAULT 0;
+INSERT INTO stock_movements (item_id, movement_type, quantity, is_absolute, note, created_at)
+    SELECT id, 'stocktake', stock_quantity, TRUE, 'Opening balance', NOW() FROM Items
+    WHERE is_stock_tracked = TRUE AND NOT EXISTS (SELECT 1 FROM stock_movements m WHERE m.item_id = Items.id);
+
+-- Optimistic concurrency for sales edited from several tills
+ALTER TABLE Sales ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+
+-- Xero IDs, filled in as contacts and invoices are created. On an existing database, add the
+-- columns and then fill them from Xero with `python backfill_xero_ids.py`.
+ALTER TABLE Customers ADD COLUMN xero_contact_id VARCHAR(36);
+ALTER TABLE Sales ADD COLUMN xero_invoice_id VARCHAR(36);
+
+-- Daily Xero summaries (XERO_DAILY_SUMMARY mode). The CREATE TABLE above adds the table itself
+ALTER TABLE Sales ADD COLUMN xero_summary_id INTEGER;
+-- Named, so that on a fresh database this fails like the ALTERs above instead of adding a second key
+ALTER TABLE Sales ADD CONSTRAINT fk_sales_xero_summary_id FOREIGN KEY (xero_summary_id) REFERENCES xero_daily_summaries (id);
+-- After the column it covers, so it is not among the secondary indexes above
+CREATE INDEX ix_sales_xero_summary_id_status_created_at ON Sales (xero_summary_id, status, created_at);
@@ -1,4 +1,5 @@
 import { showToast } from './toastService.js';
+import { state } from './uiState.js';
 
 // --- API Base URL ---
 // Use the current protocol (http or https) from the window location
@@ -6,7 +7,21 @@ const API_PREFIX_URL = `${window.location.protocol}//${window.location.host}/api
 const ROOT_URL = `${window.location.protocol}//${window.location.host}`;
 
 // --- Helper Functions ---
-export async function apiCall(endpoint, method = 'GET', body = null, queryParams = null, useApiPrefix = true) {
+// The version of the open sale a write is based on, or null if the write does not touch it.
+// Sent as If-Match so the server refuses (409) an edit to a sale another till changed meanwhile.
+function currentSaleVersionFor(endpoint, method, body) {
+    const sale = state.currentSale;
+    if (method === 'GET' || !sale || sale.version === undefined || sale.version === null) {
+        return null;
+    }
+    const editsSale = endpoint === `/sales/${sale.id}` || endpoint.startsWith(`/sales/${sale.id}/`);
+    const paysSale = endpoint.startsWith('/payments') && body && !(body instanceof FormData) && body.sale_id == sale.id;
+    return editsSale || paysSale ? sale.version : null;
+}
+
+// fetchOptions.signal: optional AbortSignal so callers can cancel superseded requests (resolves to null when aborted)
+// fetchOptions.quiet: don't toast API errors (for lookups where a 404 is an expected outcome)
+export async function apiCall(endpoint, method = 'GET', body = null, queryParams = null, useApiPrefix = true, fetchOptions = {}) {
     const baseUrl = useApiPrefix ? API_PREFIX_URL : ROOT_URL;
     let url = `${baseUrl}${endpoint}`;
     if (queryParams && Object.keys(queryParams).length > 0) {
@@ -27,6 +42,13 @@ export async function apiCall(endpoint, method = 'GET', body = null, queryParams
             // Content-Type will be set conditionally below
         }
     };
+    if (fetchOptions.signal) {
+        options.signal = fetchOptions.signal;
+    }
+    const saleVersion = useApiPrefix ? currentSaleVersionFor(endpoint, method, body) : null;
+    if (saleVersion !== null) {
+        options.headers['If-Match'] = `"${saleVersion}"`;
+    }
 
     if (body) {
         if (body instanceof FormData) {
@@ -51,6 +73,18 @@ export async function apiCall(endpoint, method = 'GET', body = null, queryParams
         const response = await fetch(url, options);
         if (!response.ok) {
             const errorData = await response.json().catch(() => ({ error: response.statusText }));
+            if (response.status === 409 && errorData.sale) {
+                // Another till changed the sale: show its current state instead of our stale copy
+                if (state.currentSale && state.currentSale.id === errorData.sale.id) {
+                    state.currentSale = errorData.sale;
+                    window.dispatchEvent(new CustomEvent('sale-conflict', { detail: errorData.sale }));
+                }
+                showToast(errorData.error || errorData.message, 'warning', 5000);
+                return null;
+            }
+            if (fetchOptions.quiet) {
+                return null;
+            }
             console.error('API Error:', errorData);
             showToast(`API Error: ${errorData.error || 'Unknown API error'}`, 'error');
             return null;
@@ -60,6 +94,9 @@ export async function apiCall(endpoint, method = 'GET', body = null, queryParams
         }
         return await response.json();
     } catch (error) {
+        if (error.name === 'AbortError') {
+            return null; // Superseded by a newer request, nothing to report
+        }
         console.error('Fetch Error:', error);
         showToast(`Network Error: ${error.message}`, 'error');
         return null;
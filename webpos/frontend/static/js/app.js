@@ -36,8 +36,8 @@ import {
 } from './customerService.js';
 import {
     initItemService,
-    preloadItems as servicePreloadItems,
     searchItems as serviceSearchItems,
+    scanOrSearchItems as serviceScanOrSearchItems,
     openImagePreviewModal as serviceOpenImagePreviewModal,
     closeImagePreviewModal as serviceCloseImagePreviewModal,
     openVariantSelectionModal as serviceOpenVariantSelectionModal,
@@ -151,7 +151,6 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- Initial Load Functions ---
     loadParkedSales();
-    servicePreloadItems();
     serviceLoadQuickAddItems(1);
     serviceLoadAndDisplayCustomers();
     
@@ -286,7 +285,7 @@ document.addEventListener('DOMContentLoaded', () => {
     if (itemSearchInput) {
         itemSearchInput.addEventListener('keyup', (event) => {
             if (event.key === 'Enter') {
-                serviceSearchItems(itemSearchInput.value);
+                serviceScanOrSearchItems();
             }
         });
     }
@@ -117,6 +117,9 @@ export function initCartService() {
     if (eftposFeeToggleBtn) {
         eftposFeeToggleBtn.addEventListener('click', () => handleToggleEftposFee());
     }
+
+    // apiService has already replaced state.currentSale with the server's copy
+    window.addEventListener('sale-conflict', () => updateCartDisplay());
 }
 
 function calculateAndDisplayFinalPrice() {
@@ -302,7 +305,8 @@ export async function createNewSale(status = 'Open', customerId = null, customer
     return sale;
 }
 
-export async function addItemToCart(itemId, price) {
+// knownItemDetails: optional item object the caller already has (e.g. from a SKU scan), saving a GET /items/<id>
+export async function addItemToCart(itemId, price, knownItemDetails = null) {
     console.log("[cart.js] addItemToCart called with itemId:", itemId, "and price:", price);
     // console.log("Attempting to add item to cart:", itemId); // Less verbose
     // let saleCreatedInThisCall = false; // Not strictly needed if createNewSale handles state correctly
@@ -326,47 +330,18 @@ export async function addItemToCart(itemId, price) {
     }
 
     const saleId = state.currentSale.id;
-    let itemProcessed = false; // Flag to check if any item/component was processed
 
     // Fetch the base item details to check its parent_id
-    const itemDetails = await apiCall(`/items/${itemId}`);
+    const itemDetails = knownItemDetails || await apiCall(`/items/${itemId}`);
     if (!itemDetails) {
         showToast(`Failed to fetch details for item ID ${itemId}. Cannot add to cart.`, 'error');
         return;
     }
 
+    let operations;
     if (itemDetails.parent_id === -3) { // Combination Item
-        const combinationItemDetails = await apiCall(`/combination-items/${itemId}`);
-        if (combinationItemDetails && combinationItemDetails.success && combinationItemDetails.components && combinationItemDetails.components.length > 0) {
-            for (const component of combinationItemDetails.components) {
-                const componentFullDetails = await apiCall(`/items/${component.item_id}`);
-                if (componentFullDetails && componentFullDetails.price !== null && componentFullDetails.price !== undefined) {
-                    const existingCartItem = state.currentSale.sale_items.find(si => si.item_id === component.item_id);
-                    if (existingCartItem) {
-                        // Item exists, update quantity
-                        const newQuantity = existingCartItem.quantity + component.quantity;
-                        await apiCall(`/sales/${saleId}/items/${existingCartItem.id}`, 'PUT', { quantity: newQuantity });
-                    } else {
-                        // Item does not exist, add new line item
-                        const saleItemData = {
-                            item_id: component.item_id,
-                            quantity: component.quantity, 
-                            price_at_sale: componentFullDetails.price 
-                        };
-                        await apiCall(`/sales/${saleId}/items`, 'POST', saleItemData);
-                    }
-                    itemProcessed = true;
-                } else {
-                    showToast(`Price missing for component ${component.title || ('ID: ' + component.item_id)}. Not added.`, 'warning');
-                }
-            }
-            if (itemProcessed) showToast(`${itemDetails.title} (components) added/updated in cart.`, 'success');
-            
-        } else {
-            showToast(`Could not retrieve valid components for ${itemDetails.title}. Item not added.`, 'error');
-            console.error("Failed to get components for combo. Details:", combinationItemDetails);
-            return; // Exit if combo components cannot be processed
-        }
+        // The server expands the combination into component lines (merging into existing ones)
+        operations = [{ op: 'add_combo', item_id: itemId, quantity: 1 }];
     } else { // Regular Item or Variant (parent_id != -3)
         if (price === null || price === undefined) {
             showToast(`Price missing for ${itemDetails.title}. Cannot add to cart.`, 'error');
@@ -375,32 +350,20 @@ export async function addItemToCart(itemId, price) {
         const existingCartItem = state.currentSale.sale_items.find(si => si.item_id === itemId);
         if (existingCartItem) {
             // Item exists, update quantity (typically add 1 for a standard item click)
-            const newQuantity = existingCartItem.quantity + 1;
-            await apiCall(`/sales/${saleId}/items/${existingCartItem.id}`, 'PUT', { quantity: newQuantity });
+            operations = [{ op: 'update', sale_item_id: existingCartItem.id, quantity: existingCartItem.quantity + 1 }];
         } else {
             // Item does not exist, add new line item
-            const saleItemData = {
-                item_id: itemId,
-                quantity: 1, 
-                price_at_sale: price 
-            };
-            await apiCall(`/sales/${saleId}/items`, 'POST', saleItemData);
+            operations = [{ op: 'add', item_id: itemId, quantity: 1, price_at_sale: price }];
         }
-        itemProcessed = true;
-        showToast(`${itemDetails.title} added/updated in cart.`, 'success');
     }
 
-    if (itemProcessed) {
-        // Refresh the entire sale state from the server after modifications
-        const updatedSale = await apiCall(`/sales/${saleId}`);
-        if (updatedSale) {
-            state.currentSale = updatedSale;
-            updateCartDisplay();
-            collapseItemSearchResults(); // Assuming this is desired after adding any item
-        } else {
-            showToast("Cart updated, but failed to refresh sale details from server.", "warning");
-            // Potentially try to update cart display with local state if server refresh fails
-        }
+    // One request and one transaction; the response is the whole updated sale
+    const updatedSale = await apiCall(`/sales/${saleId}/items:batch`, 'POST', { operations });
+    if (updatedSale) {
+        state.currentSale = updatedSale;
+        updateCartDisplay();
+        collapseItemSearchResults(); // Assuming this is desired after adding any item
+        showToast(`${itemDetails.title}${itemDetails.parent_id === -3 ? ' (components)' : ''} added/updated in cart.`, 'success');
     }
     // No explicit return here, function completes
 }
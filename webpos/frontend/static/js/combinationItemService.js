@@ -385,13 +385,10 @@ async function searchItems() {
     searchResults.style.display = 'block'; // Make sure results container is visible for new search
 
     try {
-        console.log('Making API call to /items/ with include_variants:true');
-        // Backend with include_variants:true now returns direct matches of types -1, -2, >0
-        const items = await apiCall('/items/', 'GET', null, { 
+        // Prefix typeahead served from the backend's in-memory index; returns standalones (-1), parents (-2) and combos (-3)
+        const items = await apiCall('/items/typeahead', 'GET', null, { 
             q: query,
-            include_variants: 'true', 
-            is_current_version: '1',
-            is_active: '1'
+            limit: 20
         });
         
         searchResults.innerHTML = '';
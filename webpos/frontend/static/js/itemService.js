@@ -102,6 +102,11 @@ export function initItemService() {
     // Initial setup that depends on DOM elements being ready
     setupItemImageDropZone(); 
 
+    // Search as the user types; superseded requests are cancelled in searchItems
+    if (itemSearchInput) {
+        itemSearchInput.addEventListener('input', debouncedSearchItems);
+    }
+
     // Event Listeners for other modal close buttons (if they have dedicated close buttons)
     if (closeAddEditItemModalButton) {
         closeAddEditItemModalButton.addEventListener('click', closeAddEditItemModal);
@@ -138,12 +143,45 @@ export function initItemService() {
 }
 
 // --- Item Search --- 
+const SEARCH_PAGE_SIZE = 25;
+let searchAbortController = null; // Controller of the in-flight search request, aborted when a newer search starts
+let currentSearchQuery = '';
+let currentSearchOffset = 0;
+
+// Debounce function to prevent too many API calls
+function debounce(func, wait) {
+    let timeout;
+    return function executedFunction(...args) {
+        const later = () => {
+            clearTimeout(timeout);
+            func(...args);
+        };
+        clearTimeout(timeout);
+        timeout = setTimeout(later, wait);
+    };
+}
+
+export const debouncedSearchItems = debounce(() => searchItems(), 250);
+
+// Search is served by /api/items/search, so there is no longer a full catalogue to preload.
+// Kept as a no-op for existing callers.
 export async function preloadItems() {
-    const allItems = await apiCall('/items');
-    if (allItems) {
-        state.itemsCache = allItems;
-        console.log("Items preloaded for search:", state.itemsCache.length);
+    state.itemsCache = [];
+}
+
+async function fetchSearchPage(query, offset) {
+    if (searchAbortController) {
+        searchAbortController.abort();
     }
+    const controller = new AbortController();
+    searchAbortController = controller;
+
+    const response = await apiCall('/items/search', 'GET', null, { q: query, limit: SEARCH_PAGE_SIZE, offset: offset }, true, { signal: controller.signal });
+    if (controller !== searchAbortController) {
+        return null; // A newer search has started; drop this response
+    }
+    searchAbortController = null;
+    return response;
 }
 
 export async function searchItems() {
@@ -157,131 +195,176 @@ export async function searchItems() {
     }
 
     if (!query) {
+        if (searchAbortController) {
+            searchAbortController.abort();
+            searchAbortController = null;
+        }
+        currentSearchQuery = '';
         itemSearchResultsDiv.innerHTML = '';
         collapseItemSearchResults();
         return;
     }
 
-    if (state.itemsCache.length === 0) {
-        await preloadItems(); // Ensure items are loaded if cache is empty
-    }
+    const response = await fetchSearchPage(query, 0);
+    if (!response) return;
 
-    const lowerCaseQuery = query.toLowerCase();
-    const results = state.itemsCache.filter(item => 
-        (item.title && item.title.toLowerCase().includes(lowerCaseQuery)) || 
-        (item.sku && item.sku.toLowerCase().includes(lowerCaseQuery))
-    );
+    currentSearchQuery = query;
+    currentSearchOffset = response.items.length;
 
     itemSearchResultsDiv.innerHTML = '';
-    if (results.length > 0) {
-        results.forEach(item => {
-            const itemDiv = document.createElement('div');
-            itemDiv.className = 'item-search-result-rich';
-
-            const imageUrl = (item.photos && item.photos.length > 0 && item.photos[0].small_url) 
-                ? item.photos[0].small_url 
-                : 'https://via.placeholder.com/100x100.png?text=No+Image';
-            const largeImageUrl = (item.photos && item.photos.length > 0 && item.photos[0].large_url) 
-                ? item.photos[0].large_url 
-                : imageUrl;
-
-            let detailsSideHTML = '';
-            if (item.parent_id === -2) { // Is a parent item with variants
-                detailsSideHTML = `
-                    <p class="view-variants-text">View Variants</p>
-                    <button class="edit-item-from-search-btn btn btn-primary pure-button">Edit</button>
-                `;
-            } else {
-                detailsSideHTML = `
-                    <p class="item-price-search">$${item.price ? item.price.toFixed(2) : 'N/A'}</p>
-                    <p class="item-stock-search">Stock: ${item.is_stock_tracked ? item.stock_quantity : 'Not Tracked'}</p>
-                    <div class="item-search-actions" style="display: flex; gap: 5px; margin-top: 5px;">
-                        <button class="edit-item-from-search-btn btn btn-primary pure-button">Edit</button>
-                        <button class="print-label-btn btn btn-warning pure-button">Print Label</button>
-                    </div>
-                `;
-            }
+    if (response.items.length > 0) {
+        response.items.forEach(item => itemSearchResultsDiv.appendChild(createSearchResultElement(item)));
+        if (response.has_more) {
+            itemSearchResultsDiv.appendChild(createShowMoreButton());
+        }
+    } else {
+        itemSearchResultsDiv.innerHTML = '<p>No items found.</p>';
+    }
+    expandItemSearchResults();
+}
 
-            itemDiv.innerHTML = `
-                <div class="item-image-container">
-                    <img src="${imageUrl}" alt="${item.title}" class="item-image-preview-trigger">
-                </div>
-                <div class="item-details-main">
-                    <h3 class="item-title-search">${item.title}</h3>
-                    <p class="item-sku-id-search">SKU: ${item.sku || 'N/A'} ID: ${item.id}</p>
-                    <p class="item-description-search">${item.description ? (item.description.length > 100 ? item.description.substring(0, 97) + '...' : item.description) : 'No description.'}</p>
-                </div>
-                <div class="item-details-side">
-                    ${detailsSideHTML}
-                </div>
-            `;
-
-            const imageElement = itemDiv.querySelector('.item-image-preview-trigger');
-            if (imageElement) {
-                imageElement.addEventListener('click', (e) => {
-                    e.stopPropagation();
-                    openImagePreviewModal(largeImageUrl, item.title);
-                });
-            }
+// Enter in the search box: barcode scanners type the SKU followed by Enter, so try an exact
+// SKU match first and add it straight to the cart; anything else falls through to a normal search.
+export async function scanOrSearchItems() {
+    if (!itemSearchInput) return;
+    const query = itemSearchInput.value.trim();
+    if (!query) {
+        return searchItems();
+    }
 
-            const editButton = itemDiv.querySelector('.edit-item-from-search-btn');
-            if (editButton) {
-                editButton.addEventListener('click', (e) => {
-                    e.stopPropagation();
-                    if (item.parent_id === -3) {
-                        console.log(`Attempting to open combination item modal for editing (Item ID: ${item.id})`);
-                        openComboModal(item.id);
-                    } else {
-                        openEditItemForm(item.id);
-                    }
-                });
-            }
+    const scannedItem = await apiCall(`/items/by-sku/${encodeURIComponent(query)}`, 'GET', null, null, true, { quiet: true });
+    if (scannedItem && scannedItem.parent_id !== -2 && scannedItem.price !== null && scannedItem.price !== undefined) {
+        await addItemToCart(scannedItem.id, scannedItem.price, scannedItem);
+        showToast(`${scannedItem.title} added to cart.`, 'success');
+        itemSearchInput.value = '';
+        return searchItems(); // Clears the results panel
+    }
+    return searchItems();
+}
 
-            const printLabelButton = itemDiv.querySelector('.print-label-btn');
-            if (printLabelButton) {
-                printLabelButton.addEventListener('click', (e) => {
-                    e.stopPropagation(); // Prevent triggering the itemDiv click (add to cart/variants)
-                    // Action: Open new tab for label printing
-                    window.open(`/print/label/${item.id}`, '_blank');
-                    showToast(`Opening label print page for ${item.title}...`, 'info');
-                });
+async function loadMoreSearchResults(showMoreButton) {
+    showMoreButton.disabled = true;
+    const response = await fetchSearchPage(currentSearchQuery, currentSearchOffset);
+    if (!response) {
+        showMoreButton.disabled = false;
+        return;
+    }
+    showMoreButton.remove();
+    currentSearchOffset += response.items.length;
+    response.items.forEach(item => itemSearchResultsDiv.appendChild(createSearchResultElement(item)));
+    if (response.has_more) {
+        itemSearchResultsDiv.appendChild(createShowMoreButton());
+    }
+}
+
+function createShowMoreButton() {
+    const showMoreButton = document.createElement('button');
+    showMoreButton.className = 'btn btn-secondary pure-button search-show-more-btn';
+    showMoreButton.textContent = 'Show more results';
+    showMoreButton.addEventListener('click', (e) => {
+        e.stopPropagation();
+        loadMoreSearchResults(showMoreButton);
+    });
+    return showMoreButton;
+}
+
+function createSearchResultElement(item) {
+    const itemDiv = document.createElement('div');
+    itemDiv.className = 'item-search-result-rich';
+
+    const imageUrl = item.thumbnail || 'https://via.placeholder.com/100x100.png?text=No+Image';
+    const largeImageUrl = item.image || imageUrl;
+
+    let detailsSideHTML = '';
+    if (item.parent_id === -2) { // Is a parent item with variants
+        detailsSideHTML = `
+            <p class="view-variants-text">View Variants</p>
+            <button class="edit-item-from-search-btn btn btn-primary pure-button">Edit</button>
+        `;
+    } else {
+        detailsSideHTML = `
+            <p class="item-price-search">$${item.price ? item.price.toFixed(2) : 'N/A'}</p>
+            <p class="item-stock-search">Stock: ${item.is_stock_tracked ? item.stock_quantity : 'Not Tracked'}</p>
+            <div class="item-search-actions" style="display: flex; gap: 5px; margin-top: 5px;">
+                <button class="edit-item-from-search-btn btn btn-primary pure-button">Edit</button>
+                <button class="print-label-btn btn btn-warning pure-button">Print Label</button>
+            </div>
+        `;
+    }
+
+    itemDiv.innerHTML = `
+        <div class="item-image-container">
+            <img src="${imageUrl}" alt="${item.title}" class="item-image-preview-trigger">
+        </div>
+        <div class="item-details-main">
+            <h3 class="item-title-search">${item.title}</h3>
+            <p class="item-sku-id-search">SKU: ${item.sku || 'N/A'} ID: ${item.id}</p>
+        </div>
+        <div class="item-details-side">
+            ${detailsSideHTML}
+        </div>
+    `;
+
+    const imageElement = itemDiv.querySelector('.item-image-preview-trigger');
+    if (imageElement) {
+        imageElement.addEventListener('click', (e) => {
+            e.stopPropagation();
+            openImagePreviewModal(largeImageUrl, item.title);
+        });
+    }
+
+    const editButton = itemDiv.querySelector('.edit-item-from-search-btn');
+    if (editButton) {
+        editButton.addEventListener('click', (e) => {
+            e.stopPropagation();
+            if (item.parent_id === -3) {
+                console.log(`Attempting to open combination item modal for editing (Item ID: ${item.id})`);
+                openComboModal(item.id);
+            } else {
+                openEditItemForm(item.id);
             }
+        });
+    }
 
-            itemDiv.addEventListener('click', () => {
-                // Visual feedback for selection
-                const currentlySelected = itemSearchResultsDiv.querySelector('.item-search-result-rich.selected');
-                if (currentlySelected) {
-                    currentlySelected.classList.remove('selected');
-                }
-                itemDiv.classList.add('selected');
-
-                if (item.parent_id === -2) { // Is a parent item
-                    // Define the callback for adding to cart
-                    const addToCartCallback = (selectedVariant) => {
-                        if (selectedVariant && selectedVariant.id && selectedVariant.price !== null && selectedVariant.price !== undefined) {
-                            addItemToCart(selectedVariant.id, selectedVariant.price);
-                            showToast(`${selectedVariant.title} added to cart.`, 'success');
-                        } else {
-                            showToast('Selected variant cannot be added to cart (missing ID or price).', 'warning');
-                        }
-                    };
-                    // Call openVariantSelectionModal with the item, the callback, and config
-                    openVariantSelectionModal(item, addToCartCallback, { showAddParentButton: false, actionButtonText: "Add to Cart" });
-                } else if (item.price !== null && item.price !== undefined) {
-                    // For regular items, add to cart directly
-                    addItemToCart(item.id, item.price);
-                    showToast(`${item.title} added to cart.`, 'success');
-                } else {
-                    showToast('This item cannot be added to cart (missing price or is a parent template).', 'warning');
-                }
-            });
-            itemSearchResultsDiv.appendChild(itemDiv);
+    const printLabelButton = itemDiv.querySelector('.print-label-btn');
+    if (printLabelButton) {
+        printLabelButton.addEventListener('click', (e) => {
+            e.stopPropagation(); // Prevent triggering the itemDiv click (add to cart/variants)
+            // Action: Open new tab for label printing
+            window.open(`/print/label/${item.id}`, '_blank');
+            showToast(`Opening label print page for ${item.title}...`, 'info');
         });
-        expandItemSearchResults();
-    } else {
-        itemSearchResultsDiv.innerHTML = '<p>No items found.</p>';
-        expandItemSearchResults();
     }
+
+    itemDiv.addEventListener('click', () => {
+        // Visual feedback for selection
+        const currentlySelected = itemSearchResultsDiv.querySelector('.item-search-result-rich.selected');
+        if (currentlySelected) {
+            currentlySelected.classList.remove('selected');
+        }
+        itemDiv.classList.add('selected');
+
+        if (item.parent_id === -2) { // Is a parent item
+            // Define the callback for adding to cart
+            const addToCartCallback = (selectedVariant) => {
+                if (selectedVariant && selectedVariant.id && selectedVariant.price !== null && selectedVariant.price !== undefined) {
+                    addItemToCart(selectedVariant.id, selectedVariant.price);
+                    showToast(`${selectedVariant.title} added to cart.`, 'success');
+                } else {
+                    showToast('Selected variant cannot be added to cart (missing ID or price).', 'warning');
+                }
+            };
+            // Call openVariantSelectionModal with the item, the callback, and config
+            openVariantSelectionModal(item, addToCartCallback, { showAddParentButton: false, actionButtonText: "Add to Cart" });
+        } else if (item.price !== null && item.price !== undefined) {
+            // For regular items, add to cart directly
+            addItemToCart(item.id, item.price);
+            showToast(`${item.title} added to cart.`, 'success');
+        } else {
+            showToast('This item cannot be added to cart (missing price or is a parent template).', 'warning');
+        }
+    });
+    return itemDiv;
 }
 
 // --- Image Preview Modal ---
@@ -627,7 +710,9 @@ export async function handleSaveItem(addToCartAfterSave = false) {
         if (result && result.id) {
             showToast(itemId ? 'Item updated successfully!' : 'Item created successfully!', 'success');
             closeAddEditItemModal();
-            await preloadItems();
+            if (itemSearchInput && itemSearchInput.value.trim()) {
+                searchItems(); // Refresh visible results with the saved item
+            }
             if (addToCartAfterSave && result.id && result.price !== null && result.price !== undefined && result.parent_id !== -2) {
                 await addItemToCart(result.id, result.price);
             } else if (addToCartAfterSave) {
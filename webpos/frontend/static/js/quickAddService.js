@@ -388,12 +388,10 @@ async function handleSearchQAIItems() {
     
     let apiResults;
     try {
-        // Fetch items from the API with specific filters
-        // 'q' for text search, 'is_active' and 'is_current_version' as per requirements.
-        apiResults = await apiCall('/items/', 'GET', null, {
+        // Title/SKU prefix typeahead over current, active, top-level items
+        apiResults = await apiCall('/items/typeahead', 'GET', null, {
             q: originalQuery,
-            is_active: 'true',
-            is_current_version: 'true'
+            limit: 20
         });
     } catch (error) {
         console.error("Error searching items for Quick Add:", error);
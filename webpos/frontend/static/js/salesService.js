@@ -8,6 +8,8 @@ import { openPrintOptionsModal } from './printService.js'; // Import for print b
 let searchSaleIdInput;
 let searchSaleCustomerInput;
 let searchSaleStatusSelect;
+let searchSaleDateFromInput;
+let searchSaleDateToInput;
 let searchSalesButton;
 let allSalesSearchResultsDiv;
 let parkedSalesListDiv;
@@ -17,6 +19,8 @@ export function initSalesService() {
     searchSaleIdInput = document.getElementById('search-sale-id');
     searchSaleCustomerInput = document.getElementById('search-sale-customer');
     searchSaleStatusSelect = document.getElementById('search-sale-status');
+    searchSaleDateFromInput = document.getElementById('search-sale-date-from');
+    searchSaleDateToInput = document.getElementById('search-sale-date-to');
     searchSalesButton = document.getElementById('search-sales-button');
     allSalesSearchResultsDiv = document.getElementById('all-sales-search-results');
 
@@ -40,28 +44,50 @@ export function initSalesService() {
     if (searchSaleStatusSelect) {
         searchSaleStatusSelect.addEventListener('change', searchAllSales);
     }
+    [searchSaleDateFromInput, searchSaleDateToInput].forEach(input => {
+        if (input) input.addEventListener('change', searchAllSales);
+    });
 
     // Initial load of parked sales can be triggered from app.js after all services are initialized.
     // Or, if it should always load on init of this service:
     // loadParkedSales(); 
 }
 
-export async function loadParkedSales() {
+// Recall screens list sale summaries (GET /sales/summary: totals, customer, no line items),
+// a page at a time; the full sale is only fetched when one is loaded into the cart.
+const PARKED_SALES_PAGE_SIZE = 100;
+const SALES_SEARCH_PAGE_SIZE = 50;
+
+// Appends a "Load more" button that fetches the page after `nextCursor` into the same list
+function appendLoadMoreButton(container, onClick) {
+    const loadMoreButton = document.createElement('button');
+    loadMoreButton.className = 'btn btn-secondary load-more-sales-btn';
+    loadMoreButton.textContent = 'Load more';
+    loadMoreButton.addEventListener('click', () => {
+        loadMoreButton.remove();
+        onClick();
+    });
+    container.appendChild(loadMoreButton);
+}
+
+export async function loadParkedSales(cursor = null) {
     if (!parkedSalesListDiv) {
         console.warn("Parked sales list div not found. Cannot load parked sales.");
         return;
     }
-    parkedSalesListDiv.innerHTML = '<p>Loading parked sales...</p>';
+    if (!cursor) parkedSalesListDiv.innerHTML = '<p>Loading parked sales...</p>';
     try {
-        const sales = await apiCall('/sales/status/Open'); // Assuming 'Open' is the status for parked sales
-        console.log("Fetched parked sales:", sales);
-        parkedSalesListDiv.innerHTML = '';
-        if (sales && sales.length > 0) {
+        // 'Open' is the status for parked sales
+        const page = await apiCall('/sales/summary', 'GET', null, { status: 'Open', limit: PARKED_SALES_PAGE_SIZE, cursor: cursor });
+        console.log("Fetched parked sales:", page);
+        if (!cursor) parkedSalesListDiv.innerHTML = '';
+        const sales = page ? page.sales : [];
+        if (sales.length > 0) {
             sales.forEach(sale => {
                 const saleDiv = document.createElement('div');
                 saleDiv.className = 'parked-sale-entry';
                 const totalDisplay = typeof sale.final_grand_total === 'number' ? sale.final_grand_total.toFixed(2) : '0.00';
-                saleDiv.innerHTML = 'Sale ID: ' + sale.id + ' - Customer: ' + (sale.customer ? sale.customer.name : 'N/A') + ' - Total: ' + totalDisplay;
+                saleDiv.innerHTML = 'Sale ID: ' + sale.id + ' - Customer: ' + (sale.customer_name || 'N/A') + ' - Total: ' + totalDisplay;
                 saleDiv.style.cursor = 'pointer';
                 saleDiv.style.padding = '5px';
                 saleDiv.style.borderBottom = '1px solid #eee';
@@ -75,7 +101,10 @@ export async function loadParkedSales() {
                 };
                 parkedSalesListDiv.appendChild(saleDiv);
             });
-        } else {
+            if (page.has_more) {
+                appendLoadMoreButton(parkedSalesListDiv, () => loadParkedSales(page.next_cursor));
+            }
+        } else if (!cursor) {
             parkedSalesListDiv.innerHTML = '<p>No parked sales.</p>';
         }
     } catch (error) {
@@ -86,32 +115,40 @@ export async function loadParkedSales() {
     // updateCartDisplay might be needed if loading a sale affects cart, but loadSaleIntoCart should handle it.
 }
 
-export async function searchAllSales() {
+export async function searchAllSales(cursor = null) {
     if (!allSalesSearchResultsDiv || !searchSaleIdInput || !searchSaleCustomerInput || !searchSaleStatusSelect) {
         console.warn("Search sales UI elements not found, aborting searchAllSales.");
         return;
     }
-    allSalesSearchResultsDiv.innerHTML = '<p>Searching sales...</p>';
+    // Event listeners pass an Event; only a string is a cursor for the next page
+    if (typeof cursor !== 'string') cursor = null;
+    if (!cursor) allSalesSearchResultsDiv.innerHTML = '<p>Searching sales...</p>';
 
     const saleId = searchSaleIdInput.value.trim();
     const customerQuery = searchSaleCustomerInput.value.trim();
     const status = searchSaleStatusSelect.value;
+    const dateFrom = searchSaleDateFromInput ? searchSaleDateFromInput.value : '';
+    const dateTo = searchSaleDateToInput ? searchSaleDateToInput.value : '';
 
-    const queryParams = {};
+    const queryParams = { order_by: 'id_desc', limit: SALES_SEARCH_PAGE_SIZE };
     if (saleId) queryParams.sale_id = saleId;
     if (customerQuery) queryParams.customer_query = customerQuery;
     if (status) queryParams.status = status;
+    if (dateFrom) queryParams.date_from = dateFrom;
+    if (dateTo) queryParams.date_to = dateTo;
+    if (cursor) queryParams.cursor = cursor;
 
     try {
-        const sales = await apiCall('/sales/', 'GET', null, queryParams);
-        allSalesSearchResultsDiv.innerHTML = ''; 
+        const page = await apiCall('/sales/summary', 'GET', null, queryParams);
+        if (!cursor) allSalesSearchResultsDiv.innerHTML = ''; 
+        const sales = page ? page.sales : null;
         if (sales && sales.length > 0) {
             sales.forEach(sale => {
                 const saleDiv = document.createElement('div');
                 saleDiv.className = 'sale-search-result-item';
                 let customerName = 'N/A';
-                if (sale.customer) {
-                    customerName = (sale.customer.name || '') + ' (' + (sale.customer.phone || 'No phone') + ')';
+                if (sale.customer_id) {
+                    customerName = (sale.customer_name || '') + ' (' + (sale.customer_phone || 'No phone') + ')';
                 }
 
                 saleDiv.innerHTML = 
@@ -122,7 +159,7 @@ export async function searchAllSales() {
                     ' | Paid: $' + (typeof sale.amount_paid === 'number' ? sale.amount_paid.toFixed(2) : '0.00') +
                     ' | Due: $' + (typeof sale.amount_due === 'number' ? sale.amount_due.toFixed(2) : '0.00') +
                     '<br>' +
-                    'Items: ' + sale.sale_items.length + ' ' +
+                    'Items: ' + sale.line_count + ' ' +
                     '<button class="view-sale-details-btn btn btn-info" data-sale-id="' + sale.id + '">View/Load</button>' +
                     '<button class="print-email-sale-btn btn btn-success" data-sale-id="' + sale.id + '">Print / Email</button>';
                 
@@ -135,15 +172,18 @@ export async function searchAllSales() {
                 }
                 const printEmailButton = saleDiv.querySelector('.print-email-sale-btn');
                 if (printEmailButton) {
-                    const customerEmail = sale.customer && sale.customer.email ? sale.customer.email : null;
+                    const customerEmail = sale.customer_email || null;
                     printEmailButton.addEventListener('click', () => {
                         openPrintOptionsModal(sale.id, sale.status, customerEmail); 
                     });
                 }
                 allSalesSearchResultsDiv.appendChild(saleDiv);
             });
+            if (page.has_more) {
+                appendLoadMoreButton(allSalesSearchResultsDiv, () => searchAllSales(page.next_cursor));
+            }
         } else if (sales) {
-            allSalesSearchResultsDiv.innerHTML = '<p>No sales found matching your criteria.</p>';
+            if (!cursor) allSalesSearchResultsDiv.innerHTML = '<p>No sales found matching your criteria.</p>';
         } else {
             allSalesSearchResultsDiv.innerHTML = '<p>Error searching sales. Please try again.</p>';
             // showToast already handled by apiCall in case of error
@@ -153,4 +193,4 @@ export async function searchAllSales() {
         allSalesSearchResultsDiv.innerHTML = '<p>An error occurred while searching sales.</p>';
         // showToast handled by apiCall
     }
-} 
\ No newline at end of file
+}
@@ -1,7 +1,10 @@
+import os
 from app import create_app, db
 
 if __name__ == '__main__':
-    app = create_app()
+    # The debug reloader runs this file twice: in a watcher process and again in the serving child
+    # (WERKZEUG_RUN_MAIN set). Only the child starts the background workers.
+    app = create_app(start_workers=os.environ.get('WERKZEUG_RUN_MAIN') == 'true')
     with app.app_context():
         db.create_all()
     app.run(
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Upgrades an existing database to the current models, one ordered step per schema change:
+
+    1. catalogue change log table (catalog_changes)
+    2. secondary indexes on the original tables
+    3. stored sale totals columns
+    4. stock ledger (stock_movements), with an opening balance per tracked item, and the
+       fold position on items (stock_movement_seq)
+    5. sale version column (optimistic concurrency)
+    6. Xero contact and invoice ID columns
+    7. Xero outbox table (xero_outbox)
+    8. daily Xero summaries (xero_daily_summaries, sales.xero_summary_id, its foreign key and index)
+    9. backfill of the stored totals of every sale still at the column defaults
+
+Each step looks at the live schema first and skips whatever is already there, so the script can
+be re-run at any time, including after a run that stopped part way. A database created from
+docs/schema.sql is already current. Written for MariaDB/MySQL; back the database up first and
+stop the application while it runs (the workers read the new columns).
+
+    python upgrade_database.py --dry-run
+    python upgrade_database.py
+"""
+
+import argparse
+
+from sqlalchemy import and_, exists, inspect, literal, or_, select, text, true
+from sqlalchemy.orm import selectinload
+from sqlalchemy.schema import AddConstraint, CreateIndex, CreateTable
+from sqlalchemy.sql import func
+
+from app import create_app, db
+from app.models import (CatalogChange, Category, CombinationItemComponent, Customer, Item, Payment, Photo,
+                        QuickAddItem, Sale, SaleItem, StockMovement, XeroDailySummary, XeroOutboxEvent)
+from app.services.sale_service import SaleService
+
+
+class Upgrade:
+    """Checks the live schema and applies the missing changes (or only lists them, with dry_run)."""
+
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.applied = 0
+        # What a dry run has listed, as later steps see the schema unchanged
+        self.listed = set()
+
+    def _inspector(self):
+        # Reflection is cached per inspector, and every step changes the schema
+        return inspect(db.engine)
+
+    def has_table(self, table):
+        return table.lower() in {name.lower() for name in self._inspector().get_table_names()}
+
+    def has_column(self, table, column):
+        return self.has_table(table) and column in {c['name'] for c in self._inspector().get_columns(table)}
+
+    def has_index(self, table, index):
+        return self.has_table(table) and index in {i['name'] for i in self._inspector().get_indexes(table)}
+
+    def has_foreign_key(self, table, column):
+        return self.has_table(table) and any(fk['constrained_columns'] == [column] for fk in self._inspector().get_foreign_keys(table))
+
+    def run(self, description, statement):
+        """Applies one statement in its own transaction (MySQL commits DDL straight away anyway)."""
+        if self.dry_run:
+            if description not in self.listed:
+                self.listed.add(description)
+                self.applied += 1
+                print(f"   Pending: {description}")
+            return
+        self.applied += 1
+        db.session.execute(statement)
+        db.session.commit()
+        print(f"✅ {description}")
+
+    def create_table(self, model):
+        """Creates the model's table and its indexes, or the missing indexes of an existing table."""
+        table = model.__table__
+        if self.has_table(table.name):
+            self.create_indexes(model)
+            return
+        self.run(f"Create table {table.name}", CreateTable(table))
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            self.run(f"Create index {index.name}", CreateIndex(index))
+
+    def create_indexes(self, model):
+        """Creates the model's missing indexes. Indexes on columns not added yet are left for the
+        step that adds them."""
+        table = model.__table__
+        if not self.has_table(table.name):
+            return
+        columns = {c['name'] for c in self._inspector().get_columns(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if all(column.name in columns for column in index.columns) and not self.has_index(table.name, index.name):
+                self.run(f"Create index {index.name}", CreateIndex(index))
+
+    def add_column(self, model, column, definition):
+        table = model.__table__.name
+        if not self.has_column(table, column):
+            self.run(f"Add column {table}.{column}", text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+
+
+def upgrade_catalog_changes(upgrade):
+    upgrade.create_table(CatalogChange)
+
+
+def upgrade_secondary_indexes(upgrade):
+    for model in (Item, Photo, SaleItem, Payment, Sale, QuickAddItem, Category, CombinationItemComponent):
+        upgrade.create_indexes(model)
+
+
+def upgrade_sale_totals(upgrade):
+    # Filled in by backfill_sale_totals once the sales table matches the model
+    for column in SaleService.TOTAL_COLUMNS:
+        upgrade.add_column(Sale, column, 'DECIMAL(10, 2) NOT NULL DEFAULT 0.00')
+
+
+def upgrade_stock_ledger(upgrade):
+    upgrade.create_table(StockMovement)
+    if upgrade.has_column(Item.__tablename__, 'stock_movement_seq'):
+        return
+    # Opening balances first: the column marks the step done, so a run that stops in between
+    # repeats them, and NOT EXISTS keeps that from adding a second balance
+    items, movements = Item.__table__, StockMovement.__table__
+    upgrade.run("Record an opening balance for each stock-tracked item", movements.insert().from_select(
+        ['item_id', 'movement_type', 'quantity', 'is_absolute', 'note', 'created_at'],
+        select(items.c.id, literal('stocktake'), items.c.stock_quantity, true(), literal('Opening balance'), func.now()).where(
+            items.c.is_stock_tracked == true(),
+            ~exists().where(movements.c.item_id == items.c.id)
+        )
+    ))
+    upgrade.add_column(Item, 'stock_movement_seq', 'INTEGER NOT NULL DEFAULT 0')
+
+
+def upgrade_sale_version(upgrade):
+    upgrade.add_column(Sale, 'version', 'INTEGER NOT NULL DEFAULT 1')
+
+
+def upgrade_xero_ids(upgrade):
+    # Filled in from Xero with `python backfill_xero_ids.py`
+    upgrade.add_column(Customer, 'xero_contact_id', 'VARCHAR(36)')
+    upgrade.add_column(Sale, 'xero_invoice_id', 'VARCHAR(36)')
+
+
+def upgrade_xero_outbox(upgrade):
+    upgrade.create_table(XeroOutboxEvent)
+
+
+def upgrade_xero_daily_summaries(upgrade):
+    upgrade.create_table(XeroDailySummary)
+    upgrade.add_column(Sale, 'xero_summary_id', 'INTEGER')
+    if not upgrade.has_foreign_key(Sale.__tablename__, 'xero_summary_id'):
+        foreign_key, = Sale.__table__.c.xero_summary_id.foreign_keys
+        upgrade.run("Add foreign key sales.xero_summary_id", AddConstraint(foreign_key.constraint))
+    upgrade.create_indexes(Sale)
+
+
+def backfill_sale_totals(upgrade, batch_size):
+    """Sets the stored totals of the sales still at the column defaults (nothing summed, nothing
+    paid, yet with lines or payments) with the same arithmetic as the application. Sales that
+    already have their totals are never recomputed."""
+    at_defaults = and_(
+        Sale.subtotal_gross == 0,
+        Sale.amount_paid == 0,
+        or_(exists().where(SaleItem.sale_id == Sale.id), exists().where(Payment.sale_id == Sale.id))
+    )
+    if upgrade.dry_run:
+        if not upgrade.has_column(Sale.__tablename__, 'amount_due'):
+            upgrade.run("Backfill the stored totals of every sale", None)
+        elif db.session.query(func.count(Sale.id)).filter(at_defaults).scalar():
+            upgrade.run("Backfill the stored totals of the sales still at the column defaults", None)
+        return
+
+    sales = Sale.__table__
+    backfilled = last_id = 0
+    while True:
+        batch = Sale.query.options(selectinload(Sale.sale_items), selectinload(Sale.payments)) \
+            .filter(Sale.id > last_id, at_defaults).order_by(Sale.id.asc()).limit(batch_size).all()
+        if not batch:
+            break
+        for sale in batch:
+            # In SQL, so neither the versions nor updated_at move and the sales keep their place in the lists
+            db.session.execute(sales.update().where(sales.c.id == sale.id).values(
+                updated_at=sales.c.updated_at, **SaleService.calculate_sale_totals(sale)
+            ))
+        db.session.commit()
+        backfilled += len(batch)
+        last_id = batch[-1].id
+        db.session.expunge_all()
+    if backfilled:
+        upgrade.applied += 1
+        print(f"✅ Backfilled the stored totals of {backfilled} sales")
+
+
+STEPS = (
+    upgrade_catalog_changes,
+    upgrade_secondary_indexes,
+    upgrade_sale_totals,
+    upgrade_stock_ledger,
+    upgrade_sale_version,
+    upgrade_xero_ids,
+    upgrade_xero_outbox,
+    upgrade_xero_daily_summaries,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help='list the pending changes without applying them')
+    parser.add_argument('--batch-size', type=int, default=500, help='sales per commit in the totals backfill')
+    args = parser.parse_args()
+
+    app = create_app(start_workers=False)
+    with app.app_context():
+        upgrade = Upgrade(args.dry_run)
+        for step in STEPS:
+            step(upgrade)
+        backfill_sale_totals(upgrade, args.batch_size)
+
+        if upgrade.applied == 0:
+            print("✅ Database is up to date")
+        elif args.dry_run:
+            print(f"❌ {upgrade.applied} changes pending (re-run without --dry-run to apply them)")
+        else:
+            print(f"✅ {upgrade.applied} changes applied; `python check_sale_totals.py` confirms the totals")
+    return 1 if upgrade.applied and args.dry_run else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())